@@ -0,0 +1,74 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+Common English words (and their usual forms) that FuzzyIndex never corrects, so a real word that happens to be a
+letter or two away from a Keyword word ("years" and "yearn", "known" and "know") is read as typed. Only words of
+at least FuzzyIndex.MIN_WORD_LENGTH letters are listed, shorter ones are never corrected anyway.
+
+'''
+
+COMMON_WORDS = frozenset("""
+about above abroad absent absolutely accept accepted accident according account across acted acting action actions
+active actually added adding admit adult adults advice afraid after afternoon again against agent agree agreed
+ahead allow allowed almost alone along already alright although always amazing among amount angry animal animals
+annoyed another answer answered answers anxiety anxious anybody anymore anyone anything anyway anywhere apart
+apartment appear appears apple apply argue argued argument arguments around arrive arrived asked asking asleep
+attack attention aunts avoid avoided awake aware awful badly balance based basic basically beach bears beautiful
+became because become becomes becoming bedroom before began begin beginning begins behind being beings belief
+believe believed believes belong below beside besides better between beyond birth birthday black blame blamed blood
+board bodies boring borrow bother bothered bothers bottle bottom bought brain brains bread break breaking breath
+breathe bright bring brings broke broken brought brown build building built burden business buying calls calmer
+camera cannot career careful carry carrying cases catch caught cause caused causes certain certainly chair chance
+change changed changes changing cheap check child childhood choice choices choose chose chosen church class classes
+clean clear clearly close closed closer clothes coffee college colour comes coming common company complete
+completely computer concern concerned confused control could count counting country couple course court cousins
+crazy cried cries crying cultural current daily damage dance dancing danger dangerous darker daughters dealing
+death decide decided decision decisions deeply degree depend depends deserve despite details development dinner
+direction dirty disease doctor doctors doing dollars double doubt drink drinking drive driving dropped during early
+earth easier easily eaten eating effect effort eight either elder element emotional emotions empty ended ending
+enemy energy enjoy enjoyed enough entire entirely environment especially evening event events every everything
+everywhere exactly example exams except excited exercise expect expected expensive experience explain explained
+extra faced faces facts failed failing failure fairly faith falling false families famous farther fault favourite
+fears feeling feelings feels fellow fewer field fight fighting figure filled final finally finding finds finish
+finished first floor flying focus follow followed force forced forever forgot forgotten forward fought found fourth
+frankly freedom fresh friend friendly friends front fully funny future games garden gather getting given gives
+giving glass goals going gotten grade grades great greater green ground group groups growing grown guess guilty
+habit habits hands happen happened happening happens happier harder hardly hated hates hating having heads health
+healthy heard hearing heart heavy hello helped helping helps herself hidden higher himself history hobby holding
+holiday honest honestly hoped hopes hoping horrible hospital hotel hours house houses however human humans hungry
+hurts ideas ignore ignored illness image imagine important inside instead interest interested interesting internet
+itself jealous joined judge juice killed kinda kitchen knees knowing knowledge known knows language large larger
+later laugh laughed laughing learn learned learning least leave leaves leaving legal lesson lessons letter level
+lives living local lonely longer looked looking looks loose losing loved lovely loves lower lucky lunch mainly
+major makes making manage managed manager married marry matter matters maybe meaning means meant medical medicine
+meeting meetings member members memory mental message middle might million minds minute minutes missed missing
+mistake mistakes modern moment money month months moral morning mostly mothers mouth moved movie movies moving
+music myself named names nature nearly needed needing needs neither nervous never night nights normal nothing
+notice noticed number nurse obvious obviously offer office often older online opened opinion order other others
+otherwise ourselves outside owned paper party passed patient pattern paying peace people perfect perhaps period
+person personal phone photo picked picture piece place places plain plans plant played player playing please
+pleasure point points police political poorly popular position possible power powerful practice prefer pregnant
+present pressure pretty price prison private probably problem problems process promise proper properly proud prove
+public pulled punished purpose pushed putting quickly quiet quite raised rarely rather reach reached react reading
+ready realise realize really reason reasons received recent recently record relationship relax relaxed religion
+remain remained replied report respect responsible result return returned right rights river rough round rules
+running safer safety saying scared scary school science scream season second secret seeing seemed seems selfish
+sense serious seriously service seven several shame shape share shared sharp shoes short should shoulder shout
+shouted showed shown shows sides silly simple simply since single sitting situation sleep sleeping slept slightly
+slowly small smaller smart smell smile smoke social society someone something sometimes somewhere songs sorry sound
+sounds space speak speaking special spend spending spent sport sports staff stage stand standing start started
+starting starts state station stayed staying steal still stole stomach stood stopped stories story straight strange
+stranger street stress stressed strong stronger struggle stuck student students study studying stuff stupid style
+subject succeed success suddenly suffer summer support supposed surely surprise surprised sweet system table taken
+takes taking talked talking talks taste taught teach teacher teachers teaching teams tears telling tells terrible
+tests thank thanks their theirs themselves there these thing things think thinking thinks third those though
+thought thoughts thousand three threw through throw tired today together tomorrow tonight total touch toward
+towards trade train training travel treat treated tried tries trouble truly truth trying turned twice under
+understand understood unless until upset upstairs usual usually value various visit voice waited waiting walked
+walking walls wanted wanting wants watch watched watching water weather wedding weekend weeks weight weird welcome
+whatever wheel whenever where whether which while white whole whose wider widow willing window winter within
+without woman women wonder wonderful wondering words worked worker working works world worried worries worry worse
+worst worth would write writing written wrong wrote yards years yelled yelling yesterday young younger yours
+yourself yourselves youth
+""".split())
@@ -2,184 +2,1047 @@
 ELIZA Chatbot
 Lydia Noureldin
 
+An Eliza object holds the script (reflections, psychobabble and Keywords) and is never changed once it is built,
+so one Eliza can be shared by any number of conversations. Everything that changes during a conversation
+(which responses have been used and the memory) is kept in a Session. analyze uses the Eliza's own default
+session unless it is given another one.
+
 Attributes:
     dict reflections
     string[][][] psychobabble
+    Pattern psychobabbleRegex
+    dict psychobabbleGroups
     Keyword[] keys
-    int[][] usedResponses
-    string[] memoryLis
+    Pattern[][] keyPatterns
+    string[][] keyLiterals
+    int[][] keyCosts
+    int psychobabbleCost
+    dict keyNames
+    int[][][] keyGotos
+    tuple[][][] keyTemplates
+    tuple[][] generalTemplates
+    function reflectCached
+    MatchCache matchCache
+    Normaliser normaliser
+    KeywordIndex keyIndex
+    FuzzyIndex fuzzyIndex
+    bool safeMatching
+    int maxInputLength
+    int matchBudget
+    string fallbackResponse
+    int[] keySlots
+    array keyCursorTemplate
+    array generalCursorTemplate
+    int version
+    dict migrations
+    MemoryPolicy memoryPolicy
+    selector selector
+    Session session
+    Metrics metrics
+    Profiler profiler
 
 Functions:
+    MatchBudgetError
     __init__
+    newSession
+    migrateSession
+    checkCursors
+    migrationPlan
+    enableMetrics
+    disableMetrics
+    getMetrics
+    startProfile
+    stopProfile
+    __getstate__
+    __setstate__
     reflect
+    formatResponse
+    compileTemplate
     analyze
-    getRankedResponse
+    analyzeTurn
+    analyzeMany
+    prepareTurn
+    planTurn
+    answerTurn
+    planMatch
+    hasLiterals
+    commitResponse
     getKey
-    leastUsedKeyResp
+    selectKeyResponse
     getGeneralResponse
-    leastUsedResponse
-    findPatternIndex
+    formatShared
+    selectGeneralResponse
     getHighestRank
     getWords
+    spendBudget
+    limitResponse
+    patternsConsume
     Mutators:
-        setUsedResponses
+        setFuzzyMatching
+        setSafeMatching
+        setMatchLimits
+        setSelector
+        setMemoryPolicy
+        setNormaliser
+        setKeyPatterns
+        setKeyLiterals
+        setMatchCosts
+        setGotoTargets
+        setTemplates
+        setReflectCache
+        setMatchCache
+        setCursorTemplates
+        setVersion
+        setPsychobabbleRegex
         setKeys
 '''
 
 import re
 import string  # used to get rid of punctuation efficiently
+import time
+import zlib
+from array import array
+from functools import lru_cache
+from FuzzyIndex import FuzzyIndex
 from Keyword import Keyword
+from MatchCache import MatchCache, MISSING
+from KeywordIndex import KeywordIndex
+from Memory import MemoryPolicy, DEFAULT_CAPACITY, DEFAULT_TTL
+from Metrics import Metrics
+from PatternParser import parsePattern, requiredLiterals
+from Profiler import Profiler
+from SafeMatcher import AlternationMatcher, SafeMatcher
+from Selector import RoundRobinSelector, makeSelector
+from Session import Session
+from Turn import Normaliser, Turn, CONTRACTIONS
+
+clock = time.perf_counter_ns  # the clock used to time the stages of a turn when metrics are enabled
+REFLECT_CACHE_SIZE = 4096  # how many reflected fragments are remembered, users repeat themselves a lot
+MATCH_CACHE_SIZE = 4096  # how many match decisions are remembered, for the same reason
+DEFAULT_FALLBACK = "That is a lot to take in. Could you put it more briefly?"  # the answer when a turn hits a limit
+LIMITED = (-1, -1, ())  # the plan of a turn that ran into a limit before its Keyword was found
+
+
+# raised while matching a turn that has used up its match budget (see Eliza.setMatchLimits)
+class MatchBudgetError(Exception):
+    pass
+
 
 class Eliza :
 
-    def __init__(self, refl, psychob):
+    # keys is the list of Keywords to use instead of the ones from setKeys (for example from ScriptLoader)
+    def __init__(self, refl, psychob, keys=None):
         self.reflections = refl
         self.psychobabble = psychob  # This is the general psychobabble that is only used if no keywords are matched
         self.keys = []
-        self.setKeys()
-        self.usedResponses = []
-        self.setUsedResponses()  # set the general array that keeps track of the responses in psychobable
-        self.memoryLis = []  # the list that will be used to store previous responses, giving Eliza memory
-
+        if keys is None:
+            self.setKeys()
+        else:
+            self.keys.extend(keys)
+            self.keys.sort(key=lambda x: x.rank, reverse=True)
+        self.safeMatching = False  # match with SafeMatchers instead of backtracking regular expressions
+        self.keyPatterns = []
+        self.setKeyPatterns()  # compile the regular expressions of every Keyword
+        self.keyLiterals = []
+        self.setKeyLiterals()  # find the text each regular expression needs, to skip it cheaply when that is missing
+        self.keyCosts = []
+        self.setMatchCosts()  # what matching each regular expression costs, for the match budget
+        self.maxInputLength = None  # longer statements are not matched at all, see setMatchLimits
+        self.matchBudget = None
+        self.fallbackResponse = DEFAULT_FALLBACK
+        self.keyNames = {}
+        self.keyGotos = []
+        self.setGotoTargets()  # find the Keyword every goto response goes to, raises ValueError if it can't
+        self.normaliser = None
+        self.setNormaliser()  # prepares every statement once per turn
+        self.keyIndex = KeywordIndex(self.keys, self.normaliser)  # finds the Keywords in a statement in one pass
+        self.fuzzyIndex = None  # corrects misspelt Keywords, only when fuzzy matching is turned on
+        self.keySlots = []
+        self.setCursorTemplates()  # set up the arrays that every new session copies its rotation state from
+        self.version = 0
+        self.setVersion()  # identifies the layout of the cursors, so sessions from other scripts can be migrated
+        self.migrations = {}  # version of another Eliza -> plan to migrate its sessions to this one
+        self.setPsychobabbleRegex()  # compile the psychobable patterns into one regular expression
+        self.keyTemplates = []
+        self.generalTemplates = []
+        self.setTemplates()  # parse every response once
+        self.setReflectCache()
+        self.matchCache = None
+        self.setMatchCache()  # remembers which Keyword and regular expression answer the statements seen before
+        self.memoryPolicy = MemoryPolicy()  # how many responses a session remembers and which ones it forgets
+        self.selector = RoundRobinSelector()  # picks the next response of a rule, unless a session has its own
+        self.session = None  # the default session, only created if analyze is called without a session
+        self.metrics = None  # collects counters and timings of every turn, only while metrics are enabled
+        self.profiler = None  # captures where the time of the next turns goes, only while a profile is taken
+
+    # Returns a new session for a conversation with this Eliza, none of its responses have been used yet.
+    # seed starts the session's random selector (sessions with the same seed pick the same responses) and selector
+    # is the name of the selector the session uses instead of the script's (see Selector.py)
+    def newSession(self, seed=0, selector=None):
+        session = Session(self.keyCursorTemplate[:], self.generalCursorTemplate[:])
+        session.randomState = seed & 0xFFFFFFFFFFFFFFFF
+        if selector is not None:
+            session.selector = makeSelector(selector, getattr(self.selector, "seed", 0))
+        session.version = self.version
+        return session
+
+    # Moves a session from the Eliza old (None if it is not known) over to this one, for example when a new version of
+    # the script is loaded. A cursor is kept if its Keyword (by name) still has the same regular expression, or the
+    # psychobable the same pattern, all others start again. Memory entries of Keywords that no longer exist are
+    # dropped, entries saved without the name of their Keyword (version 3 snapshots) are kept with their own rank.
+    # Returns how many memory entries were dropped
+    def migrateSession(self, session, old=None):
+        if old is not None and (len(session.keyCursors) != len(old.keyCursorTemplate) or
+                                len(session.generalCursors) != len(old.generalCursorTemplate)):
+            old = None  # the session does not fit old after all, start its cursors again
+        oldVersion = None if old is None else old.version
+        plan = self.migrations.get(oldVersion)
+        if plan is None:
+            plan = self.migrations[oldVersion] = self.migrationPlan(old)
+        keyMoves, generalMoves = plan
+        keyCursors = self.keyCursorTemplate[:]
+        for newSlot, oldSlot, numResponses in keyMoves:
+            keyCursors[newSlot] = session.keyCursors[oldSlot] % numResponses
+        generalCursors = self.generalCursorTemplate[:]
+        for newSlot, oldSlot, numResponses in generalMoves:
+            generalCursors[newSlot] = session.generalCursors[oldSlot] % numResponses
+        session.keyCursors = keyCursors
+        session.generalCursors = generalCursors
+        session.version = self.version
+        dropped = 0
+        if len(session.memory) != 0:
+            ranks = {aKey.name: aKey.rank for aKey in self.keys}
+            kept = [(response, ranks.get(keyName, rank), turn, keyName) for response, rank, turn, keyName in
+                    session.memory if keyName in ranks or keyName == ""]
+            dropped = len(session.memory) - len(kept)
+            session.memory.clear()
+            session.memory.extend(kept)
+            self.memoryPolicy.fit(session.memory)
+        if self.metrics is not None:
+            self.metrics.count("eliza_sessions_migrated_total")
+            if dropped != 0:
+                self.metrics.count("eliza_memory_total", (("event", "stale"),), dropped)
+        return dropped
+
+    # Raises ValueError if the cursors of a session restored from a snapshot for this script don't fit it: there must be
+    # one for each regular expression and psychobable pattern, each less than that rule's number of responses
+    def checkCursors(self, session):
+        if len(session.keyCursors) != len(self.keyCursorTemplate) or \
+                len(session.generalCursors) != len(self.generalCursorTemplate):
+            raise ValueError("session snapshot was saved with a different script")
+        for keyIndex in range(len(self.keys)):
+            slot = self.keySlots[keyIndex]
+            for responses in self.keys[keyIndex].reasmbLis:
+                if session.keyCursors[slot] >= len(responses):
+                    raise ValueError("session snapshot has a response cursor out of range")
+                slot += 1
+        for patternIndex in range(len(self.psychobabble)):
+            if session.generalCursors[patternIndex] >= len(self.psychobabble[patternIndex][1]):
+                raise ValueError("session snapshot has a response cursor out of range")
+
+    # Returns the plan migrateSession follows to move sessions of old (or None) to this Eliza:
+    # ([(new Keyword cursor slot, old slot, number of responses)], the same for the psychobable cursors)
+    def migrationPlan(self, old):
+        oldSlots = {}  # (Keyword name, regular expression) -> old slots, in order
+        oldPatterns = {}  # psychobable pattern -> old slots, in order
+        if old is not None:
+            for keyIndex in range(len(old.keys)):
+                aKey = old.keys[keyIndex]
+                for i in range(aKey.numRegex):
+                    oldSlots.setdefault((aKey.name, aKey.regexLis[i]), []).append(old.keySlots[keyIndex] + i)
+            for i in range(len(old.psychobabble)):
+                oldPatterns.setdefault(old.psychobabble[i][0], []).append(i)
+        keyMoves = []
+        for keyIndex in range(len(self.keys)):
+            aKey = self.keys[keyIndex]
+            for i in range(aKey.numRegex):
+                slots = oldSlots.get((aKey.name, aKey.regexLis[i]))
+                if slots:
+                    keyMoves.append((self.keySlots[keyIndex] + i, slots.pop(0), len(aKey.reasmbLis[i])))
+        generalMoves = []
+        for i in range(len(self.psychobabble)):
+            slots = oldPatterns.get(self.psychobabble[i][0])
+            if slots:
+                generalMoves.append((i, slots.pop(0), len(self.psychobabble[i][1])))
+        return keyMoves, generalMoves
+
+    # Starts collecting metrics about every turn and returns the Metrics object they are collected in.
+    # Every Keyword, regular expression and psychobable pattern starts with a hit count of 0 so rules that never
+    # fire show up in the metrics
+    def enableMetrics(self, metrics=None):
+        if metrics is None:
+            metrics = Metrics()
+        for aKey in self.keys:
+            metrics.count("eliza_keyword_hits_total", (("keyword", aKey.name),), 0)
+            for i in range(aKey.numRegex):
+                metrics.count("eliza_pattern_hits_total", (("keyword", aKey.name), ("pattern", i)), 0)
+        for pattern, responses in self.psychobabble:
+            metrics.count("eliza_psychobabble_hits_total", (("pattern", pattern),), 0)
+        if self.profiler is not None:
+            self.profiler.inner = metrics  # the profiler hands them back when it is done
+        else:
+            self.metrics = metrics
+        return metrics
+
+    # Stops collecting metrics, a turn then only pays for checking that metrics is None
+    def disableMetrics(self):
+        if self.profiler is not None:
+            self.profiler.inner = None
+        else:
+            self.metrics = None
+
+    # Returns the Metrics being collected or None if metrics are not enabled (metrics is the Profiler while a profile
+    # is being taken)
+    def getMetrics(self):
+        if self.profiler is not None:
+            return self.profiler.inner
+        return self.metrics
+
+    # Starts taking a profile of the next turns (see Profiler.py) and returns the Profiler it is taken in. It ends
+    # after turns turns or seconds seconds, whichever comes first (None for no limit), or when stopProfile is called.
+    # A profile that is already being taken is ended first
+    def startProfile(self, turns=None, seconds=None):
+        self.stopProfile()
+        patterns = {(aKey.name, i): aKey.regexLis[i] for aKey in self.keys for i in range(aKey.numRegex)}
+        profiler = Profiler(self.metrics, turns, seconds, patterns)
+        profiler.onFinish.append(self.stopProfile)
+        self.profiler = profiler
+        self.metrics = profiler  # every stage of a turn is now timed and passed on to the profiler
+        return profiler
+
+    # Ends the profile being taken and gives the metrics back (None if metrics are not enabled, which takes the turns
+    # back to the path that times nothing). Returns the Profiler, or None if no profile was being taken
+    def stopProfile(self):
+        profiler = self.profiler
+        if profiler is None:
+            return None
+        self.profiler = None
+        self.metrics = profiler.inner
+        profiler.finish()
+        return profiler
+
+    # What is saved when an Eliza is pickled (see ScriptLoader): the script without the default session or metrics
+    # (or the caches of reflected fragments and match decisions, which are rebuilt empty by __setstate__)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["session"] = None
+        state["metrics"] = None
+        state["profiler"] = None
+        del state["reflectCached"]
+        state["migrations"] = {}
+        state["matchCache"] = 0 if self.matchCache is None else self.matchCache.maxSize
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.setReflectCache()
+        self.setMatchCache(state["matchCache"])
+
+    # swaps the words of the fragment (lower cased) using reflections, in one pass over its words
     def reflect(self, fragment):
-        tokens = fragment.lower().split()
-        for i, token in enumerate(tokens):
-            if token in self.reflections:
-                tokens[i] = self.reflections[token]
-        return ' '.join(tokens)
-
-
-    def analyze(self, statement):
-        statement = statement.split(".")[0]
-        words = self.getWords(statement)  # break up the user input by " " in a list called words
-        # find the word in the user input with the highest rank if it exists and has reasembly rules that match the user's statement
-        maxRankIndex = self.getHighestRank(words, statement)
-        if maxRankIndex == -1:  # no keyword was found in the user input
-            # check if there is something saved in memory to use
-            if len(self.memoryLis) != 0:
-                response = self.memoryLis[0]
-                self.memoryLis.pop(0)  # removes the response
-            # Get general response from  psychobable and updated usedResponses list
-            else:
-                response = self.getGeneralResponse(statement)
-        else:  # Otherwise get a more specific response corresponding to the keyword and updated keys
-            # check if the response is worth remembering
-            if self.keys[maxRankIndex].rank > 2:
-                responseInMemory = self.getRankedResponse(statement, maxRankIndex)
-                self.memoryLis.append(responseInMemory)
-            response = self.getRankedResponse(statement, maxRankIndex)
-        return response
+        reflections = self.reflections
+        return ' '.join([reflections.get(token, token) for token in fragment.lower().split()])
+
+    # Fills a template from compileTemplate with the reflected groups of a match. Only the groups the template uses
+    # are reflected and the same fragments are not reflected again (see setReflectCache)
+    def formatResponse(self, template, groups):
+        formatString, slots = template
+        reflect = self.reflectCached
+        return formatString.format(*[reflect(groups[slot]) for slot in slots])
 
+    '''
+    Parses a response once so it can be filled in quickly on every turn.
+    Returns (format string, slots): the format string has the response's fields renumbered {0}, {1}, ... in order
+    of first use and slots are the group numbers they are filled with (offset by groupOffset, for patterns whose
+    groups don't start at the first group of the match). For example
+    "What about {1}, and {1}?" becomes ("What about {0}, and {0}?", (1,)).
+    '''
+    @staticmethod
+    def compileTemplate(response, groupOffset=0):
+        parts = []
+        slots = []
+        for literal, field, spec, conversion in string.Formatter().parse(response):
+            parts.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field is None:
+                continue
+            slot = int(field) + groupOffset
+            if slot not in slots:
+                slots.append(slot)
+            parts.append("{" + str(slots.index(slot)))
+            if conversion is not None:
+                parts.append("!" + conversion)
+            if spec:
+                parts.append(":" + spec)
+            parts.append("}")
+        return ("".join(parts), tuple(slots))
+
+
+    def analyze(self, statement, session=None):
+        return self.analyzeTurn(statement, session)[0]
+
+    # Same as analyze but returns (response, name of the Keyword that matched the statement) and the name is None
+    # if the response came from memory or psychobable (or is the fallback response of a turn that hit a limit)
+    def analyzeTurn(self, statement, session=None):
+        if session is None:
+            if self.session is None:
+                self.session = self.newSession()
+            session = self.session
+        metrics = self.metrics
+        if metrics is not None:
+            turnStart = clock()
+        turn = self.prepareTurn(statement)
+        if metrics is not None:
+            metrics.observe("tokenise", clock() - turnStart)
+        plan = self.planTurn(turn)
+        response, keyName, source = self.answerTurn(turn, plan, session)
+        if metrics is not None:
+            metrics.count("eliza_turns_total", (("source", source),))
+            if keyName is not None:
+                metrics.count("eliza_keyword_hits_total", (("keyword", keyName),))
+            metrics.observe("turn", clock() - turnStart)
+        return response, keyName
 
-    def getRankedResponse(self, statement, keyIndex):
-        # aKey is the keyword in the user's input statement that has the highest rank
-        # the keyIndex was determined from getHighestRank function
-        aKey = self.keys[keyIndex]
-        regExList = aKey.regexLis
+    '''
+    analyzeTurn for a batch of turns. pairs are (session id, statement) and sessions maps session ids to Sessions
+    (a new Session is added for an id it does not have). Returns the (response, keyword name) of every pair in the
+    order of pairs, exactly what calling analyzeTurn on each pair in turn would return.
+    Every distinct statement is normalised, scanned and matched once for the whole batch, and every distinct response
+    (the same template filled with the same groups) is formatted once (see formatShared). The turns are then grouped
+    by the rule that matched them, each turn still picks its response from its own session but the counters of a
+    group are updated once. With metrics every statement is timed like in analyzeTurn (tokenise and turn), the time
+    spent preparing and matching a statement counting towards its first turn in the batch.
+    A session's second turn in the batch is answered in a later round than its first (and so on) so the turns of
+    one session still happen in order.
+    '''
+    def analyzeMany(self, pairs, sessions):
+        metrics = self.metrics
+        if metrics is not None:
+            batchStart = clock()
+            metrics.count("eliza_batches_total")
+        # statement -> [Turn, plan, nanoseconds taken to prepare and plan it], so repeated statements are only
+        # prepared and matched once
+        turns = {}
+        rounds = []  # rounds[k] maps a rule (keyIndex, patternIndex), or None, to the sessions' k-th turns it matched
+        seen = {}  # session id -> number of its turns in the batch so far
+        numPairs = 0
+        for sessionId, statement in pairs:
+            prepared = turns.get(statement)
+            if prepared is None:
+                if metrics is None:
+                    turn = self.prepareTurn(statement)
+                    prepared = turns[statement] = [turn, self.planTurn(turn), 0]
+                else:
+                    start = clock()
+                    turn = self.prepareTurn(statement)
+                    metrics.observe("tokenise", clock() - start)
+                    plan = self.planTurn(turn)
+                    prepared = turns[statement] = [turn, plan, clock() - start]
+            session = sessions.get(sessionId)
+            if session is None:
+                session = sessions[sessionId] = self.newSession()
+            k = seen.get(sessionId, 0)
+            seen[sessionId] = k + 1
+            if k == len(rounds):
+                rounds.append({})
+            plan = prepared[1]
+            rule = None if plan is None else plan[:2]
+            group = rounds[k].get(rule)
+            if group is None:
+                group = rounds[k][rule] = []
+            group.append((numPairs, session, prepared))
+            numPairs += 1
+        results = [None] * numPairs
+        formats = {}  # (template, groups) -> response, so each distinct response is only formatted once
+        for groups in rounds:
+            for rule, group in groups.items():
+                sources = {}
+                keyHits = 0
+                for position, session, prepared in group:
+                    turn, plan = prepared[0], prepared[1]
+                    if metrics is None:
+                        response, keyName, source = self.answerTurn(turn, plan, session, formats)
+                    else:
+                        # the time preparing and planning the statement took goes to its first turn in the batch
+                        start = clock()
+                        response, keyName, source = self.answerTurn(turn, plan, session, formats)
+                        metrics.observe("turn", prepared[2] + clock() - start)
+                        prepared[2] = 0
+                    results[position] = (response, keyName)
+                    sources[source] = sources.get(source, 0) + 1
+                    if keyName is not None:
+                        keyHits += 1
+                if metrics is not None:
+                    for source, amount in sources.items():
+                        metrics.count("eliza_turns_total", (("source", source),), amount)
+                    if keyHits != 0:
+                        metrics.count("eliza_keyword_hits_total", (("keyword", self.keys[rule[0]].name),), keyHits)
+        if metrics is not None:
+            metrics.observe("batch", clock() - batchStart)
+        return results
+
+    # Returns the Turn for a statement, which is prepared once: cut at the first ".", contractions expanded, broken up
+    # into words and, with fuzzy matching, misspelt Keywords corrected. A statement longer than maxInputLength is
+    # not prepared at all, its Turn is empty and marked as having hit the length limit
+    def prepareTurn(self, statement):
+        if self.maxInputLength is not None and len(statement) > self.maxInputLength:
+            turn = Turn(statement, "", "", [])
+            turn.limit = "length"
+            return turn
+        turn = self.normaliser.normalise(statement)
+        if self.fuzzyIndex is None:
+            return turn
+        turn, fixes = self.fuzzyIndex.correct(turn)
+        if self.metrics is not None:
+            for typed, meant in fixes:
+                self.metrics.count("eliza_fuzzy_corrections_total", (("word", meant),))
+        return turn
+
+    # Returns the match plan (see planMatch) of the Keyword with the highest rank in the statement of a turn that has a
+    # matching regular expression, or None. This only plans the match, no response has been picked yet. The plan
+    # only depends on the statement so it is taken from the match cache if the statement has been seen before.
+    # Returns LIMITED if the turn hit a limit (see setMatchLimits), which is never cached
+    def planTurn(self, turn):
+        if turn.limit is not None:
+            return LIMITED
+        turn.budget = self.matchBudget
+        try:
+            cache = self.matchCache
+            if cache is None:
+                return self.getHighestRank(turn)
+            metrics = self.metrics
+            plan = cache.get(turn.stripped)
+            if plan is MISSING:
+                plan = self.getHighestRank(turn)
+                evicted = cache.put(turn.stripped, plan)
+                if metrics is not None:
+                    metrics.count("eliza_match_cache_total", (("event", "miss"),))
+                    if evicted:
+                        metrics.count("eliza_match_cache_total", (("event", "eviction"),))
+            elif metrics is not None:
+                metrics.count("eliza_match_cache_total", (("event", "hit"),))
+            return plan
+        except MatchBudgetError:
+            return LIMITED
+
+    # Answers a turn of a session given its plan from planTurn and updates the session.
+    # Returns (response, name of the Keyword that answered or None, where the response came from)
+    # A turn that hits a limit gets the fallback response, a goto may have used a response of the session by then.
+    # formats is given when answering a batch (see analyzeMany and formatShared)
+    def answerTurn(self, turn, plan, session, formats=None):
+        session.turns += 1
+        if plan is LIMITED:
+            return self.limitResponse(turn)
+        turn.budget = self.matchBudget  # answering (gotos and psychobabble) has a budget of its own
+        metrics = self.metrics
+        try:
+            response = None
+            keyName = None
+            source = "keyword"
+            if plan is not None:  # get a more specific response corresponding to the keyword and update the session
+                # check if the response is worth remembering
+                if self.keys[plan[0]].rank > 2:
+                    responseInMemory = self.commitResponse(turn, plan, session, formats)
+                    if responseInMemory is not None:
+                        aKey = self.keys[plan[0]]
+                        evicted = self.memoryPolicy.store(session, responseInMemory, aKey.rank, aKey.name)
+                        if metrics is not None and evicted is not None:
+                            metrics.count("eliza_memory_total", (("event", "stored"),))
+                            if evicted != 0:
+                                metrics.count("eliza_memory_total", (("event", "evicted"),), evicted)
+                response = self.commitResponse(turn, plan, session, formats)
+                if response is not None:
+                    keyName = self.keys[plan[0]].name
+            if response is None:  # no keyword was found in the user input (or its goto led nowhere)
+                # check if there is something saved in memory to use (this removes it from memory)
+                if len(session.memory) != 0:
+                    response, expired = self.memoryPolicy.recall(session)
+                    if metrics is not None and expired != 0:
+                        metrics.count("eliza_memory_total", (("event", "expired"),), expired)
+                    if response is not None:
+                        source = "memory"
+                        if metrics is not None:
+                            metrics.count("eliza_memory_total", (("event", "recalled"),))
+                # Get general response from  psychobable and update the session
+                if response is None:
+                    response = self.getGeneralResponse(turn, session, formats)
+                    source = "psychobabble"
+        except MatchBudgetError:  # a goto or psychobabble ran out of budget
+            return self.limitResponse(turn)
+        return response, keyName, source
+
+    # The match plan stage: finds the first regular expression of the Keyword at keyIndex that matches the statement.
+    # Returns the plan (keyIndex, patternIndex, groups) or None if no regular expression matches.
+    # Each regular expression is run at most once and nothing is updated, so it is safe to call while searching.
+    # Raises MatchBudgetError if the turn can't afford to run the next regular expression
+    def planMatch(self, turn, keyIndex):
+        regExList = self.keyPatterns[keyIndex]
+        literalsList = self.keyLiterals[keyIndex]
+        stripped = turn.stripped
+        metrics = self.metrics
         # loop through the list of regular expressions associated with the keyword and see if
         # the statement matches any of them
         for i in range(len(regExList)):
-            pattern = regExList[i]  # current regEx pattern
-            match = re.match(pattern, statement.rstrip(".!"))
+            literals = literalsList[i]
+            # a regular expression can't match if the text it needs is not in the statement (in order), finding that
+            # out with str.find is far cheaper than letting the regular expression backtrack
+            if literals is not None and (literals not in stripped if literals.__class__ is str else
+                                         not self.hasLiterals(stripped, literals)):
+                if metrics is not None:
+                    metrics.count("eliza_pattern_prefiltered_total",
+                                  (("keyword", self.keys[keyIndex].name), ("pattern", i)))
+                continue
+            if turn.budget is not None:
+                self.spendBudget(turn, self.keyCosts[keyIndex][i])
+            if metrics is None:
+                match = regExList[i].match(stripped)
+            else:
+                start = clock()
+                match = regExList[i].match(stripped)
+                elapsed = clock() - start
+                labels = (("keyword", self.keys[keyIndex].name), ("pattern", i))
+                metrics.count("eliza_pattern_evaluations_total", labels)
+                metrics.count("eliza_pattern_seconds_total", labels, elapsed / 1e9)
+                metrics.observe("match", elapsed)
+                if match:
+                    metrics.count("eliza_pattern_hits_total", labels)
             if match:  # a match was found
-                # Get the least used response
-                response = self.leastUsedKeyResp(i, keyIndex)
-                # Check if it is a goto statement
-                tokens = self.getWords(response)
-                # this goto statement allows Keyword's to have regular expressions that use reassembly rules from a
-                # different Keyword
-                if "goto" in tokens :
-                    newKeyIndex = self.getKey(tokens[1]) # tokens[1] is the name of the keyword we need to go to
-                    self.getRankedResponse(statement, newKeyIndex)
-                # return the formatted response
-                else:
-                    return response.format(*[self.reflect(g) for g in match.groups()])
+                return (keyIndex, i, match.groups())
+        return None
+
+    # Takes what matching a pattern of cost (see setMatchCosts) against the statement of turn can take from its budget,
+    # raises MatchBudgetError (and marks the turn) if there is not enough left
+    @staticmethod
+    def spendBudget(turn, cost):
+        steps = cost * (len(turn.stripped) + 1)
+        if steps > turn.budget:
+            turn.limit = "budget"
+            raise MatchBudgetError()
+        turn.budget -= steps
+
+    # True if every one of literals is in text, in that order and without overlapping
+    @staticmethod
+    def hasLiterals(text, literals):
+        position = 0
+        for literal in literals:
+            position = text.find(literal, position)
+            if position == -1:
+                return False
+            position += len(literal)
+        return True
+
+    # The commit stage: picks the least used response for a plan from planMatch, records in the session that it was
+    # used and returns it formatted. Returns None if the response is a goto to a Keyword that does not match
+    def commitResponse(self, turn, plan, session, formats=None):
+        keyIndex, patternIndex, groups = plan
+        # Get the next response
+        responseIndex = self.selectKeyResponse(patternIndex, keyIndex, session)
+        # Check if it is a goto statement, this goto statement allows Keyword's to have regular expressions that use
+        # reassembly rules from a different Keyword. The Keyword it goes to was found when the script was built
+        newKeyIndex = self.keyGotos[keyIndex][patternIndex][responseIndex]
+        metrics = self.metrics
+        if newKeyIndex != -1:
+            if metrics is not None:
+                start = clock()
+                metrics.count("eliza_goto_total", (("keyword", self.keys[keyIndex].name),
+                                                   ("target", self.keys[newKeyIndex].name)))
+            newPlan = self.planMatch(turn, newKeyIndex)
+            if metrics is not None:
+                metrics.observe("goto", clock() - start)
+            if newPlan is None:
+                return None
+            return self.commitResponse(turn, newPlan, session, formats)
+        template = self.keyTemplates[keyIndex][patternIndex][responseIndex]
+        if len(turn.fixes) != 0:  # reflect the words as typed, not as fuzzy matching corrected them
+            groups = FuzzyIndex.restore(groups, turn.fixes)
+        # return the formatted response
+        if formats is not None:
+            return self.formatShared(template, groups, formats)
+        if metrics is None:
+            return self.formatResponse(template, groups)
+        start = clock()
+        response = self.formatResponse(template, groups)
+        metrics.observe("format", clock() - start)
+        return response
 
     # finds the key index of a Keyword supplied its name, returns -1 if no Keyword has that name
     def getKey(self, keyName):
-        for i in range(len(self.keys)) :
-            if keyName == self.keys[i].name :
-                return i
-        return -1
-
-
-    # this returns the response that has been used the least
-    #  and updates the Keyword attribute that keeps track of it
-    def leastUsedKeyResp(self, patternIndex, keyIndex):
-        aKey = self.keys[keyIndex]  # Keyword that was matched
-        # usedResp is the list of ints that corresponds to that pattern (regular expression)
-        usedResp = aKey.usedResp[patternIndex]  # usedResp is of type int[][] keeps track of which resp have been used
-        leastIndex = usedResp.index(min(usedResp))
-        resp = aKey.reasmbLis[patternIndex][leastIndex]
-        # update the Keywords usedResp list (keeps track of how many times each response is used)
-        self.keys[keyIndex].updateUsedResp(patternIndex, leastIndex)
-        # return the least used response
-        return resp
+        return self.keyNames.get(keyName, -1)
+
+
+    # this returns the index of the next response of a Keyword regular expression and records in the session that it
+    # was used. The session's selector (or the script's) picks it, the default gives the responses out in order so
+    # the session only has to keep a cursor for each regular expression
+    def selectKeyResponse(self, patternIndex, keyIndex, session):
+        numResponses = len(self.keys[keyIndex].reasmbLis[patternIndex])
+        slot = self.keySlots[keyIndex] + patternIndex  # where the cursor of this regular expression is kept
+        selector = session.selector
+        if selector is None:
+            selector = self.selector
+        return selector.select(session.keyCursors, slot, numResponses, session)
 
     # This generates and returns general response from the psychobable
     # Only called if no keywords are found in the user input statement
-    def getGeneralResponse(self, statement):
-        for pattern, responses in self.psychobabble:
-            match = re.match(pattern, statement.rstrip(".!"))
-            if match:
-                patternIndex = self.findPatternIndex(pattern)
-                response = self.leastUsedResponse(patternIndex)
-                return response.format(*[self.reflect(g) for g in match.groups()])
-
-    def leastUsedResponse(self, patternIndex):
-        leastIndex = self.usedResponses[patternIndex][1].index(min(self.usedResponses[patternIndex][1]))
-        self.usedResponses[patternIndex][1][leastIndex] += 1  # update usedResponses because now we are going to use that response
-        # return the least used response
-        return self.psychobabble[patternIndex][1][leastIndex]
-
-    # Returns the index of the supplied "pattern" (regular expression) in the nested list from the psychobable
-    def findPatternIndex(self, pattern):
-        for i in range(len(self.psychobabble)):
-            if pattern == self.psychobabble[i][0]:
-                return i
+    def getGeneralResponse(self, turn, session, formats=None):
+        metrics = self.metrics
+        if metrics is not None:
+            start = clock()
+        # a single match tries every psychobable pattern in order, the group that matched tells us which one it was
+        if turn.budget is not None:
+            self.spendBudget(turn, self.psychobabbleCost)
+        match = self.psychobabbleRegex.match(turn.stripped)
+        if metrics is not None:
+            metrics.observe("psychobabble", clock() - start)
+        if match:
+            patternIndex = self.psychobabbleGroups[match.lastindex][0]
+            # the template's slots already point at this pattern's groups within the combined match
+            template = self.generalTemplates[patternIndex][self.selectGeneralResponse(patternIndex, session)]
+            groups = match.groups()
+            if len(turn.fixes) != 0:
+                groups = FuzzyIndex.restore(groups, turn.fixes)
+            if metrics is None:
+                if formats is not None:
+                    return self.formatShared(template, groups, formats)
+                return self.formatResponse(template, groups)
+            metrics.count("eliza_psychobabble_hits_total", (("pattern", self.psychobabble[patternIndex][0]),))
+            if formats is not None:
+                return self.formatShared(template, groups, formats)
+            start = clock()
+            response = self.formatResponse(template, groups)
+            metrics.observe("format", clock() - start)
+            return response
+
+    # Formats template with groups like formatResponse, but only once per batch: formats maps the (template, groups)
+    # already formatted in the batch to their response. Turns of many sessions that matched the same rule with the
+    # same words get the same response, so a batch formats each of them once
+    def formatShared(self, template, groups, formats):
+        response = formats.get((template, groups))
+        if response is not None:
+            return response
+        metrics = self.metrics
+        if metrics is None:
+            response = self.formatResponse(template, groups)
+        else:
+            start = clock()
+            response = self.formatResponse(template, groups)
+            metrics.observe("format", clock() - start)
+        formats[(template, groups)] = response
+        return response
 
-    # Gets the word with the highest rank that is in the user's input statement
-    # Returns the index of the Keyword in keys that has the highest rank or -1 if it does not exist
-    def getHighestRank(self, words, statement):
+    # returns the index of the next psychobable response for the pattern and records that it was used
+    def selectGeneralResponse(self, patternIndex, session):
+        numResponses = len(self.psychobabble[patternIndex][1])
+        selector = session.selector
+        if selector is None:
+            selector = self.selector
+        return selector.select(session.generalCursors, patternIndex, numResponses, session)
+
+    # Gets the word with the highest rank that is in the user's input statement and has a matching regular expression
+    # Returns the match plan (see planMatch) for that Keyword or None if it does not exist
+    def getHighestRank(self, turn):
         # Find the keyword with the highest rank in the statment if one exists
-        for keyIndex in range(len(self.keys)):
-            maxRank = self.keys[keyIndex]
-            for aWord in words:
-                # check if the word matches the Keyword's name or any of its synonyms
-                if (aWord == maxRank.name or aWord in maxRank.synonyms) and self.getRankedResponse(statement, keyIndex) is not None:
-                    # this will automatically be the Keyword with the highest rank because
-                    # the list is ordered by decreasing rank
-                    return keyIndex
-        # If no keywords in the sentence return -1
-        return -1
+        # the index returns every Keyword whose name or synonyms (including multi-word ones) are in the statement
+        metrics = self.metrics
+        if metrics is None:
+            candidates = self.keyIndex.scan(turn.words)
+        else:
+            start = clock()
+            candidates = self.keyIndex.scan(turn.words)
+            metrics.observe("scan", clock() - start)
+        for keyIndex in candidates:
+            plan = self.planMatch(turn, keyIndex)
+            if plan is not None:
+                # this will automatically be the Keyword with the highest rank because
+                # the list is ordered by decreasing rank
+                return plan
+        # If no keywords in the sentence return None
+        return None
 
 
     # formats the statement (removes punctuation, and lower case) and splits it into a list of words
     def getWords(self, statement):
-        # remove punctuation from statement
-        exclude = set(string.punctuation)
-        s = ''.join(ch for ch in statement if ch not in exclude)
-        lowS = s.lower()
-        words = (lowS.split(" "))  # The array with each word from the statement (no punctuation, all lower case)
-        return words
+        return self.normaliser.splitWords(statement)
+
+    # Returns the answer (see answerTurn) to a turn that hit a limit
+    def limitResponse(self, turn):
+        if self.metrics is not None:
+            self.metrics.count("eliza_turn_limits_total", (("limit", turn.limit),))
+        return self.fallbackResponse, None, "limit"
+
+    # Sets up the cache of match decisions (see MatchCache.py) that keeps maxSize decisions, 0 turns it off
+    def setMatchCache(self, maxSize=MATCH_CACHE_SIZE):
+        self.matchCache = MatchCache(maxSize) if maxSize > 0 else None
+
+    # Turns on typo tolerant Keyword matching (see FuzzyIndex.py): a word of a statement up to maxDistance edits away
+    # from a Keyword name or synonym of one word is read as that word when the Keyword is chosen. 0 turns it off
+    def setFuzzyMatching(self, maxDistance):
+        if maxDistance < 0:
+            raise ValueError("the fuzzy matching distance must not be negative")
+        if self.matchCache is not None:
+            self.matchCache.clear()  # its decisions were made without (or with other) corrections
+        if maxDistance == 0:
+            self.fuzzyIndex = None
+            return
+        entries = {}  # name or synonym of one word -> index of the highest ranked Keyword using it
+        for keyIndex in range(len(self.keys)):
+            aKey = self.keys[keyIndex]
+            for entry in [aKey.name] + aKey.synonyms:
+                words = [aWord for aWord in self.normaliser.splitWords(self.normaliser.expand(entry)) if aWord != ""]
+                if len(words) == 1:  # a word out of a phrase ("knows" in "for all one knows") is not the Keyword
+                    entries.setdefault(words[0], keyIndex)
+        known = set(self.reflections) | set(self.reflections.values())
+        patterns = [pattern for aKey in self.keys for pattern in aKey.regexLis]
+        patterns.extend(pattern for pattern, responses in self.psychobabble)
+        for pattern in patterns:
+            known.update(re.findall(r"[a-z]+", pattern.lower()))
+        self.fuzzyIndex = FuzzyIndex(entries, known, maxDistance)
+
+    # Turns safe matching on or off. With it on every regular expression PatternParser can read (so far all the
+    # ones the scripts use) is matched by a SafeMatcher, in time linear in the length of the statement, with the
+    # same results. Returns the patterns that are still matched by backtracking regular expressions
+    def setSafeMatching(self, enabled):
+        self.safeMatching = enabled
+        self.setKeyPatterns()
+        self.setPsychobabbleRegex()
+        if not enabled:
+            return []
+        unsafe = [pattern for aKey in self.keys for pattern in aKey.regexLis if parsePattern(pattern) is None]
+        unsafe.extend(pattern for pattern, responses in self.psychobabble if parsePattern(pattern) is None)
+        return unsafe
+
+    # Sets the limits on the work of a turn, None for no limit. A statement longer than maxInputLength characters
+    # is not matched and a turn may take at most matchBudget steps of matching to find its Keyword (and as many again
+    # to answer it, for gotos and psychobabble). Running a pattern of cost c (see setMatchCosts) against a statement
+    # of n characters takes c * (n + 1) steps, the most a SafeMatcher can take. A turn that hits a limit is answered
+    # with fallback. Raises ValueError if a limit is not a positive integer
+    def setMatchLimits(self, maxInputLength=None, matchBudget=None, fallback=DEFAULT_FALLBACK):
+        for name, limit in (("maximum input length", maxInputLength), ("match budget", matchBudget)):
+            if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+                raise ValueError("the " + name + " must be a positive integer")
+        self.maxInputLength = maxInputLength
+        self.matchBudget = matchBudget
+        self.fallbackResponse = fallback
+
+    # Sets the selector that picks the responses of every session that has not picked its own (see Selector.py),
+    # raises ValueError if there is no selector called name
+    def setSelector(self, name, seed=0):
+        self.selector = makeSelector(name, seed)
+
+    # Sets how many responses each session remembers and which one is forgotten when memory is full (see Memory.py),
+    # raises ValueError if the policy can't be used. Sessions that already remember more are trimmed when they next
+    # store a response
+    def setMemoryPolicy(self, capacity=DEFAULT_CAPACITY, eviction="oldest", ttl=DEFAULT_TTL):
+        self.memoryPolicy = MemoryPolicy(capacity, eviction, ttl)
+
+    # Sets up the Normaliser that prepares each statement. It expands the usual contractions except the ones the
+    # script handles itself, which have to be kept as typed: the reflections (like "i've") and the contractions a
+    # Keyword regular expression or psychobable pattern matches but not once expanded (like "I'm" for I\'?m (.*)).
+    # Patterns are case sensitive, so a contraction and the same one with a capital are checked separately
+    def setNormaliser(self):
+        patterns = [re.compile(pattern) for aKey in self.keys for pattern in aKey.regexLis]
+        patterns.extend(re.compile(pattern) for pattern, responses in self.psychobabble)
+        contractions = {}
+        kept = set()
+        for contraction, expansion in CONTRACTIONS.items():
+            if contraction in self.reflections:
+                continue
+            contractions[contraction] = expansion
+            for typed, expanded in [(contraction, expansion),
+                                    (contraction[0].upper() + contraction[1:], expansion[0].upper() + expansion[1:])]:
+                if self.patternsConsume(patterns, typed, expanded):
+                    kept.add(typed)
+        self.normaliser = Normaliser(contractions, kept)
+
+    # True if one of patterns matches a statement with the contraction typed in it that it does not match with the
+    # contraction expanded, at the start of the statement or after a word
+    @staticmethod
+    def patternsConsume(patterns, typed, expanded):
+        for before, after in [("", " x"), ("x ", " x")]:
+            for pattern in patterns:
+                if pattern.match(before + typed + after) and not pattern.match(before + expanded + after):
+                    return True
+        return False
+
+    # Compiles the regular expressions of every Keyword once, keyPatterns[keyIndex][i] is the compiled
+    # version of keys[keyIndex].regexLis[i] (a SafeMatcher with safe matching on, if it can be matched safely)
+    def setKeyPatterns(self):
+        self.keyPatterns = []
+        for aKey in self.keys:
+            compiled = []
+            for pattern in aKey.regexLis:
+                if self.safeMatching and parsePattern(pattern) is not None:
+                    compiled.append(SafeMatcher(pattern))
+                else:
+                    compiled.append(re.compile(pattern))
+            self.keyPatterns.append(compiled)
+
+    # Finds the text every match of each Keyword regular expression has to contain (see PatternParser.py).
+    # keyLiterals[keyIndex][i] is the text keys[keyIndex].regexLis[i] needs (the tuple of texts, in the order they
+    # appear, if it needs more than one) or None if it needs none or is not a pattern PatternParser can read (it is
+    # then always run)
+    def setKeyLiterals(self):
+        self.keyLiterals = []
+        for aKey in self.keys:
+            literalsList = []
+            for pattern in aKey.regexLis:
+                parts = parsePattern(pattern)
+                literals = [] if parts is None else requiredLiterals(parts)
+                if len(literals) == 0:
+                    literalsList.append(None)
+                elif len(literals) == 1:
+                    literalsList.append(literals[0])
+                else:
+                    literalsList.append(tuple(literals))
+            self.keyLiterals.append(literalsList)
+
+    # Works out what matching each pattern costs for the match budget: keyCosts[keyIndex][i] for
+    # keys[keyIndex].regexLis[i] and psychobabbleCost for all the psychobable patterns. It is the number of parts of
+    # the pattern plus one (see PatternParser.py), or its length plus one if PatternParser can't read it
+    def setMatchCosts(self):
+        def costOf(pattern):
+            parts = parsePattern(pattern)
+            return len(pattern) + 1 if parts is None else len(parts) + 1
+        self.keyCosts = [[costOf(pattern) for pattern in aKey.regexLis] for aKey in self.keys]
+        self.psychobabbleCost = sum(costOf(pattern) for pattern, responses in self.psychobabble)
 
     '''
-    Initializes the usedResponse list
-    For example the first element of psychobable is:
-    ['I need (.*)', ['Why do you need {0}?', 'Would it really help you to get {0}?', 'Are you sure you need {0}?']]
-    So the stored usedResponses will be:
-    ['I need (.*)', [0, 0, 0]]
-    Zeroes indicating that none of those responses have been used before
+    Resolves every "goto <keyword>" response to the index of the Keyword it goes to, so a turn never has to look
+    for it. keyGotos[keyIndex][patternIndex][responseIndex] is that index, or -1 if the response is not a goto.
+    keyNames maps each Keyword's name to its index.
+    Raises ValueError listing every goto to a Keyword that does not exist and every cycle of gotos (a Keyword that
+    can end up going back to itself within one turn)
+    '''
+    def setGotoTargets(self):
+        self.keyNames = {}
+        for i in range(len(self.keys)):
+            self.keyNames.setdefault(self.keys[i].name, i)
+        problems = []
+        self.keyGotos = []
+        edges = []  # edges[keyIndex] is the set of Keywords that Keyword can go to
+        for aKey in self.keys:
+            patternGotos = []
+            targets = set()
+            for responses in aKey.reasmbLis:
+                responseGotos = []
+                for response in responses:
+                    target = -1
+                    if response.startswith("goto "):
+                        targetName = response[len("goto "):].strip()
+                        target = self.keyNames.get(targetName, -1)
+                        if target == -1:
+                            problems.append("keyword " + repr(aKey.name) + " goes to unknown keyword " +
+                                            repr(targetName))
+                        else:
+                            targets.add(target)
+                    responseGotos.append(target)
+                patternGotos.append(tuple(responseGotos))
+            self.keyGotos.append(patternGotos)
+            edges.append(targets)
+        # depth first search for cycles, state is 0 for not visited, 1 while on the current path, 2 when done
+        state = [0] * len(self.keys)
+        for start in range(len(self.keys)):
+            if state[start] != 0:
+                continue
+            path = [start]
+            stack = [iter(sorted(edges[start]))]
+            state[start] = 1
+            while len(stack) != 0:
+                target = next(stack[-1], None)
+                if target is None:
+                    state[path.pop()] = 2
+                    stack.pop()
+                elif state[target] == 1:
+                    cycle = path[path.index(target):] + [target]
+                    problems.append("goto cycle: " + " -> ".join(self.keys[i].name for i in cycle))
+                elif state[target] == 0:
+                    state[target] = 1
+                    path.append(target)
+                    stack.append(iter(sorted(edges[target])))
+        if len(problems) != 0:
+            raise ValueError("\n".join(problems))
+
+    '''
+    Parses every response with compileTemplate. keyTemplates[keyIndex][patternIndex][responseIndex] is the template
+    of a Keyword response (None for a goto, which is never formatted) and generalTemplates[patternIndex][responseIndex]
+    the template of a psychobable response. match.groups() of the combined psychobable regular expression holds
+    the groups of every pattern, so psychobable templates are offset to their own pattern's groups.
+    Needs setGotoTargets and setPsychobabbleRegex to have been called.
+    '''
+    def setTemplates(self):
+        self.keyTemplates = []
+        for keyIndex in range(len(self.keys)):
+            patternTemplates = []
+            reasmbLis = self.keys[keyIndex].reasmbLis
+            for patternIndex in range(len(reasmbLis)):
+                templates = []
+                for responseIndex in range(len(reasmbLis[patternIndex])):
+                    if self.keyGotos[keyIndex][patternIndex][responseIndex] != -1:
+                        templates.append(None)
+                    else:
+                        templates.append(self.compileTemplate(reasmbLis[patternIndex][responseIndex]))
+                patternTemplates.append(templates)
+            self.keyTemplates.append(patternTemplates)
+        self.generalTemplates = [None] * len(self.psychobabble)
+        for patternIndex, firstGroup, endGroup in self.psychobabbleGroups.values():
+            responses = self.psychobabble[patternIndex][1]
+            # match.groups()[0] is group 1, so this pattern's first group is at firstGroup - 1
+            self.generalTemplates[patternIndex] = [self.compileTemplate(response, firstGroup - 1)
+                                                   for response in responses]
+
+    # Sets up reflectCached, a version of reflect that remembers the most recently reflected fragments.
+    # It is safe to share between conversations because the reflections never change
+    def setReflectCache(self):
+        self.reflectCached = lru_cache(maxsize=REFLECT_CACHE_SIZE)(self.reflect)
+
+    # Sets version to a number that identifies the layout of the cursors (the Keywords, their regular expressions
+    # and psychobable patterns and how many responses each has), so the same script always has the same version.
+    # 0 is kept for sessions whose version is not known
+    def setVersion(self):
+        layout = [(aKey.name, aKey.rank, [(aKey.regexLis[i], len(aKey.reasmbLis[i])) for i in range(aKey.numRegex)])
+                  for aKey in self.keys]
+        layout.append([(pattern, len(responses)) for pattern, responses in self.psychobabble])
+        self.version = zlib.crc32(repr(layout).encode("utf-8")) or 1
 
     '''
-    def setUsedResponses(self):
-        self.usedResponses = []  # list of used responses, this is used to avoid repetitions
+    Sets up the arrays that a new Session copies to keep track of which responses it has used.
+    There is one cursor (the index of the next response to use) for every regular expression of every Keyword,
+    keySlots[keyIndex] is where the cursors of the Keyword at keyIndex start. For example if the first Keyword
+    has 3 regular expressions its cursors are slots 0, 1 and 2 and the second Keyword's start at slot 3.
+    There is also one cursor for every pattern in psychobable.
+    Zeroes indicate that none of the responses have been used before
+    '''
+    def setCursorTemplates(self):
+        self.keySlots = []
+        numSlots = 0
+        for aKey in self.keys:
+            self.keySlots.append(numSlots)
+            numSlots += aKey.numRegex
+        # 'H' is an unsigned 2 byte int, plenty for the number of responses of a regular expression
+        self.keyCursorTemplate = array('H', bytes(2 * numSlots))
+        self.generalCursorTemplate = array('H', bytes(2 * len(self.psychobabble)))
+
+    '''
+    Compiles every psychobable pattern into one regular expression of the form (pattern0)|(pattern1)|...
+    Alternatives are tried from left to right so the first pattern in the psychobable list still wins.
+    psychobabbleGroups maps the group number of each alternative to
+    (index of the pattern in psychobable, number of its first group, number after its last group)
+    so the pattern's own groups can be read from the combined match.
+    With safe matching on an AlternationMatcher takes its place, if every pattern can be matched safely.
+    '''
+    def setPsychobabbleRegex(self):
+        alternatives = []
+        self.psychobabbleGroups = {}
+        groupNum = 1  # group 0 is the whole match
         for i in range(len(self.psychobabble)):
-            self.usedResponses.append([])
-            self.usedResponses[i].append(self.psychobabble[i][0])  # make the frist value of the list the regular expression
-            self.usedResponses[i].append([])
-            for j in range(len(self.psychobabble[i][1])):  # this is always 2
-                self.usedResponses[i][1].append(0)  # set value to 0 because we have not used any of the responses yet
+            pattern = self.psychobabble[i][0]
+            numGroups = re.compile(pattern).groups
+            self.psychobabbleGroups[groupNum] = (i, groupNum + 1, groupNum + 1 + numGroups)
+            alternatives.append("(" + pattern + ")")
+            groupNum += 1 + numGroups
+        patterns = [pattern for pattern, responses in self.psychobabble]
+        if self.safeMatching and all(parsePattern(pattern) is not None for pattern in patterns):
+            self.psychobabbleRegex = AlternationMatcher(patterns)
+        else:
+            self.psychobabbleRegex = re.compile("|".join(alternatives))
 
     # this sets up the keyword objects and puts them in a list, the keys attribute
     def setKeys(self):
@@ -0,0 +1,429 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+An asyncio server that hosts many conversations with Eliza at the same time, over TCP or a Unix socket.
+Each conversation is identified by a session id chosen by the client and has its own Session, so the rotation
+counters and memory of one conversation never affect another. Every Session shares the server's one Eliza (the
+compiled Keywords and psychobable).
+
+The protocol is one JSON object per line in each direction:
+    {"session": "abc", "statement": "i am sad"}   ->   {"session": "abc", "response": "..."}
+    {"session": "abc", "end": true}               ->   {"session": "abc", "ended": true}
+    {"metrics": true}                             ->   {"metrics": "<Prometheus text>"}
+    {"profile": {"turns": 1000, "seconds": 30}}   ->   {"profiling": true}
+    {"profile": "report", "top": 10}              ->   {"profile": {"turns": ..., "stacks": ..., ...}}
+A request that can't be handled gets {"error": "..."} back (with the session id if there was one), and so does a
+request that fails in an unexpected way, without closing the connection. A session id is a string of at most
+MAX_SESSION_ID_LENGTH characters that can be encoded as UTF-8 (see checkSessionId).
+
+Requests on a connection are answered in order and the next request is only read once the previous response
+has been taken by the client, so a slow client can't make the server buffer responses without limit. The requests
+that arrive on different connections at the same time are answered together, so their statements are one batch
+for Eliza.analyzeMany (see handleMessages).
+Sessions that have not been used for idleTimeout seconds are dropped, or spilled to disk if the server's
+SessionStore has a directory (in which case they are also all saved on shutdown and resumed after a restart).
+
+A new version of the script can be loaded while the server runs (reload, or SIGHUP to load --script again). It is
+built and checked in a thread while requests keep being answered and swapped in between two requests, and the
+conversations in progress carry on: each Session is moved over to the new script the next time it is used (see
+Eliza.migrateSession). If the new script can't be used the old one stays.
+
+A profile of where the time of the next turns goes can be taken while the server runs: a profile request starts
+one that ends after that many turns or seconds (whichever comes first, see Eliza.startProfile) and a report request
+ends it if it is still going and returns it (see Profiler.report): the collapsed stacks for a flame graph and the
+top regular expressions and Keywords by the time spent matching them.
+
+ Attributes:
+     Eliza eliza
+     SessionStore sessions
+     float idleTimeout
+     int maxLineLength
+     float shutdownGrace
+     bool closing
+     set connections
+     set idleConnections
+     Server server
+     Task reaper
+     Profiler profiler
+     list queue
+
+Functions:
+    __init__
+    start
+    shutdown
+    handleClient
+    respond
+    reload
+    swapScript
+    answerQueued
+    handleMessage
+    handleMessages
+    handleProfile
+    answerBatch
+    isStatement
+    checkSessionId
+    reapIdleSessions
+    encode
+    addArguments
+    buildEliza
+    reloadScript
+    serve
+    main
+
+'''
+
+import argparse
+import asyncio
+import functools
+import json
+import signal
+import sys
+import traceback
+
+from Eliza import Eliza, MATCH_CACHE_SIZE
+from Memory import DEFAULT_CAPACITY, DEFAULT_TTL, EVICTION_POLICIES
+from ScriptLoader import ScriptError, loadScript
+from Selector import SELECTORS
+from SessionStore import SessionStore
+from runEliza import reflections, psychobabble
+
+MAX_SESSION_ID_LENGTH = 256  # longest session id accepted, in characters
+
+
+class ElizaServer:
+
+    # constructor, sessions is the SessionStore to keep the sessions in (one that drops idle sessions by default)
+    def __init__(self, eliza, sessions=None, idleTimeout=600.0, maxLineLength=65536, shutdownGrace=5.0):
+        self.eliza = eliza  # the script shared by every session
+        if sessions is None:
+            sessions = SessionStore(eliza)
+        self.sessions = sessions
+        self.idleTimeout = idleTimeout  # seconds a session can go without a turn before it is dropped or spilled
+        self.maxLineLength = maxLineLength  # longest request line (in bytes) that is accepted
+        self.shutdownGrace = shutdownGrace  # seconds busy connections get to finish when shutting down
+        self.closing = False
+        self.connections = set()  # tasks serving connected clients
+        self.idleConnections = set()  # the subset of connections waiting for their next request
+        self.server = None
+        self.reaper = None
+        self.profiler = None  # the last profile taken, kept until it is reported
+        self.queue = []  # (request, future for its response) of the requests waiting to be answered together
+
+    # start listening on a Unix socket if path is given, otherwise on host and port
+    async def start(self, host="127.0.0.1", port=5000, path=None):
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handleClient, path=path, limit=self.maxLineLength)
+        else:
+            self.server = await asyncio.start_server(self.handleClient, host, port, limit=self.maxLineLength)
+        self.reaper = asyncio.create_task(self.reapIdleSessions())
+        return self.server
+
+    # stop accepting connections, let busy connections finish their current request and close everything
+    async def shutdown(self):
+        self.closing = True
+        self.server.close()
+        self.reaper.cancel()
+        # connections waiting for a request have nothing in progress so they can be closed right away
+        for task in list(self.idleConnections):
+            task.cancel()
+        busy = [task for task in self.connections if task not in self.idleConnections]
+        if len(busy) != 0:
+            done, pending = await asyncio.wait(busy, timeout=self.shutdownGrace)
+            for task in pending:
+                task.cancel()
+        if len(self.connections) != 0:
+            await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+        if self.sessions.directory is not None:
+            self.sessions.spillAll()
+
+    # serves one connected client until it disconnects or the server shuts down
+    async def handleClient(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while not self.closing:
+                self.idleConnections.add(task)
+                try:
+                    line = await reader.readline()
+                except ValueError:  # the request is longer than maxLineLength
+                    writer.write(self.encode({"error": "request too long"}))
+                    await writer.drain()
+                    break
+                finally:
+                    self.idleConnections.discard(task)
+                if not line:  # the client disconnected
+                    break
+                if line.strip() == b"":
+                    continue
+                try:
+                    response = await self.respond(line)
+                except Exception:  # a bug answering one request must not cost the client its connection
+                    traceback.print_exc()
+                    response = {"error": "internal error"}
+                writer.write(self.encode(response))
+                # wait until the client takes the response before reading its next request
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    # Returns the response object to a request line. A coroutine so a server can wait on something else for the
+    # response (see ShardedServer), this one waits for the requests the other connections sent at the same time so
+    # they are all answered together (see answerQueued)
+    async def respond(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"error": "invalid JSON"}
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((request, future))
+        if len(self.queue) == 1:  # answer once every connection whose request is ready has had the chance to queue it
+            asyncio.get_running_loop().call_soon(self.answerQueued)
+        return await future
+
+    # Builds a new Eliza with build (a function that returns one, called in a thread so requests keep being answered)
+    # and swaps it in. Returns the new Eliza, or raises whatever build raised and keeps the old one
+    async def reload(self, build):
+        eliza = await asyncio.get_running_loop().run_in_executor(None, build)
+        self.swapScript(eliza)
+        return eliza
+
+    # makes eliza the script of the server, it keeps counting in the same Metrics as the old one
+    def swapScript(self, eliza):
+        if self.eliza.getMetrics() is not None:
+            eliza.enableMetrics(self.eliza.getMetrics())
+        self.eliza = eliza
+        self.sessions.swap(eliza)
+
+    # answers every queued request with handleMessages, so the statements of many connections are one batch. If the
+    # batch fails in an unexpected way every request in it gets an error
+    def answerQueued(self):
+        queued = self.queue
+        self.queue = []
+        try:
+            responses = self.handleMessages([request for request, future in queued])
+        except Exception:
+            traceback.print_exc()
+            responses = [{"error": "internal error"}] * len(queued)
+        for (request, future), response in zip(queued, responses):
+            if not future.done():  # the connection was cancelled while it waited
+                future.set_result(response)
+
+    # handles a single decoded request and returns the response object
+    def handleMessage(self, request):
+        if isinstance(request, dict) and request.get("metrics"):
+            if self.eliza.getMetrics() is None:
+                return {"error": "metrics are not enabled"}
+            return {"metrics": self.eliza.getMetrics().toPrometheus()}
+        if isinstance(request, dict) and "profile" in request:
+            return self.handleProfile(request)
+        problem = self.checkSessionId(request.get("session") if isinstance(request, dict) else None)
+        if problem is not None:
+            return {"error": problem}
+        sessionId = request["session"]
+        if request.get("end"):
+            self.sessions.end(sessionId)
+            return {"session": sessionId, "ended": True}
+        statement = request.get("statement")
+        if not isinstance(statement, str):
+            return {"session": sessionId, "error": "missing statement"}
+        try:
+            session = self.sessions.get(sessionId)
+        except ValueError as error:  # the session's snapshot can't be used
+            return {"session": sessionId, "error": str(error)}
+        if session is None:
+            return {"session": sessionId, "error": "too many sessions"}
+        return {"session": sessionId, "response": self.eliza.analyze(statement, session)}
+
+    # handles a list of decoded requests and returns their response objects in the same order. The statements
+    # between other requests are answered together by Eliza.analyzeMany, which is much cheaper than one at a time
+    def handleMessages(self, requests):
+        responses = [None] * len(requests)
+        batch = []  # positions of the statements waiting to be answered together
+        sessions = {}  # session id -> Session of the statements in batch
+        for i in range(len(requests)):
+            request = requests[i]
+            if not self.isStatement(request):
+                self.answerBatch(requests, batch, sessions, responses)  # earlier statements are answered first
+                responses[i] = self.handleMessage(request)
+                continue
+            sessionId = request["session"]
+            if sessionId not in sessions:
+                # getting one more session could spill one this batch holds, so answer the batch first
+                if len(sessions) >= self.sessions.maxResident:
+                    self.answerBatch(requests, batch, sessions, responses)
+                try:
+                    session = self.sessions.get(sessionId)
+                except ValueError as error:  # the session's snapshot can't be used
+                    responses[i] = {"session": sessionId, "error": str(error)}
+                    continue
+                if session is None:
+                    responses[i] = {"session": sessionId, "error": "too many sessions"}
+                    continue
+                sessions[sessionId] = session
+            batch.append(i)
+        self.answerBatch(requests, batch, sessions, responses)
+        return responses
+
+    # handles a profile request: starts a profile or ends and reports the last one
+    def handleProfile(self, request):
+        options = request["profile"]
+        if options == "report":
+            top = request.get("top", 10)
+            if top is not None and (not isinstance(top, int) or isinstance(top, bool) or top < 0):
+                return {"error": "top must be a number of entries"}
+            if self.profiler is None:
+                return {"error": "no profile has been taken"}
+            self.eliza.stopProfile()
+            self.profiler.finish()  # in case the script was swapped while it was being taken
+            return {"profile": self.profiler.report(top)}
+        if not isinstance(options, dict):
+            return {"error": "profile must be \"report\" or an object with the turns or seconds to profile"}
+        turns = options.get("turns")
+        seconds = options.get("seconds")
+        if turns is not None and (not isinstance(turns, int) or isinstance(turns, bool) or turns < 1):
+            return {"error": "profile turns must be a positive number"}
+        if seconds is not None and (not isinstance(seconds, (int, float)) or isinstance(seconds, bool) or
+                                    seconds <= 0):
+            return {"error": "profile seconds must be a positive number"}
+        self.profiler = self.eliza.startProfile(turns, seconds)
+        return {"profiling": True}
+
+    # answers the statements at the positions in batch, puts their responses in responses and empties the batch
+    def answerBatch(self, requests, batch, sessions, responses):
+        if len(batch) == 0:
+            return
+        results = self.eliza.analyzeMany([(requests[i]["session"], requests[i]["statement"]) for i in batch], sessions)
+        for i, result in zip(batch, results):
+            responses[i] = {"session": requests[i]["session"], "response": result[0]}
+        batch.clear()
+        sessions.clear()
+
+    # True if a decoded request is a statement for a session
+    @staticmethod
+    def isStatement(request):
+        return isinstance(request, dict) and ElizaServer.checkSessionId(request.get("session")) is None and \
+            isinstance(request.get("statement"), str) and not request.get("end") and not request.get("metrics") and \
+            "profile" not in request
+
+    # Returns what is wrong with the session id of a request, or None if it can be used. Session ids are hashed and
+    # used in file names as UTF-8, so a string with a lone surrogate (like "\ud800", which JSON allows) can't be one
+    @staticmethod
+    def checkSessionId(sessionId):
+        if not isinstance(sessionId, str):
+            return "missing session id"
+        if len(sessionId) > MAX_SESSION_ID_LENGTH:
+            return "session id longer than " + str(MAX_SESSION_ID_LENGTH) + " characters"
+        try:
+            sessionId.encode("utf-8")
+        except UnicodeEncodeError:
+            return "session id is not valid unicode"
+        return None
+
+    # drops (or spills) sessions that have been idle for longer than idleTimeout
+    async def reapIdleSessions(self):
+        interval = max(self.idleTimeout / 4, 0.05)
+        while True:
+            await asyncio.sleep(interval)
+            self.sessions.spillIdle(self.idleTimeout)
+
+    # turns a response object into a line of JSON
+    @staticmethod
+    def encode(response):
+        return json.dumps(response).encode() + b"\n"
+
+
+# adds the options of the server that every front-end shares (see ShardedServer) to an ArgumentParser
+def addArguments(parser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--idle-timeout", type=float, default=600.0, help="seconds before an idle session is dropped")
+    parser.add_argument("--max-sessions", type=int, default=100000, help="most sessions kept in memory")
+    parser.add_argument("--script", help="script file to use instead of the built-in script")
+    parser.add_argument("--cache-dir", help="where compiled script files are cached")
+    parser.add_argument("--metrics", action="store_true", help="collect metrics about every turn")
+    parser.add_argument("--spill-dir", help="save idle sessions to this directory instead of dropping them")
+    parser.add_argument("--match-cache", type=int, default=MATCH_CACHE_SIZE,
+                        help="most match decisions cached, 0 to turn the cache off")
+    parser.add_argument("--selector", choices=SELECTORS, help="how responses are picked, instead of the script's")
+    parser.add_argument("--seed", type=int, default=0, help="seed of --selector random")
+    parser.add_argument("--fuzzy", type=int, metavar="DISTANCE",
+                        help="read misspelt keywords up to DISTANCE edits away as the keyword, 0 to turn it off")
+    parser.add_argument("--safe-matching", action="store_true",
+                        help="match patterns in time linear in the length of the statement")
+    parser.add_argument("--max-input-length", type=int, metavar="CHARACTERS",
+                        help="answer longer statements with the fallback response without matching them")
+    parser.add_argument("--match-budget", type=int, metavar="STEPS",
+                        help="most steps of matching a turn can take before it gets the fallback response")
+    parser.add_argument("--fallback-response", help="the response to a turn that hits a limit")
+    parser.add_argument("--memory-size", type=int, default=DEFAULT_CAPACITY,
+                        help="most responses a session remembers")
+    parser.add_argument("--memory-eviction", choices=EVICTION_POLICIES, default="oldest",
+                        help="which remembered response is forgotten when memory is full")
+    parser.add_argument("--memory-ttl", type=int, default=DEFAULT_TTL,
+                        help="turns a response is remembered for with --memory-eviction ttl")
+
+
+# Returns the Eliza described by the options from addArguments
+def buildEliza(args):
+    if args.script is not None:
+        eliza = loadScript(args.script, args.cache_dir)
+    else:
+        eliza = Eliza(reflections, psychobabble)
+    eliza.setMemoryPolicy(args.memory_size, args.memory_eviction, args.memory_ttl)
+    eliza.setMatchCache(args.match_cache)
+    if args.selector is not None:
+        eliza.setSelector(args.selector, args.seed)
+    if args.fuzzy is not None:
+        eliza.setFuzzyMatching(args.fuzzy)
+    if args.safe_matching:
+        for pattern in eliza.setSafeMatching(True):
+            print("pattern %r can't be matched safely, it is matched by a regular expression" % pattern,
+                  file=sys.stderr)
+    if args.max_input_length is not None or args.match_budget is not None or args.fallback_response is not None:
+        # the options override the script's limits one by one
+        eliza.setMatchLimits(eliza.maxInputLength if args.max_input_length is None else args.max_input_length,
+                             eliza.matchBudget if args.match_budget is None else args.match_budget,
+                             eliza.fallbackResponse if args.fallback_response is None else args.fallback_response)
+    if args.metrics:
+        eliza.enableMetrics()
+    return eliza
+
+
+# loads the script given by the options again into server, reporting a script that can't be used on stderr
+async def reloadScript(server, args):
+    try:
+        eliza = await server.reload(functools.partial(buildEliza, args))
+    except (ScriptError, OSError) as error:
+        print("could not load the new script: " + str(error), file=sys.stderr)
+        return
+    print("loaded script version %08x" % eliza.version, file=sys.stderr)
+
+
+async def serve(args):
+    eliza = buildEliza(args)
+    sessions = SessionStore(eliza, args.spill_dir, args.max_sessions)
+    server = ElizaServer(eliza, sessions, idleTimeout=args.idle_timeout)
+    await server.start(args.host, args.port, args.unix)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(reloadScript(server, args)))
+    await stop.wait()
+    await server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many Eliza conversations over newline-delimited JSON.")
+    addArguments(parser)
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+Typo tolerant Keyword matching. A FuzzyIndex corrects the misspelt words of a statement ("computr", "happpy",
+"rememebr") to the Keyword names and synonyms they are meant to be, before the statement is scanned and matched,
+so the Keyword and its regular expressions (which spell the word properly) still answer it. Only the choice of
+Keyword (and its regular expression) uses the corrected words, the response reflects the words as typed (see
+restore).
+Comparing every word with every Keyword would take far too long, so the index is built the SymSpell way: every
+word of a name or synonym is stored under each string left after deleting up to maxDistance of its letters. Two
+words are at most maxDistance edits apart only if deleting letters from both gives the same string, so a word is
+corrected by looking up its own deletions (a number that depends on the length of the word, not on the size of
+the script) and checking the few words found with an edit distance that counts a swap of two letters as one edit.
+Short words are easily mistaken for each other ("life" and "like"), so words of fewer than 5 letters are never
+corrected, longer ones may only be up to (length - 1) // 4 edits away, and words the script knows and common
+English words (see CommonWords.py) are left alone. Only whole names and synonyms of one word are corrected to,
+never a word out of a phrase like "for all one knows".
+When several words are equally close the one of the Keyword with the highest rank wins.
+
+ Attributes:
+     int maxDistance
+     dict deletions
+     dict entryRanks
+     set knownWords
+     dict corrections
+
+Functions:
+    __init__
+    __getstate__
+    __setstate__
+    correct
+    correctWord
+    restore
+    deletionsOf
+    editDistance
+
+'''
+
+import re
+
+from CommonWords import COMMON_WORDS
+from Turn import Turn
+
+CORRECTION_CACHE_SIZE = 4096  # how many words have their correction remembered, users repeat themselves a lot
+MIN_WORD_LENGTH = 5  # shorter words are never corrected
+
+
+class FuzzyIndex:
+
+    # constructor, entries maps each Keyword name or synonym of one word to the index of the highest ranked Keyword
+    # that uses it and knownWords are the other words the script uses (they are already spelt as meant)
+    def __init__(self, entries, knownWords, maxDistance):
+        self.maxDistance = maxDistance
+        self.deletions = {}  # string left after deleting letters -> the entry words it was deleted from
+        self.entryRanks = dict(entries)  # entry word -> key index, the lower the better
+        self.knownWords = set(knownWords) | set(entries) | COMMON_WORDS
+        self.corrections = {}  # word -> the entry word it is corrected to or None, for the words seen recently
+        for entry in self.entryRanks:
+            if len(entry) < MIN_WORD_LENGTH - 1:
+                continue  # too short to be the word a correctable word was meant to be
+            for deletion in self.deletionsOf(entry, min(maxDistance, len(entry) - 1)):
+                self.deletions.setdefault(deletion, []).append(entry)
+
+    # the corrections are not saved when the index is pickled with its Eliza
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["corrections"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    # Returns the Turn with its misspelt words corrected, or turn itself if none were. The corrected Turn keeps the
+    # corrections in fixes so restore can put the typed words back in what is reflected.
+    # Returns the words that were corrected as well, as (word typed, word meant) pairs
+    def correct(self, turn):
+        fixes = []
+        for aWord in turn.words:
+            meant = self.correctWord(aWord)
+            if meant is not None:
+                fixes.append((aWord, meant))
+        if len(fixes) == 0:
+            return turn, fixes
+        text = turn.text
+        words = list(turn.words)
+        for typed, meant in fixes:
+            text = re.sub(r"(?<![\w'])" + re.escape(typed) + r"(?![\w'])", meant, text, flags=re.IGNORECASE)
+            words = [meant if aWord == typed else aWord for aWord in words]
+        corrected = Turn(text, text.rstrip(".!"), text.lower(), words)
+        # a word meant that was also typed as it is can't be told apart from the correction, so it is left as it is
+        corrected.fixes = tuple((typed, meant) for typed, meant in fixes if meant not in turn.words)
+        return corrected, fixes
+
+    # Returns the entry word that a word of a statement is meant to be, or None if it is spelt as meant or is not
+    # close enough to any entry word
+    def correctWord(self, aWord):
+        if aWord in self.knownWords or len(aWord) < MIN_WORD_LENGTH:
+            return None
+        corrections = self.corrections
+        if aWord in corrections:
+            return corrections[aWord]
+        allowed = min(self.maxDistance, (len(aWord) - 1) // 4)
+        best = None
+        bestScore = None
+        for deletion in self.deletionsOf(aWord, allowed):
+            for entry in self.deletions.get(deletion, ()):
+                if abs(len(entry) - len(aWord)) > allowed:
+                    continue
+                distance = self.editDistance(aWord, entry, allowed)
+                if distance > allowed:
+                    continue
+                score = (distance, self.entryRanks[entry], entry)
+                if bestScore is None or score < bestScore:
+                    best = entry
+                    bestScore = score
+        if len(corrections) >= CORRECTION_CACHE_SIZE:
+            corrections.clear()
+        corrections[aWord] = best
+        return best
+
+    # Returns the groups of a match of a corrected Turn with the words typed put back in place of the corrections
+    # (None groups stay None), so a response never repeats a word the user did not type
+    @staticmethod
+    def restore(groups, fixes):
+        restored = []
+        for group in groups:
+            if group is not None:
+                for typed, meant in fixes:
+                    group = re.sub(r"(?<![\w'])" + re.escape(meant) + r"(?![\w'])", typed, group, flags=re.IGNORECASE)
+            restored.append(group)
+        return tuple(restored)
+
+    # Returns the set of strings left after deleting up to maxDeletions letters from aWord, aWord included
+    @staticmethod
+    def deletionsOf(aWord, maxDeletions):
+        found = {aWord}
+        layer = [aWord]
+        for _ in range(maxDeletions):
+            nextLayer = []
+            for item in layer:
+                for i in range(len(item)):
+                    deletion = item[:i] + item[i + 1:]
+                    if deletion not in found:
+                        found.add(deletion)
+                        nextLayer.append(deletion)
+            layer = nextLayer
+        return found
+
+    # Returns the number of insertions, deletions, substitutions and swaps of two neighbouring letters that turn a
+    # into b (optimal string alignment distance), or limit + 1 as soon as it is sure to be more than limit
+    @staticmethod
+    def editDistance(a, b, limit):
+        previous = None
+        row = list(range(len(b) + 1))
+        for i in range(1, len(a) + 1):
+            current = [i] + [0] * len(b)
+            for j in range(1, len(b) + 1):
+                cost = 0 if a[i - 1] == b[j - 1] else 1
+                current[j] = min(row[j] + 1, current[j - 1] + 1, row[j - 1] + cost)
+                if previous is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                    current[j] = min(current[j], previous[j - 2] + 1)
+            if min(current) > limit:
+                return limit + 1
+            previous = row
+            row = current
+        return row[len(b)]
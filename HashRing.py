@@ -0,0 +1,74 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+A consistent hash ring that maps session ids to the names of the workers serving them (see ShardedServer).
+Every worker is placed on the ring at replicas points and a session belongs to the first worker point at or after
+the hash of its id. When a worker joins only the sessions that land on its points move to it, and when a worker
+leaves only its own sessions move, so most sessions stay where they are.
+Hashes are taken with blake2b rather than hash() so every process puts a session on the same worker.
+
+ Attributes:
+     int replicas
+     int[] points
+     dict owners
+     set members
+
+Functions:
+    __init__
+    add
+    remove
+    lookup
+    hashKey
+
+'''
+
+import bisect
+import hashlib
+
+DEFAULT_REPLICAS = 160  # points per worker, enough to spread the sessions evenly
+
+
+class HashRing:
+
+    # constructor, members are the names of the workers on the ring
+    def __init__(self, members=(), replicas=DEFAULT_REPLICAS):
+        self.replicas = replicas
+        self.points = []  # the sorted hashes of every point on the ring
+        self.owners = {}  # point -> name of the worker it belongs to
+        self.members = set()
+        for name in members:
+            self.add(name)
+
+    # places a worker on the ring
+    def add(self, name):
+        if name in self.members:
+            return
+        self.members.add(name)
+        for i in range(self.replicas):
+            point = self.hashKey(name + "#" + str(i))
+            if point not in self.owners:  # a collision leaves the point with the worker that had it first
+                self.owners[point] = name
+                bisect.insort(self.points, point)
+
+    # takes a worker off the ring
+    def remove(self, name):
+        if name not in self.members:
+            return
+        self.members.discard(name)
+        self.points = [point for point in self.points if self.owners[point] != name]
+        self.owners = {point: self.owners[point] for point in self.points}
+
+    # Returns the name of the worker serving a session id, raises LookupError if the ring is empty
+    def lookup(self, sessionId):
+        if len(self.points) == 0:
+            raise LookupError("no workers on the ring")
+        index = bisect.bisect_left(self.points, self.hashKey(sessionId))
+        if index == len(self.points):
+            index = 0  # past the last point, wrap around to the first
+        return self.owners[self.points[index]]
+
+    # the position of a string on the ring
+    @staticmethod
+    def hashKey(key):
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
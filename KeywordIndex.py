@@ -0,0 +1,73 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+An index over the names and synonyms of a list of Keywords. It is built once from the (rank ordered) keys list
+so finding every Keyword mentioned in a statement takes one pass over the statement's words, no matter how many
+Keywords the script has. Single word entries live in a dictionary and multi-word entries such as "look back" or
+"for all one knows" live in a trie of words. Entries are split into words by the same Normaliser as the user's
+statements, so they are found however they were written.
+
+ Attributes:
+     Normaliser normaliser
+     dict wordMap
+     dict phraseTrie
+
+Functions:
+    __init__
+    addEntry
+    scan
+
+'''
+
+# marks the end of a phrase inside the trie, a word can never be None so it won't collide with the words
+PHRASE_END = None
+
+
+class KeywordIndex:
+
+    # constructor, keys must already be sorted in decreasing order of rank
+    def __init__(self, keys, normaliser):
+        self.normaliser = normaliser
+        self.wordMap = {}  # maps a single word to the list of key indexes that use it as their name or a synonym
+        self.phraseTrie = {}  # nested dictionaries of words, PHRASE_END holds the key indexes for that phrase
+        for keyIndex in range(len(keys)):
+            self.addEntry(keys[keyIndex].name, keyIndex)
+            for synonym in keys[keyIndex].synonyms:
+                self.addEntry(synonym, keyIndex)
+
+    # adds a name or synonym to the index
+    def addEntry(self, entry, keyIndex):
+        words = [aWord for aWord in self.normaliser.splitWords(self.normaliser.expand(entry)) if aWord != ""]
+        if len(words) == 0:
+            return
+        if len(words) == 1:
+            indexes = self.wordMap.setdefault(words[0], [])
+        else:
+            node = self.phraseTrie
+            for aWord in words:
+                node = node.setdefault(aWord, {})
+            indexes = node.setdefault(PHRASE_END, [])
+        if keyIndex not in indexes:
+            indexes.append(keyIndex)
+
+    # Returns the indexes of every Keyword whose name or synonym is in words, in increasing order of index
+    # (which is decreasing order of rank because the keys list is sorted that way)
+    def scan(self, words):
+        found = set()
+        wordMap = self.wordMap
+        phraseTrie = self.phraseTrie
+        for start in range(len(words)):
+            aWord = words[start]
+            indexes = wordMap.get(aWord)
+            if indexes is not None:
+                found.update(indexes)
+            # walk the trie for as long as the following words continue a phrase
+            node = phraseTrie.get(aWord)
+            position = start + 1
+            while node is not None and position < len(words):
+                node = node.get(words[position])
+                if node is not None and PHRASE_END in node:
+                    found.update(node[PHRASE_END])
+                position += 1
+        return sorted(found)
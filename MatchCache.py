@@ -0,0 +1,73 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+A bounded cache of match decisions, shared by every Session of an Eliza. Which Keyword and regular expression
+answer a statement (and the groups they capture) only depend on the normalised statement and the script, never on
+the Session, so a statement that has been seen before skips the Keyword scan and the regular expressions. Users
+repeat a few statements ("yes", "no", "hello", ...) a lot, so a small cache answers a large share of turns.
+The least recently used decision is evicted once the cache holds maxSize decisions.
+
+ Attributes:
+     int maxSize
+     OrderedDict decisions
+     int hits
+     int misses
+     int evictions
+
+Functions:
+    __init__
+    __len__
+    get
+    put
+    clear
+    stats
+
+'''
+
+from collections import OrderedDict
+
+MISSING = object()  # returned by get for a statement that is not cached, a decision can be None
+
+
+class MatchCache:
+
+    # constructor
+    def __init__(self, maxSize):
+        self.maxSize = maxSize  # the most decisions kept
+        self.decisions = OrderedDict()  # statement -> decision, ordered from least to most recently used
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # number of decisions cached
+    def __len__(self):
+        return len(self.decisions)
+
+    # Returns the decision cached for a statement or MISSING
+    def get(self, statement):
+        decision = self.decisions.get(statement, MISSING)
+        if decision is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.decisions.move_to_end(statement)
+        return decision
+
+    # caches the decision for a statement, returns True if another decision was evicted to make room
+    def put(self, statement, decision):
+        self.decisions[statement] = decision
+        if len(self.decisions) > self.maxSize:
+            self.decisions.popitem(last=False)
+            self.evictions += 1
+            return True
+        return False
+
+    # forgets every decision (the counts are kept)
+    def clear(self):
+        self.decisions.clear()
+
+    # Returns the counts of the cache as a dictionary
+    def stats(self):
+        return {"size": len(self.decisions), "maxSize": self.maxSize, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
@@ -0,0 +1,97 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+A MemoryPolicy decides how much a Session remembers. Each Session keeps its memory in a deque of entries
+(response, rank of the Keyword, turn it was stored on, name of the Keyword), which are recalled oldest first (an
+empty deque takes more memory than the rest of a Session, so it is only made when the first response is stored).
+The policy (one per Eliza, shared by every Session) keeps that deque to at most capacity entries, so a Session has
+a hard ceiling on its memory however long the conversation runs. When a response is stored in a full memory the
+policy evicts:
+    oldest    the entry stored first
+    rank      the entry with the lowest rank (the oldest of those), so the highest ranked responses are kept
+    ttl       the entry stored first, and entries older than ttl turns are also dropped before every recall
+store and recall return how many entries were evicted or expired (store returns None if nothing is remembered at
+all), Eliza counts them in its Metrics.
+
+ Attributes:
+     int capacity
+     string eviction
+     int ttl
+
+Functions:
+    __init__
+    store
+    recall
+    fit
+    expire
+
+'''
+
+from collections import deque
+
+EVICTION_POLICIES = ("oldest", "rank", "ttl")
+DEFAULT_CAPACITY = 32  # far more than a conversation normally stores before it is recalled
+DEFAULT_TTL = 50  # turns
+
+
+class MemoryPolicy:
+
+    # constructor, raises ValueError if the policy can't be used
+    def __init__(self, capacity=DEFAULT_CAPACITY, eviction="oldest", ttl=DEFAULT_TTL):
+        if capacity < 0:
+            raise ValueError("memory capacity must not be negative")
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError("memory eviction must be one of " + ", ".join(EVICTION_POLICIES))
+        if ttl < 1:
+            raise ValueError("memory ttl must be at least 1 turn")
+        self.capacity = capacity  # the most entries a Session remembers
+        self.eviction = eviction  # which entry goes when memory is full
+        self.ttl = ttl  # how many turns an entry is remembered for, only used by the ttl policy
+
+    # adds a response from a Keyword (its rank and name) to the memory of a Session. Returns how many entries were
+    # evicted, or None if the response was not stored because the Session remembers nothing
+    def store(self, session, response, rank, keyName):
+        if self.capacity == 0:
+            return None
+        memory = session.memory
+        if type(memory) is not deque:
+            memory = session.memory = deque()
+        memory.append((response, rank, session.turns, keyName))
+        return self.fit(memory)
+
+    # removes and returns the oldest response in the memory of a Session that has not expired (None if there is
+    # none) and how many entries expired
+    def recall(self, session):
+        memory = session.memory
+        expired = self.expire(memory, session.turns)
+        if len(memory) == 0:
+            return None, expired
+        return memory.popleft()[0], expired
+
+    # evicts entries until memory is no bigger than capacity, returns how many were evicted
+    def fit(self, memory):
+        evicted = 0
+        while len(memory) > self.capacity:
+            if self.eviction == "rank":
+                lowest = 0
+                for i in range(1, len(memory)):
+                    if memory[i][1] < memory[lowest][1]:
+                        lowest = i
+                del memory[lowest]
+            else:
+                memory.popleft()
+            evicted += 1
+        return evicted
+
+    # drops the entries more than ttl turns old (only for the ttl policy), returns how many were dropped.
+    # Entries are in the order they were stored so only the ones at the front are looked at
+    def expire(self, memory, turn):
+        if self.eviction != "ttl":
+            return 0
+        oldest = turn - self.ttl
+        expired = 0
+        while len(memory) != 0 and memory[0][2] < oldest:
+            memory.popleft()
+            expired += 1
+        return expired
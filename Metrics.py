@@ -0,0 +1,136 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+A class that collects counters and latency histograms about the turns of an Eliza.
+Eliza only records anything while it has a Metrics object (see Eliza.enableMetrics), otherwise the cost is a
+check for None at each stage of a turn. toPrometheus returns everything in the Prometheus text format.
+
+Counters (all names start with eliza_):
+    turns_total{source}                          turns answered by a keyword, memory or psychobable, or with the
+                                                 fallback response (limit)
+    keyword_hits_total{keyword}                  turns answered by each Keyword
+    pattern_evaluations_total{keyword,pattern}   times each Keyword regular expression was tried
+    pattern_hits_total{keyword,pattern}          times it matched
+    pattern_prefiltered_total{keyword,pattern}   times it was skipped because the text it needs was missing
+    pattern_seconds_total{keyword,pattern}       time spent running it
+    goto_total{keyword,target}                   goto responses followed
+    psychobabble_hits_total{pattern}             turns answered by each psychobable pattern
+    match_cache_total{event}                     match decisions found in (hit) or added to (miss) the match cache,
+                                                 and decisions evicted from it
+    memory_total{event}                          responses stored in, recalled from, evicted from (memory was full),
+                                                 expired from and dropped from (stale, after a new script) memory
+    sessions_migrated_total                      sessions moved over to a new version of the script
+    fuzzy_corrections_total{word}                misspelt words read as each Keyword word (fuzzy matching)
+    turn_limits_total{limit}                     turns that hit the input length or match budget limit
+    batches_total                                calls to analyzeMany (batches of turns answered together)
+Histograms of the time spent in each stage of a turn:
+    stage_seconds{stage}                         stages are turn, tokenise, scan, match, goto, format, psychobabble
+                                                 and batch (a whole call to analyzeMany)
+
+ Attributes:
+     dict counters
+     dict histograms
+     float[] buckets
+
+Functions:
+    __init__
+    count
+    observe
+    reset
+    toPrometheus
+    formatLabels
+
+'''
+
+# upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = [1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 1e-1]
+
+COUNTER_HELP = {
+    "eliza_turns_total": "Turns answered, by where the response came from.",
+    "eliza_keyword_hits_total": "Turns answered by each Keyword.",
+    "eliza_pattern_evaluations_total": "Times each Keyword regular expression was tried.",
+    "eliza_pattern_hits_total": "Times each Keyword regular expression matched.",
+    "eliza_pattern_prefiltered_total": "Times each Keyword regular expression was skipped as its text was missing.",
+    "eliza_pattern_seconds_total": "Time spent running each Keyword regular expression.",
+    "eliza_goto_total": "Goto responses followed.",
+    "eliza_psychobabble_hits_total": "Turns answered by each psychobabble pattern.",
+    "eliza_match_cache_total": "Match cache hits, misses and evictions.",
+    "eliza_memory_total": "Responses stored in, recalled from, evicted from, expired from and dropped from memory.",
+    "eliza_sessions_migrated_total": "Sessions moved over to a new version of the script.",
+    "eliza_fuzzy_corrections_total": "Misspelt words read as each Keyword word.",
+    "eliza_turn_limits_total": "Turns answered with the fallback response, by the limit they hit.",
+    "eliza_batches_total": "Batches of turns answered together.",
+}
+
+
+class Metrics:
+
+    # constructor
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        self.counters = {}  # counter name -> {tuple of (label, value) pairs -> value}
+        self.histograms = {}  # stage -> [count in each bucket (the last one is +Inf), sum of seconds, count]
+
+    # adds amount to a counter, labels is a tuple of (label, value) pairs
+    def count(self, name, labels=(), amount=1):
+        series = self.counters.get(name)
+        if series is None:
+            series = self.counters[name] = {}
+        series[labels] = series.get(labels, 0) + amount
+
+    # records that a stage took nanoseconds
+    def observe(self, stage, nanoseconds):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        seconds = nanoseconds / 1e9
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        histogram[0][index] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+    # sets every counter and histogram back to zero, keeping the series that exist
+    def reset(self):
+        for series in self.counters.values():
+            for labels in series:
+                series[labels] = 0
+        self.histograms = {}
+
+    # Returns every counter and histogram in the Prometheus text exposition format
+    def toPrometheus(self):
+        lines = []
+        for name in sorted(self.counters):
+            if name in COUNTER_HELP:
+                lines.append("# HELP " + name + " " + COUNTER_HELP[name])
+            lines.append("# TYPE " + name + " counter")
+            series = self.counters[name]
+            for labels in sorted(series):
+                lines.append(name + self.formatLabels(labels) + " " + repr(series[labels]))
+        if len(self.histograms) != 0:
+            lines.append("# HELP eliza_stage_seconds Time spent in each stage of a turn.")
+            lines.append("# TYPE eliza_stage_seconds histogram")
+        for stage in sorted(self.histograms):
+            bucketCounts, total, count = self.histograms[stage]
+            cumulative = 0
+            for i in range(len(bucketCounts)):
+                cumulative += bucketCounts[i]
+                bound = repr(self.buckets[i]) if i < len(self.buckets) else "+Inf"
+                lines.append("eliza_stage_seconds_bucket" +
+                             self.formatLabels((("stage", stage), ("le", bound))) + " " + str(cumulative))
+            lines.append("eliza_stage_seconds_sum" + self.formatLabels((("stage", stage),)) + " " + repr(total))
+            lines.append("eliza_stage_seconds_count" + self.formatLabels((("stage", stage),)) + " " + str(count))
+        return "\n".join(lines) + "\n"
+
+    # formats labels as {label="value",...} with the value escaped, or "" if there are none
+    @staticmethod
+    def formatLabels(labels):
+        if len(labels) == 0:
+            return ""
+        parts = []
+        for label, value in labels:
+            value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+            parts.append(label + "=\"" + value + "\"")
+        return "{" + ",".join(parts) + "}"
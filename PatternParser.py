@@ -0,0 +1,199 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+Reads the regular expressions of a script in the small language that scripts actually use, so tools can reason
+about what a pattern can match without running it. The language is
+    literal characters          I need, \? or \' (an escaped character stands for itself)
+    an optional character       \'? or \??
+    a repeat of a character set .* [a-zA-Z]* [^\?]* or x*, on its own or as a group: (.*) ([a-zA-Z]*)
+and parsePattern turns a pattern into a tuple of parts:
+    (LITERAL, text)
+    (OPTIONAL, character)
+    (REPEAT, ranges, negated, group)   the characters c with low <= c <= high for one of the (low, high) ranges
+                                       (or, if negated, every character but those) repeated any number of times,
+                                       group is True if it is a capturing group
+Anything else (alternatives, anchors, other quantifiers, \w and the like) is outside the language and parsePattern
+returns None, so a tool has to assume the worst about that pattern.
+Eliza matches with re.match, which only anchors the start: a pattern matches a statement if it matches the start
+of it. So a pattern whose parts after its literal prefix can all match nothing (see isOpen) matches exactly the
+statements that start with its prefix.
+
+Functions:
+    parsePattern
+    parseClass
+    literalPrefix
+    isOpen
+    leadingTexts
+    requiredLiterals
+    canOverlap
+    covers
+
+'''
+
+LITERAL = "literal"
+OPTIONAL = "optional"
+REPEAT = "repeat"
+
+ANY_RANGES = (("\n", "\n"),)  # "." is every character but a newline, a negated set of this range
+MAX_LEADING_TEXTS = 16  # optional characters after this many leading texts end them, see leadingTexts
+
+
+# Returns the parts of pattern (see the top of this file), or None if it is outside the language
+def parsePattern(pattern):
+    parts = []
+    literal = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        group = False
+        if c == "(":
+            if pattern.startswith("(?", i):
+                return None  # non-capturing groups, lookarounds, flags
+            group = True
+            i += 1
+            if i >= len(pattern):
+                return None
+            c = pattern[i]
+        # read one atom: a character (ranges None) or a character set
+        ranges = None
+        negated = False
+        if c == "\\":
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                return None  # \d, \w, \1 and the like
+            c = pattern[i + 1]
+            i += 2
+        elif c == ".":
+            ranges = ANY_RANGES
+            negated = True
+            i += 1
+        elif c == "[":
+            parsed = parseClass(pattern, i)
+            if parsed is None:
+                return None
+            ranges, negated, i = parsed
+        elif c in "*+?{}|^$)":
+            return None
+        else:
+            i += 1
+        quantifier = pattern[i] if i < len(pattern) else ""
+        if quantifier in "*?" and quantifier != "":
+            i += 1
+            if i < len(pattern) and pattern[i] in "?+":
+                return None  # lazy and possessive quantifiers
+        elif quantifier in ("+", "{"):
+            return None
+        else:
+            quantifier = ""
+        if group:
+            if i >= len(pattern) or pattern[i] != ")" or quantifier != "*":
+                return None  # only a repeated set (or character) on its own can be a group
+            i += 1
+        if quantifier == "*":
+            if ranges is None:
+                ranges = ((c, c),)
+            if len(literal) != 0:
+                parts.append((LITERAL, "".join(literal)))
+                literal = []
+            parts.append((REPEAT, ranges, negated, group))
+        elif ranges is not None:
+            return None  # a single character out of a set
+        elif quantifier == "?":
+            if len(literal) != 0:
+                parts.append((LITERAL, "".join(literal)))
+                literal = []
+            parts.append((OPTIONAL, c))
+        else:
+            literal.append(c)
+    if len(literal) != 0:
+        parts.append((LITERAL, "".join(literal)))
+    return tuple(parts)
+
+
+# Reads the character set that starts at pattern[start] ("["). Returns (ranges, negated, index after the set) or
+# None if it is not one parsePattern understands
+def parseClass(pattern, start):
+    i = start + 1
+    negated = False
+    if i < len(pattern) and pattern[i] == "^":
+        negated = True
+        i += 1
+    ranges = []
+    first = True
+    while i < len(pattern) and (pattern[i] != "]" or first):
+        first = False
+        c = pattern[i]
+        if c == "\\":
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                return None
+            c = pattern[i + 1]
+            i += 2
+        elif c == "[":
+            return None  # nested sets and POSIX classes
+        else:
+            i += 1
+        if i + 1 < len(pattern) and pattern[i] == "-" and pattern[i + 1] != "]":
+            high = pattern[i + 1]
+            if high == "\\" or high < c:
+                return None
+            ranges.append((c, high))
+            i += 2
+        else:
+            ranges.append((c, c))
+    if i >= len(pattern):
+        return None
+    return tuple(ranges), negated, i + 1
+
+
+# Returns the text every match of parts starts with
+def literalPrefix(parts):
+    if len(parts) != 0 and parts[0][0] == LITERAL:
+        return parts[0][1]
+    return ""
+
+
+# True if every part after the literal prefix can match nothing, so parts match every statement that starts with
+# the prefix
+def isOpen(parts):
+    rest = parts[1:] if literalPrefix(parts) != "" else parts
+    return all(part[0] != LITERAL for part in rest)
+
+
+# Returns the texts a match of parts can start with when its leading optional characters are each there or not,
+# for example "I'm " and "Im " for I\'?m (.*). The text is cut short at the first repeat
+def leadingTexts(parts):
+    texts = [""]
+    for part in parts:
+        if part[0] == LITERAL:
+            texts = [text + part[1] for text in texts]
+        elif part[0] == OPTIONAL and len(texts) < MAX_LEADING_TEXTS:
+            texts = [text + extra for text in texts for extra in ("", part[1])]
+        else:
+            break
+    return texts
+
+
+# Returns the texts that appear, in this order and without overlapping, in every statement parts match
+def requiredLiterals(parts):
+    return [part[1] for part in parts if part[0] == LITERAL]
+
+
+# False only if no statement can be matched by both a and b (parts from parsePattern, None for a pattern outside
+# the language). Their leading texts are compared: two patterns that need different starts can't both match
+def canOverlap(a, b):
+    if a is None or b is None:
+        return True
+    for textA in leadingTexts(a):
+        for textB in leadingTexts(b):
+            if textA.startswith(textB) or textB.startswith(textA):
+                return True
+    return False
+
+
+# True if every statement b matches is sure to be matched by a as well, so a placed before b leaves b nothing
+def covers(a, b):
+    if a is None or b is None:
+        return False
+    if a == b:
+        return True
+    return isOpen(a) and literalPrefix(b).startswith(literalPrefix(a))
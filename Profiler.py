@@ -0,0 +1,217 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+A Profiler captures where the time of the next turns of an Eliza goes, while it is running, without a restart
+(see Eliza.startProfile). It takes the place of the Eliza's Metrics for the length of the capture and passes every
+count and timing on to them (if there are any), so it uses the timings Eliza already takes at each stage of a turn.
+When the capture ends (after a number of turns or seconds, or when it is stopped) the Eliza gets its Metrics back,
+so a turn is once more down to checking that metrics is None.
+
+Each stage timing becomes a stack of frames ending in the stage, for example
+    analyze;match;remember;(.*)i remember (.*) 1520
+    analyze;goto what;match;what;(.*) 310
+    analyzeMany;format 96
+(nanoseconds, with the time not spent in any stage in an "other" frame) and collapsedStacks returns them in the
+collapsed stack format that flamegraph.pl and speedscope read. The regular expressions and Keywords that took the
+most time are also tabled (see report).
+
+ Attributes:
+     Metrics inner
+     int maxTurns
+     float deadline
+     dict patterns
+     int turns
+     bool finished
+     list onFinish
+     dict stacks
+     dict patternStats
+     dict keywordHits
+     list pending
+     string gotoFrame
+     bool batching
+     int start
+     int end
+
+Functions:
+    __init__
+    count
+    observe
+    closeUnit
+    finish
+    collapsedStacks
+    report
+    mergeReports
+
+'''
+
+import time
+
+clock = time.perf_counter_ns
+
+# the stages whose timings are kept as they are, the others are made of these (turn, batch) or already timed in
+# more detail (match, by each regular expression)
+STAGE_FRAMES = ("tokenise", "scan", "format", "psychobabble")
+
+
+class Profiler:
+
+    # constructor, the capture ends after maxTurns turns or seconds seconds (whichever comes first, None for no
+    # limit). inner are the Metrics that every count and timing is passed on to (or None) and patterns maps
+    # (keyword name, pattern index) to the regular expression, for the report
+    def __init__(self, inner=None, maxTurns=None, seconds=None, patterns=None):
+        self.inner = inner
+        self.maxTurns = maxTurns
+        self.start = clock()
+        self.end = None
+        self.deadline = None if seconds is None else self.start + int(seconds * 1e9)
+        self.patterns = {} if patterns is None else patterns
+        self.turns = 0
+        self.finished = False
+        self.onFinish = []  # functions called once when the capture ends
+        self.stacks = {}  # stack of frames joined by ";" -> nanoseconds
+        self.patternStats = {}  # (keyword name, pattern index) -> [evaluations, hits, nanoseconds, most nanoseconds]
+        self.keywordHits = {}  # keyword name -> turns it answered
+        self.pending = []  # (frames, nanoseconds) of the turn (or batch) in progress
+        self.gotoFrame = None  # the frame of the goto being followed, its regular expressions go under it
+        self.batching = False  # True between the start of a batch (see Eliza.analyzeMany) and its batch timing
+
+    # what Metrics.count does, also keeping what the profile needs
+    def count(self, name, labels=(), amount=1):
+        if self.inner is not None:
+            self.inner.count(name, labels, amount)
+        if self.finished:
+            return
+        if name == "eliza_pattern_seconds_total":
+            key = (labels[0][1], labels[1][1])
+            nanoseconds = int(amount * 1e9)
+            stats = self.patternStats.get(key)
+            if stats is None:
+                stats = self.patternStats[key] = [0, 0, 0, 0]
+            stats[0] += 1
+            stats[2] += nanoseconds
+            if nanoseconds > stats[3]:
+                stats[3] = nanoseconds
+            frames = ("match", key[0], self.patterns.get(key, "pattern " + str(key[1])))
+            if self.gotoFrame is not None:
+                frames = (self.gotoFrame,) + frames
+            self.pending.append((frames, nanoseconds))
+        elif name == "eliza_pattern_hits_total":
+            key = (labels[0][1], labels[1][1])
+            if key in self.patternStats:
+                self.patternStats[key][1] += amount
+        elif name == "eliza_goto_total":
+            self.gotoFrame = "goto " + labels[1][1]
+        elif name == "eliza_keyword_hits_total":
+            self.keywordHits[labels[0][1]] = self.keywordHits.get(labels[0][1], 0) + amount
+        elif name == "eliza_turns_total":
+            self.turns += amount
+        elif name == "eliza_batches_total":
+            self.batching = True
+
+    # what Metrics.observe does, also keeping what the profile needs. A turn (or a batch of them) is complete once
+    # its whole time is observed, which is when the capture can end
+    def observe(self, stage, nanoseconds):
+        if self.inner is not None:
+            self.inner.observe(stage, nanoseconds)
+        if self.finished:
+            return
+        if stage in STAGE_FRAMES:
+            self.pending.append(((stage,), nanoseconds))
+        elif stage == "goto":
+            self.gotoFrame = None
+        elif stage == "turn":
+            if not self.batching:  # the turns of a batch are part of the batch's stacks
+                self.closeUnit("analyze", nanoseconds)
+        elif stage == "batch":
+            self.batching = False
+            self.closeUnit("analyzeMany", nanoseconds)
+
+    # adds the stages of a turn (or batch) that took nanoseconds to the stacks under root, and ends the capture if
+    # it has run its course
+    def closeUnit(self, root, nanoseconds):
+        stacks = self.stacks
+        accounted = 0
+        for frames, amount in self.pending:
+            stack = root + ";" + ";".join(frame.replace(";", ",") for frame in frames)
+            stacks[stack] = stacks.get(stack, 0) + amount
+            accounted += amount
+        if nanoseconds > accounted:
+            stack = root + ";other"
+            stacks[stack] = stacks.get(stack, 0) + nanoseconds - accounted
+        self.pending = []
+        self.gotoFrame = None
+        if (self.maxTurns is not None and self.turns >= self.maxTurns) or \
+                (self.deadline is not None and clock() >= self.deadline):
+            self.finish()
+
+    # ends the capture (nothing more is recorded, the counts and timings are still passed on to inner)
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.end = clock()
+        self.pending = []
+        onFinish = self.onFinish
+        self.onFinish = []
+        for function in onFinish:
+            function()
+
+    # Returns the stacks in the collapsed stack format, one "frame;frame;... nanoseconds" line per stack
+    def collapsedStacks(self):
+        return "".join(stack + " " + str(nanoseconds) + "\n" for stack, nanoseconds in sorted(self.stacks.items()))
+
+    # Returns the capture as a dictionary: the turns and seconds it covered, the collapsed stacks and the top
+    # regular expressions and Keywords by the time spent matching them (all of them if top is None)
+    def report(self, top=None):
+        end = clock() if self.end is None else self.end
+        patterns = []
+        keywords = {}
+        for (keyword, index), (evaluations, hits, nanoseconds, most) in self.patternStats.items():
+            patterns.append({"keyword": keyword, "pattern": index, "regex": self.patterns.get((keyword, index)),
+                             "evaluations": evaluations, "hits": hits, "microseconds": nanoseconds / 1e3,
+                             "maxMicroseconds": most / 1e3})
+            entry = keywords.get(keyword)
+            if entry is None:
+                entry = keywords[keyword] = {"keyword": keyword, "evaluations": 0, "microseconds": 0.0,
+                                             "turns": self.keywordHits.get(keyword, 0)}
+            entry["evaluations"] += evaluations
+            entry["microseconds"] += nanoseconds / 1e3
+        patterns.sort(key=lambda entry: entry["microseconds"], reverse=True)
+        keywords = sorted(keywords.values(), key=lambda entry: entry["microseconds"], reverse=True)
+        return {"turns": self.turns, "seconds": (end - self.start) / 1e9, "finished": self.finished,
+                "stacks": self.collapsedStacks(), "patterns": patterns[:top], "keywords": keywords[:top]}
+
+
+# Returns one report made of several reports from Profiler.report (top=None), for example one from each worker
+# process. prefixes are put in front of each report's stacks (so the flame graph has a frame for each worker)
+def mergeReports(reports, prefixes, top=None):
+    stacks = []
+    patterns = {}
+    keywords = {}
+    merged = {"turns": 0, "seconds": 0.0, "finished": True}
+    for report, prefix in zip(reports, prefixes):
+        merged["turns"] += report["turns"]
+        merged["seconds"] = max(merged["seconds"], report["seconds"])
+        merged["finished"] = merged["finished"] and report["finished"]
+        stacks.extend(prefix + ";" + line for line in report["stacks"].splitlines())
+        for entry in report["patterns"]:
+            key = (entry["keyword"], entry["pattern"])
+            if key not in patterns:
+                patterns[key] = dict(entry)
+                continue
+            total = patterns[key]
+            for field in ("evaluations", "hits", "microseconds"):
+                total[field] += entry[field]
+            total["maxMicroseconds"] = max(total["maxMicroseconds"], entry["maxMicroseconds"])
+        for entry in report["keywords"]:
+            if entry["keyword"] not in keywords:
+                keywords[entry["keyword"]] = dict(entry)
+                continue
+            total = keywords[entry["keyword"]]
+            for field in ("evaluations", "microseconds", "turns"):
+                total[field] += entry[field]
+    merged["stacks"] = "".join(line + "\n" for line in sorted(stacks))
+    merged["patterns"] = sorted(patterns.values(), key=lambda entry: entry["microseconds"], reverse=True)[:top]
+    merged["keywords"] = sorted(keywords.values(), key=lambda entry: entry["microseconds"], reverse=True)[:top]
+    return merged
@@ -0,0 +1,177 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+Matchers that take time linear in the length of the statement, for the patterns PatternParser can read. Patterns
+like (.*)i ([a-zA-Z]*)(.*)you(.*) make the re module backtrack, trying every way of splitting a long statement
+between the groups, so one long pasted statement can hold up every conversation of a server. A SafeMatcher gives
+exactly what re.match would (the same groups, because it makes the same greedy choices) without backtracking:
+    1. going backwards over the parts, it works out for every position of the statement whether the rest of the
+       pattern can match from there (one pass over the statement per part)
+    2. going forwards, each repeat takes the longest run it can after which the rest can still match, which is the
+       first choice re would find to work, and each optional character is taken if the rest can still match
+So a match costs at most (number of parts + 1) * (length + 1) steps, see cost.
+An AlternationMatcher does the same for the psychobabble regular expression (pattern0)|(pattern1)|..., with groups
+numbered like the combined regular expression so Eliza can use it in its place.
+
+ SafeMatcher Attributes:
+     string pattern
+     tuple parts
+     list members
+
+ AlternationMatcher Attributes:
+     SafeMatcher[] matchers
+     int[] groupNumbers
+     int numGroups
+
+Functions:
+    SafeMatch
+    SafeMatcher.__init__
+    SafeMatcher.match
+    SafeMatcher.cost
+    SafeMatcher.memberships
+    AlternationMatcher.__init__
+    AlternationMatcher.match
+    AlternationMatcher.cost
+
+'''
+
+from PatternParser import LITERAL, OPTIONAL, parsePattern
+
+
+# what a matcher returns for a match, with the parts of a re match object that Eliza uses
+class SafeMatch:
+
+    __slots__ = ("values", "lastindex", "length")
+
+    def __init__(self, values, lastindex, length):
+        self.values = values
+        self.lastindex = lastindex
+        self.length = length  # the number of characters matched
+
+    def groups(self):
+        return self.values
+
+
+class SafeMatcher:
+
+    # constructor, raises ValueError if pattern is outside the language of PatternParser
+    def __init__(self, pattern):
+        parts = parsePattern(pattern)
+        if parts is None:
+            raise ValueError("pattern " + repr(pattern) + " can't be matched safely")
+        self.pattern = pattern
+        self.parts = parts
+        # for every repeat, a dictionary of the characters seen so far -> whether the repeat takes them
+        self.members = [{} if part[0] != LITERAL and part[0] != OPTIONAL else None for part in parts]
+
+    # Returns a SafeMatch with the groups re.match(pattern, text) would have, or None if it does not match
+    def match(self, text):
+        parts = self.parts
+        n = len(text)
+        # feasible[k][p] is True if parts[k:] can match text from position p on (the end need not be reached)
+        feasible = [None] * (len(parts) + 1)
+        after = feasible[len(parts)] = [True] * (n + 1)
+        memberships = [None] * len(parts)
+        for k in range(len(parts) - 1, -1, -1):
+            part = parts[k]
+            if part[0] == LITERAL:
+                literal = part[1]
+                current = [False] * (n + 1)
+                p = text.find(literal)
+                while p != -1:
+                    if after[p + len(literal)]:
+                        current[p] = True
+                    p = text.find(literal, p + 1)
+            elif part[0] == OPTIONAL:
+                current = after[:]
+                character = part[1]
+                p = text.find(character)
+                while p != -1:
+                    if after[p + 1]:
+                        current[p] = True
+                    p = text.find(character, p + 1)
+            else:
+                member = memberships[k] = self.memberships(k, text)
+                current = after[:]
+                for p in range(n - 1, -1, -1):
+                    if not current[p] and member[p] and current[p + 1]:
+                        current[p] = True
+            feasible[k] = after = current
+        if not feasible[0][0]:
+            return None
+        values = []
+        p = 0
+        for k in range(len(parts)):
+            part = parts[k]
+            if part[0] == LITERAL:
+                p += len(part[1])
+            elif part[0] == OPTIONAL:
+                if p < n and text[p] == part[1] and feasible[k + 1][p + 1]:
+                    p += 1
+            else:
+                member = memberships[k]
+                after = feasible[k + 1]
+                end = p
+                while end < n and member[end]:
+                    end += 1
+                while not after[end]:  # the longest run the rest can follow, there is one because feasible[k][p]
+                    end -= 1
+                if part[3]:
+                    values.append(text[p:end])
+                p = end
+        return SafeMatch(tuple(values), None, p)
+
+    # the most steps a match of text of length characters can take
+    def cost(self, length):
+        return (len(self.parts) + 1) * (length + 1)
+
+    # Returns a list that is True at every position of text whose character the repeat parts[k] takes
+    def memberships(self, k, text):
+        seen = self.members[k]
+        ranges, negated = self.parts[k][1], self.parts[k][2]
+        member = []
+        for character in text:
+            taken = seen.get(character)
+            if taken is None:
+                taken = False
+                for low, high in ranges:
+                    if low <= character <= high:
+                        taken = True
+                        break
+                taken = taken != negated
+                if len(seen) < 1024:  # statements can hold any character, only remember the common ones
+                    seen[character] = taken
+            member.append(taken)
+        return member
+
+
+class AlternationMatcher:
+
+    # constructor, the matchers are tried in order like the alternatives of (pattern0)|(pattern1)|...
+    def __init__(self, patterns):
+        self.matchers = [SafeMatcher(pattern) for pattern in patterns]
+        self.groupNumbers = []  # the number of the group around each alternative in the combined expression
+        groupNumber = 1
+        for matcher in self.matchers:
+            self.groupNumbers.append(groupNumber)
+            groupNumber += 1 + sum(1 for part in matcher.parts if part[0] != LITERAL and part[0] != OPTIONAL and
+                                   part[3])
+        self.numGroups = groupNumber - 1
+
+    # Returns a SafeMatch laid out like a match of the combined regular expression (every group of the alternatives
+    # that did not match is None) or None if no alternative matches
+    def match(self, text):
+        for i in range(len(self.matchers)):
+            found = self.matchers[i].match(text)
+            if found is not None:
+                first = self.groupNumbers[i]
+                values = [None] * self.numGroups
+                values[first - 1] = text[:found.length]
+                values[first:first + len(found.values)] = found.values
+                return SafeMatch(tuple(values), first, found.length)
+        return None
+
+    # the most steps a match of text of length characters can take
+    def cost(self, length):
+        return sum(matcher.cost(length) for matcher in self.matchers)
@@ -0,0 +1,290 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+Loads an Eliza from a script file instead of the rules written in Eliza.setKeys and runEliza.py, so rules can be
+changed without touching the code. A script file is JSON:
+    {
+      "reflections": {"am": "are", ...},
+      "psychobabble": [{"pattern": "I need (.*)", "responses": ["Why do you need {0}?", ...]}, ...],
+      "keywords": [{"name": "remember", "rank": 5, "synonyms": ["recall", ...],
+                    "rules": [{"decomp": "(.*)i remember (.*)", "reasmb": ["Do you often think of {1}?", ...]},
+                              ...]},
+                   ...],
+      "selector": {"name": "random", "seed": 7},
+      "fuzzy": {"maxDistance": 2},
+      "safeMatching": true,
+      "limits": {"maxInputLength": 2000, "matchBudget": 200000, "fallback": "Could you put that more briefly?"}
+    }
+selector is optional and picks how responses are chosen (see Selector.py), round-robin if it is left out.
+fuzzy is optional and turns on typo tolerant Keyword matching (see FuzzyIndex.py), off if it is left out.
+safeMatching is optional and matches the patterns in linear time (see SafeMatcher.py), off if it is left out.
+limits is optional and caps the work of a turn (see Eliza.setMatchLimits), every field of it is optional too.
+Run "python ScriptLoader.py --export doctor.json" to write the built-in script in this format.
+
+The script is checked before it is used (see validateScript, and Eliza.setGotoTargets for gotos) and the
+mistakes found are reported in a ScriptError. Building an Eliza (compiling the regular expressions, indexing the
+Keywords, ...) is done once: the result is saved in cacheDir under the hash of the script file, and later loads of
+the same file read that artifact instead. Artifacts are pickles, so cacheDir must only be writable by people trusted to run code.
+
+Functions:
+    ScriptError
+    loadScript
+    compileScript
+    validateScript
+    checkTemplates
+    scriptOf
+    exportScript
+    main
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import string
+import sys
+
+from Eliza import Eliza, DEFAULT_FALLBACK
+from Keyword import Keyword
+from Selector import SELECTORS
+
+# changes whenever the artifact layout changes, so an artifact is never used by code it wasn't made for
+ARTIFACT_VERSION = 14
+MAX_RULES = 10  # the most regular expressions a Keyword can have
+
+
+# raised when a script file can't be used, the message lists every problem found
+class ScriptError(ValueError):
+
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__("invalid script:\n    " + "\n    ".join(problems))
+
+
+# Returns the Eliza for the script file at path. If cacheDir is given the compiled Eliza is read from there when the
+# file has been compiled before, and saved there when it has not
+def loadScript(path, cacheDir=None):
+    with open(path, "rb") as fo:
+        data = fo.read()
+    if cacheDir is None:
+        return compileScript(data)
+    digest = hashlib.sha256(data).hexdigest()
+    version = "%d-py%d%d" % (ARTIFACT_VERSION, sys.version_info[0], sys.version_info[1])
+    artifactPath = os.path.join(cacheDir, digest + "-" + version + ".elizac")
+    try:
+        with open(artifactPath, "rb") as fo:
+            return pickle.load(fo)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        pass  # not compiled yet (or the artifact is unusable), compile it again below
+    eliza = compileScript(data)
+    os.makedirs(cacheDir, exist_ok=True)
+    temporary = artifactPath + "." + str(os.getpid()) + ".tmp"
+    with open(temporary, "wb") as fo:
+        pickle.dump(eliza, fo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, artifactPath)  # so a reader never sees half an artifact
+    return eliza
+
+
+# Returns the Eliza for the contents of a script file (bytes or str), raises ScriptError if it is not valid
+def compileScript(data):
+    try:
+        script = json.loads(data)
+    except ValueError as error:
+        raise ScriptError(["not valid JSON: " + str(error)])
+    problems = validateScript(script)
+    if len(problems) != 0:
+        raise ScriptError(problems)
+    keys = []
+    for keyword in script["keywords"]:
+        arguments = []
+        for rule in keyword["rules"]:
+            arguments.append(rule["decomp"])
+            arguments.append(list(rule["reasmb"]))
+        aKey = Keyword(keyword["name"], keyword["rank"], *arguments)
+        aKey.addSynonyms(list(keyword.get("synonyms", [])))
+        keys.append(aKey)
+    psychobabble = [[entry["pattern"], list(entry["responses"])] for entry in script["psychobabble"]]
+    try:
+        eliza = Eliza(dict(script["reflections"]), psychobabble, keys)
+    except ValueError as error:  # gotos to unknown keywords or cycles of gotos
+        raise ScriptError(str(error).split("\n"))
+    if "selector" in script:
+        eliza.setSelector(script["selector"]["name"], script["selector"].get("seed", 0))
+    if "fuzzy" in script:
+        eliza.setFuzzyMatching(script["fuzzy"]["maxDistance"])
+    if script.get("safeMatching", False):
+        eliza.setSafeMatching(True)
+    if "limits" in script:
+        limits = script["limits"]
+        eliza.setMatchLimits(limits.get("maxInputLength"), limits.get("matchBudget"),
+                             limits.get("fallback", DEFAULT_FALLBACK))
+    return eliza
+
+
+# Returns a list of the problems with a parsed script file, an empty list if there are none
+def validateScript(script):
+    problems = []
+    if not isinstance(script, dict):
+        return ["the script must be a JSON object"]
+    reflections = script.get("reflections")
+    if not isinstance(reflections, dict) or \
+            not all(isinstance(value, str) for value in reflections.values()):
+        problems.append("reflections must be an object mapping words to words")
+    psychobabble = script.get("psychobabble")
+    if not isinstance(psychobabble, list) or len(psychobabble) == 0:
+        problems.append("psychobabble must be a non-empty list")
+        psychobabble = []
+    for i in range(len(psychobabble)):
+        entry = psychobabble[i]
+        where = "psychobabble " + str(i)
+        if not isinstance(entry, dict):
+            problems.append(where + " must be an object")
+            continue
+        checkTemplates(where, entry.get("pattern"), entry.get("responses"), problems)
+    keywords = script.get("keywords")
+    if not isinstance(keywords, list):
+        problems.append("keywords must be a list")
+        keywords = []
+    names = set()
+    for i in range(len(keywords)):
+        keyword = keywords[i]
+        if not isinstance(keyword, dict):
+            problems.append("keyword " + str(i) + " must be an object")
+            continue
+        name = keyword.get("name")
+        where = "keyword " + repr(name)
+        if not isinstance(name, str) or name == "":
+            problems.append("keyword " + str(i) + " needs a name")
+            where = "keyword " + str(i)
+        elif name in names:
+            problems.append(where + " is defined more than once")
+        names.add(name)
+        if not isinstance(keyword.get("rank"), int) or isinstance(keyword.get("rank"), bool):
+            problems.append(where + " needs an integer rank")
+        synonyms = keyword.get("synonyms", [])
+        if not isinstance(synonyms, list) or not all(isinstance(synonym, str) for synonym in synonyms):
+            problems.append(where + " synonyms must be a list of strings")
+        rules = keyword.get("rules")
+        if not isinstance(rules, list) or not 1 <= len(rules) <= MAX_RULES:
+            problems.append(where + " needs between 1 and " + str(MAX_RULES) + " rules")
+            continue
+        for j in range(len(rules)):
+            rule = rules[j]
+            if not isinstance(rule, dict):
+                problems.append(where + " rule " + str(j) + " must be an object")
+                continue
+            checkTemplates(where + " rule " + str(j), rule.get("decomp"), rule.get("reasmb"), problems)
+    if "selector" in script:
+        selector = script["selector"]
+        if not isinstance(selector, dict) or selector.get("name") not in SELECTORS:
+            problems.append("selector must be an object with a name out of " + ", ".join(SELECTORS))
+        elif not isinstance(selector.get("seed", 0), int) or isinstance(selector.get("seed", 0), bool):
+            problems.append("selector seed must be an integer")
+    if "fuzzy" in script:
+        fuzzy = script["fuzzy"]
+        if not isinstance(fuzzy, dict) or not isinstance(fuzzy.get("maxDistance"), int) or \
+                isinstance(fuzzy.get("maxDistance"), bool) or fuzzy["maxDistance"] < 0:
+            problems.append("fuzzy must be an object with a maxDistance that is an integer of at least 0")
+    if "safeMatching" in script and not isinstance(script["safeMatching"], bool):
+        problems.append("safeMatching must be true or false")
+    if "limits" in script:
+        limits = script["limits"]
+        if not isinstance(limits, dict):
+            problems.append("limits must be an object")
+            limits = {}
+        for field in ("maxInputLength", "matchBudget"):
+            limit = limits.get(field)
+            if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+                problems.append("limits " + field + " must be a positive integer")
+        if not isinstance(limits.get("fallback", ""), str):
+            problems.append("limits fallback must be a string")
+    return problems
+
+
+# Checks that pattern is a regular expression and responses a non-empty list of responses that only use groups
+# the pattern has ({0} is the first group), adding any problems found to problems
+def checkTemplates(where, pattern, responses, problems):
+    if not isinstance(pattern, str):
+        problems.append(where + " needs a pattern")
+        return
+    try:
+        numGroups = re.compile(pattern).groups
+    except re.error as error:
+        problems.append(where + " pattern " + repr(pattern) + " is not a valid regular expression: " + str(error))
+        return
+    if not isinstance(responses, list) or len(responses) == 0 or \
+            not all(isinstance(response, str) for response in responses):
+        problems.append(where + " needs a non-empty list of responses")
+        return
+    for response in responses:
+        if response.startswith("goto "):
+            continue
+        try:
+            fields = [field for text, field, spec, conversion in string.Formatter().parse(response)
+                      if field is not None]
+        except ValueError as error:
+            problems.append(where + " response " + repr(response) + " is not a valid template: " + str(error))
+            continue
+        for field in fields:
+            if not field.isdigit() or int(field) >= numGroups:
+                problems.append(where + " response " + repr(response) + " uses {" + field + "} but the pattern has " +
+                                str(numGroups) + " groups")
+
+
+# Returns the script of an Eliza, as it is written to a script file
+def scriptOf(eliza):
+    keywords = []
+    for aKey in eliza.keys:
+        rules = [{"decomp": aKey.regexLis[i], "reasmb": aKey.reasmbLis[i]} for i in range(aKey.numRegex)]
+        keywords.append({"name": aKey.name, "rank": aKey.rank, "synonyms": aKey.synonyms, "rules": rules})
+    script = {"reflections": eliza.reflections,
+              "psychobabble": [{"pattern": pattern, "responses": responses}
+                               for pattern, responses in eliza.psychobabble],
+              "keywords": keywords}
+    if eliza.selector.name != "round-robin":
+        script["selector"] = {"name": eliza.selector.name, "seed": getattr(eliza.selector, "seed", 0)}
+    if eliza.fuzzyIndex is not None:
+        script["fuzzy"] = {"maxDistance": eliza.fuzzyIndex.maxDistance}
+    if eliza.safeMatching:
+        script["safeMatching"] = True
+    limits = {"maxInputLength": eliza.maxInputLength, "matchBudget": eliza.matchBudget}
+    limits = {field: limit for field, limit in limits.items() if limit is not None}
+    if eliza.fallbackResponse != DEFAULT_FALLBACK:
+        limits["fallback"] = eliza.fallbackResponse
+    if len(limits) != 0:
+        script["limits"] = limits
+    return script
+
+
+# Writes the script of an Eliza to a script file
+def exportScript(eliza, path):
+    script = scriptOf(eliza)
+    with open(path, "w") as fo:
+        json.dump(script, fo, indent=2)
+        fo.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and compile an Eliza script file.")
+    parser.add_argument("script", nargs="?", help="script file to check and compile")
+    parser.add_argument("--cache-dir", help="save the compiled script here")
+    parser.add_argument("--export", metavar="PATH", help="write the built-in script to PATH")
+    args = parser.parse_args()
+    if args.export is not None:
+        from runEliza import reflections, psychobabble
+        exportScript(Eliza(reflections, psychobabble), args.export)
+    if args.script is not None:
+        try:
+            eliza = loadScript(args.script, args.cache_dir)
+        except ScriptError as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+        print(args.script + ": " + str(len(eliza.keys)) + " keywords, " + str(len(eliza.psychobabble)) +
+              " psychobabble patterns")
+
+
+if __name__ == "__main__":
+    main()
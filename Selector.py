@@ -0,0 +1,70 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+Selectors pick which of a rule's responses Eliza uses next. A selector holds no state of its own, everything it
+needs is kept in the Session (its cursors and randomState), so one selector is shared by every Session. Each pick
+takes the same time however long the conversation has been going:
+    round-robin   the responses in order and then again from the first. Every response has then been used the
+                  same number of times, or once more, so this is also the least recently used response ("lru")
+    random        a pseudo-random response from the Session's own generator. The sequence only depends on the
+                  selector's seed and the seed the Session was created with, so replaying the same conversations
+                  with the same seeds gives the same responses
+The script picks the selector every Session uses (see Eliza.setSelector) and a Session can pick its own.
+
+ Attributes:
+     string name
+     int seed
+
+Functions:
+    RoundRobinSelector.select
+    RandomSelector.__init__
+    RandomSelector.select
+    makeSelector
+
+'''
+
+MASK = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15  # the step of the generator (splitmix64)
+
+
+class RoundRobinSelector:
+
+    name = "round-robin"
+
+    # Returns the index of the next response of the rule whose cursor is cursors[slot] and moves the cursor on
+    @staticmethod
+    def select(cursors, slot, numResponses, session):
+        index = cursors[slot]
+        cursors[slot] = (index + 1) % numResponses
+        return index
+
+
+class RandomSelector:
+
+    name = "random"
+
+    # constructor, different seeds give different sequences for Sessions created with the same seed
+    def __init__(self, seed=0):
+        self.seed = seed & MASK
+
+    # Returns the index of a pseudo-random response of the rule and moves the Session's generator on
+    def select(self, cursors, slot, numResponses, session):
+        state = (session.randomState + GOLDEN_GAMMA) & MASK
+        session.randomState = state
+        z = state ^ self.seed
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+        return (z ^ (z >> 31)) % numResponses
+
+
+SELECTORS = {"round-robin": RoundRobinSelector, "lru": RoundRobinSelector, "random": RandomSelector}
+
+
+# Returns the selector called name, raises ValueError if there is no such selector
+def makeSelector(name, seed=0):
+    if name not in SELECTORS:
+        raise ValueError("unknown response selector " + repr(name) + ", use one of " + ", ".join(SELECTORS))
+    if SELECTORS[name] is RandomSelector:
+        return RandomSelector(seed)
+    return RoundRobinSelector()
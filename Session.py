@@ -0,0 +1,161 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+A class to store everything that changes during one conversation with Eliza.
+The script itself lives in the Eliza object and is shared by every Session, so a Session only needs a few hundred
+bytes: one cursor per regular expression and per psychobable pattern, the number of turns so far, the memory
+(which Eliza.memoryPolicy keeps to a fixed number of entries), the state of the Session's response selector and the
+version of the script its cursors are laid out for (see Eliza.migrateSession).
+
+ Attributes:
+     array keyCursors
+     array generalCursors
+     int turns
+     tuple or deque memory
+     selector selector
+     int randomState
+     int version
+
+Functions:
+    __init__
+    toBytes
+    fromBytes
+    __str__
+
+A Session can be saved as a snapshot with toBytes and restored with fromBytes. A snapshot (version 4) is:
+    4 bytes     b"ELZS"
+    1 byte      version
+    4 uint32    number of Keyword cursors, number of psychobable cursors, number of memory entries, turns
+    1 byte      the Session's selector: 0 the script's, 1 round-robin, 2 random
+    2 uint64    the seed of the Session's selector, randomState
+    uint32      the version of the script
+    uint16s     the Keyword cursors then the psychobable cursors
+    for each memory entry: int32 rank, uint32 turn, uint32 length of the response, uint32 length of the Keyword's
+                name, then the response and the name in UTF-8
+All numbers are little-endian. Older snapshots can still be read: version 3 has no script version (it is read as 0,
+an unknown version) and its memory entries have no Keyword name (read as "", such entries keep their rank when the
+Session is migrated), version 2 also has no selector and version 1 also has no turns and its memory entries are only
+a length and the text (they get rank 0 and turn 0). fromBytes only checks the format, the cursors are checked
+against the script by Eliza.checkCursors when a snapshot is loaded (see SessionStore.load).
+
+'''
+
+import struct
+import sys
+from array import array
+from collections import deque
+
+from Selector import makeSelector
+
+SNAPSHOT_MAGIC = b"ELZS"
+SNAPSHOT_VERSION = 4
+SNAPSHOT_HEADERS = {1: struct.Struct("<4sBIII"), 2: struct.Struct("<4sBIIII"), 3: struct.Struct("<4sBIIIIBQQ"),
+                    4: struct.Struct("<4sBIIIIBQQI")}
+SNAPSHOT_ENTRIES = {1: struct.Struct("<I"), 2: struct.Struct("<iII"), 3: struct.Struct("<iII"),
+                    4: struct.Struct("<iIII")}
+SNAPSHOT_SELECTORS = [None, "round-robin", "random"]  # selector names by their number in a snapshot
+
+
+class Session:
+
+    # __slots__ stops every Session from carrying a dictionary of attributes
+    __slots__ = ("keyCursors", "generalCursors", "turns", "memory", "selector", "randomState", "version")
+
+    # constructor, the arrays are normally copies of Eliza.keyCursorTemplate and Eliza.generalCursorTemplate
+    def __init__(self, keyCursors, generalCursors):
+        self.keyCursors = keyCursors  # index of the next response to use for each Keyword regular expression
+        self.generalCursors = generalCursors  # index of the next response to use for each psychobable pattern
+        self.turns = 0  # number of turns so far, memory entries are stamped with it
+        # (response, rank, turn, name of the Keyword) entries of previous responses, giving Eliza memory.
+        # Memory.MemoryPolicy replaces the empty tuple with a deque when the first response is stored
+        self.memory = ()
+        self.selector = None  # picks the responses of this Session, None to use the script's (Eliza.selector)
+        self.randomState = 0  # the state of the random selector's generator
+        self.version = 0  # Eliza.version of the script the cursors are for, 0 if it is not known
+
+    # Returns a snapshot of the session as bytes
+    def toBytes(self):
+        keyCursors = self.keyCursors
+        generalCursors = self.generalCursors
+        if sys.byteorder == "big":  # snapshots are always little-endian
+            keyCursors = array("H", keyCursors)
+            keyCursors.byteswap()
+            generalCursors = array("H", generalCursors)
+            generalCursors.byteswap()
+        if self.selector is None:
+            selector, seed = 0, 0
+        else:
+            selector, seed = SNAPSHOT_SELECTORS.index(self.selector.name), getattr(self.selector, "seed", 0)
+        header = SNAPSHOT_HEADERS[SNAPSHOT_VERSION].pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(keyCursors),
+                                                         len(generalCursors), len(self.memory), self.turns, selector,
+                                                         seed, self.randomState, self.version)
+        parts = [header, keyCursors.tobytes(), generalCursors.tobytes()]
+        for response, rank, turn, keyName in self.memory:
+            encodedResponse = response.encode("utf-8")
+            encodedName = keyName.encode("utf-8")
+            parts.append(SNAPSHOT_ENTRIES[SNAPSHOT_VERSION].pack(rank, turn, len(encodedResponse), len(encodedName)))
+            parts.append(encodedResponse)
+            parts.append(encodedName)
+        return b"".join(parts)
+
+    # Returns the Session saved in a snapshot from toBytes, raises ValueError if data is not a valid snapshot
+    @staticmethod
+    def fromBytes(data):
+        if len(data) < SNAPSHOT_HEADERS[1].size:
+            raise ValueError("session snapshot is truncated")
+        magic, version = SNAPSHOT_HEADERS[1].unpack_from(data)[:2]
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("not a session snapshot")
+        if version not in SNAPSHOT_HEADERS:
+            raise ValueError("unsupported session snapshot version " + str(version))
+        header = SNAPSHOT_HEADERS[version]
+        if len(data) < header.size:
+            raise ValueError("session snapshot is truncated")
+        # the fields missing from older versions are 0
+        fields = header.unpack_from(data)[2:]
+        fields += (0,) * (8 - len(fields))
+        numKeyCursors, numGeneralCursors, numMemory, turns, selector, seed, randomState, scriptVersion = fields
+        if selector >= len(SNAPSHOT_SELECTORS):
+            raise ValueError("session snapshot has an unknown selector")
+        position = header.size
+        end = position + 2 * (numKeyCursors + numGeneralCursors)
+        if len(data) < end:
+            raise ValueError("session snapshot is truncated")
+        keyCursors = array("H", data[position:position + 2 * numKeyCursors])
+        generalCursors = array("H", data[position + 2 * numKeyCursors:end])
+        if sys.byteorder == "big":
+            keyCursors.byteswap()
+            generalCursors.byteswap()
+        session = Session(keyCursors, generalCursors)
+        session.turns = turns
+        if selector != 0:
+            session.selector = makeSelector(SNAPSHOT_SELECTORS[selector], seed)
+        session.randomState = randomState
+        session.version = scriptVersion
+        position = end
+        entry = SNAPSHOT_ENTRIES[version]
+        if numMemory != 0:
+            session.memory = deque()
+        for i in range(numMemory):
+            if len(data) < position + entry.size:
+                raise ValueError("session snapshot is truncated")
+            # the fields missing from older versions are 0, except the length that every version has
+            fields = entry.unpack_from(data, position)
+            if version == 1:
+                fields = (0, 0) + fields
+            rank, turn, length, nameLength = fields + (0,) * (4 - len(fields))
+            position += entry.size
+            if len(data) < position + length + nameLength:
+                raise ValueError("session snapshot is truncated")
+            response = bytes(data[position:position + length]).decode("utf-8")
+            keyName = bytes(data[position + length:position + length + nameLength]).decode("utf-8")
+            session.memory.append((response, rank, turn, keyName))
+            position += length + nameLength
+        return session
+
+    # String output for the Session object
+    def __str__(self):
+        return "\nKeyword cursors: " + str(list(self.keyCursors)) + "\nPsychobable cursors: " + \
+               str(list(self.generalCursors)) + "\nTurns: " + str(self.turns) + "\nMemory: " + \
+               str([entry[0] for entry in self.memory]) + "\n\n"
@@ -0,0 +1,181 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+A class that keeps the Sessions of many conversations with one Eliza, keyed by session id.
+At most maxResident Sessions are kept in memory. If the store has a directory, Sessions that are idle (or pushed
+out because too many are in memory) are spilled to a snapshot file in that directory, one file per session,
+and loaded back the next time they are used. Without a directory idle Sessions are simply dropped.
+Because spilled Sessions are plain files, a restarted process using the same directory picks up every
+conversation where it left off (call spillAll before exiting to save the ones still in memory).
+Sessions can also be handed from one store to another (see ShardedServer) with detach and attach.
+When a new version of the script is swapped in (see swap) the Sessions are moved over to it the next time they are
+used, so the swap itself takes no time however many Sessions there are.
+
+ Attributes:
+     Eliza eliza
+     string directory
+     int maxResident
+     OrderedDict resident
+     dict previous
+
+Functions:
+    __init__
+    __len__
+    get
+    end
+    spill
+    spillIdle
+    spillAll
+    detach
+    attach
+    swap
+    load
+    sessionPath
+
+'''
+
+import hashlib
+import os
+import time
+import zlib
+from collections import OrderedDict
+
+from Session import Session
+
+MAX_PREVIOUS_SCRIPTS = 4  # older scripts kept to migrate sessions from, sessions from even older ones start over
+
+
+class SessionStore:
+
+    # constructor
+    def __init__(self, eliza, directory=None, maxResident=100000):
+        self.eliza = eliza  # the script every session belongs to
+        self.directory = directory  # where spilled sessions are saved, None to drop them instead
+        self.maxResident = maxResident  # the most sessions kept in memory at once
+        # session id -> [Session, time of last use], ordered from least to most recently used
+        self.resident = OrderedDict()
+        self.previous = {}  # version -> an older Eliza some sessions may still be laid out for
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    # number of sessions in memory
+    def __len__(self):
+        return len(self.resident)
+
+    # Returns the Session for a session id. It is taken from memory, loaded from its snapshot file or created.
+    # Returns None if the session is not in memory, memory is full and there is no directory to spill to
+    def get(self, sessionId):
+        now = time.monotonic()
+        entry = self.resident.get(sessionId)
+        if entry is not None:
+            entry[1] = now
+            self.resident.move_to_end(sessionId)
+            session = entry[0]
+            if session.version != self.eliza.version:  # the script has changed since the session was last used
+                self.eliza.migrateSession(session, self.previous.get(session.version))
+            return session
+        if len(self.resident) >= self.maxResident:
+            if self.directory is None:
+                return None
+            self.spill(next(iter(self.resident)))  # make room by spilling the least recently used session
+        session = self.load(sessionId)
+        if session is None:
+            # seeded by the session id so the random selector gives a session the same responses every time
+            session = self.eliza.newSession(zlib.crc32(sessionId.encode("utf-8")))
+        self.resident[sessionId] = [session, now]
+        return session
+
+    # forgets a session, in memory and on disk. Returns True if it existed
+    def end(self, sessionId):
+        existed = self.resident.pop(sessionId, None) is not None
+        if self.directory is not None:
+            try:
+                os.remove(self.sessionPath(sessionId))
+                existed = True
+            except FileNotFoundError:
+                pass
+        return existed
+
+    # removes a session from memory, saving it to its snapshot file if the store has a directory
+    def spill(self, sessionId):
+        session = self.resident.pop(sessionId)[0]
+        if self.directory is None:
+            return
+        path = self.sessionPath(sessionId)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as fo:
+            fo.write(session.toBytes())
+        os.replace(temporary, path)  # so a crash never leaves half a snapshot behind
+
+    # spills every session that has not been used for idleTimeout seconds, returns how many were spilled
+    # sessions are kept in order of last use so only the expired ones at the front are looked at
+    def spillIdle(self, idleTimeout):
+        oldest = time.monotonic() - idleTimeout
+        count = 0
+        while len(self.resident) != 0:
+            sessionId, entry = next(iter(self.resident.items()))
+            if entry[1] > oldest:
+                break
+            self.spill(sessionId)
+            count += 1
+        return count
+
+    # spills every session in memory
+    def spillAll(self):
+        while len(self.resident) != 0:
+            self.spill(next(iter(self.resident)))
+
+    # removes a session from memory without saving it and returns it (None if it is not in memory), so it can be
+    # attached to another store
+    def detach(self, sessionId):
+        entry = self.resident.pop(sessionId, None)
+        if entry is None:
+            return None
+        return entry[0]
+
+    # adds a session detached from another store, replacing any this store has with the same id
+    def attach(self, sessionId, session):
+        if sessionId not in self.resident and len(self.resident) >= self.maxResident and self.directory is not None:
+            self.spill(next(iter(self.resident)))
+        self.resident[sessionId] = [session, time.monotonic()]
+        self.resident.move_to_end(sessionId)
+
+    # makes eliza (a new version of the script) the one sessions belong to from now on
+    def swap(self, eliza):
+        if eliza.version != self.eliza.version:
+            self.previous.pop(eliza.version, None)
+            self.previous[self.eliza.version] = self.eliza
+            while len(self.previous) > MAX_PREVIOUS_SCRIPTS:
+                del self.previous[next(iter(self.previous))]
+        self.eliza = eliza
+
+    # Returns the Session saved in the snapshot file of a session id or None if there is no file.
+    # The file is kept until the session ends, so a crash only loses the turns since the session was loaded.
+    # A snapshot saved with another version of the script is migrated to this store's Eliza. Raises ValueError if
+    # the snapshot is not valid, its cursors don't fit this script (see Eliza.checkCursors) or it is too old to say
+    # which script it was saved with and does not fit this one
+    def load(self, sessionId):
+        if self.directory is None:
+            return None
+        path = self.sessionPath(sessionId)
+        try:
+            with open(path, "rb") as fo:
+                data = fo.read()
+        except FileNotFoundError:
+            return None
+        session = Session.fromBytes(data)
+        if session.version == 0:  # saved before snapshots had the version of the script
+            if len(session.keyCursors) != len(self.eliza.keyCursorTemplate) or \
+                    len(session.generalCursors) != len(self.eliza.generalCursorTemplate):
+                raise ValueError("snapshot of session " + repr(sessionId) + " was saved with a different script")
+            session.version = self.eliza.version
+        elif session.version != self.eliza.version:
+            self.eliza.migrateSession(session, self.previous.get(session.version))  # every cursor is made to fit
+            return session
+        self.eliza.checkCursors(session)  # a corrupt snapshot fails here instead of in the middle of a turn
+        return session
+
+    # the snapshot file of a session id, the id is hashed so any string can be used safely as a file name
+    def sessionPath(self, sessionId):
+        return os.path.join(self.directory, hashlib.sha1(sessionId.encode("utf-8")).hexdigest() + ".session")
@@ -0,0 +1,541 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+A front-end for ElizaServer that spreads the conversations over several worker processes, so a box uses all of its
+cores (an Eliza only ever uses one). Clients speak the same protocol as ElizaServer, for example
+    python ShardedServer.py --workers 8 --port 5000 --script doctor.json --cache-dir cache
+Each session id is routed to a worker by a consistent hash ring (see HashRing), so a session always stays on one
+worker and its Session is never shared between processes.
+
+The front builds the Eliza once (or loads the compiled script with --script and --cache-dir) and every worker is
+started with that compiled Eliza, pickled, so no worker builds the script again. Workers talk to the front over a
+socket pair, one JSON object per line, and answer in order, so the front keeps a queue of the requests waiting on
+each worker. Each worker keeps its own SessionStore (--max-sessions is per worker) and they all spill to the same
+--spill-dir, which is safe because a session only ever lives on one worker.
+
+Workers can join (addWorker, or SIGUSR1) and leave (removeWorker, or SIGUSR2 for the newest one) while the server
+is running. Routing is paused while the ring changes, the workers that lose sessions hand them over as snapshots
+(see Session.toBytes) to the workers that now own them, and routing resumes, so a conversation carries on where it
+left off. Metrics requests are answered with the metrics of every worker, labelled with the worker's name, and
+profile requests start a profile on every worker or report them together.
+A new version of the script (reload, or SIGHUP) is built once by the front and sent to every worker, which swaps it
+in like ElizaServer.reload.
+A worker says it is ready once it has loaded the Eliza, and one that does not within WORKER_START_TIMEOUT seconds
+stops the server from starting (or the worker from joining). A request that fails inside a worker gets an error
+back like ElizaServer's. A worker that exits while it is still on the ring is started again under the same name, so
+the ring does not change and its sessions are resumed from --spill-dir if they were spilled (the ones it only had in
+memory are lost). If it can't be started again it is taken off the ring and its sessions go to the other workers.
+
+The messages between the front and a worker, besides the session requests of ElizaServer:
+    (sent by the worker when it starts)   {"ready": name of the worker}
+    {"handoff": [names of the workers]}   ->   {"sessions": {session id: base64 snapshot}}
+    {"import": {session id: base64 snapshot}}   ->   {"imported": count}
+    {"reload": base64 pickled Eliza}   ->   {"reloaded": version of the script}
+    {"stop": true}   ->   {"stopped": true}
+
+ WorkerHandle Attributes:
+     string name
+     Process process
+     StreamReader reader
+     StreamWriter writer
+     deque pending
+     Task listener
+     bool stopping
+     function onExit
+
+ ShardedServer Attributes (besides those of ElizaServer):
+     int numWorkers
+     string spillDir
+     int maxSessions
+     HashRing ring
+     dict workers
+     int nextWorker
+     Event routing
+     Lock membership
+
+Functions:
+    WorkerHandle.__init__
+    WorkerHandle.call
+    WorkerHandle.listen
+    WorkerHandle.stop
+    ShardedServer.__init__
+    ShardedServer.start
+    ShardedServer.shutdown
+    ShardedServer.respond
+    ShardedServer.reload
+    ShardedServer.reapIdleSessions
+    ShardedServer.startWorker
+    ShardedServer.replaceWorker
+    ShardedServer.addWorker
+    ShardedServer.removeWorker
+    ShardedServer.rebalance
+    ShardedServer.collectMetrics
+    ShardedServer.collectProfile
+    runWorker
+    handleWorkerRequests
+    handleRun
+    handOff
+    mergeMetrics
+    serve
+    main
+
+'''
+
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import pickle
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+from collections import deque
+
+from ElizaServer import ElizaServer, addArguments, buildEliza, reloadScript
+from HashRing import HashRing
+from Profiler import mergeReports
+from Session import Session
+from SessionStore import SessionStore
+
+WORKER_LINE_LIMIT = 1 << 28  # longest line from a worker, a handoff carries many sessions on one line
+WORKER_START_TIMEOUT = 60.0  # seconds a new worker has to load the Eliza and say it is ready
+
+
+# the front's end of the connection to one worker process
+class WorkerHandle:
+
+    # constructor, must be called while the event loop is running. onExit is called with the handle if the
+    # worker goes away without being asked to stop
+    def __init__(self, name, process, reader, writer, onExit=None):
+        self.name = name
+        self.process = process
+        self.reader = reader
+        self.writer = writer
+        self.pending = deque()  # futures of the requests sent to the worker, in the order they were sent
+        self.stopping = False  # set once the worker has been asked to stop
+        self.onExit = onExit
+        self.listener = asyncio.create_task(self.listen())
+
+    # sends a request object to the worker and returns its response object.
+    # Raises ConnectionError if the worker has stopped
+    async def call(self, request):
+        if self.listener.done():
+            raise ConnectionError("worker " + self.name + " has stopped")
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(future)
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+        return await future
+
+    # hands every response from the worker to the request waiting for it, the worker answers in order
+    async def listen(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                future = self.pending.popleft()
+                if not future.done():  # the request may have given up waiting
+                    future.set_result(json.loads(line))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            while len(self.pending) != 0:
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_exception(ConnectionError("worker " + self.name + " has stopped"))
+            if not self.stopping and self.onExit is not None:
+                self.onExit(self)
+
+    # asks the worker to stop (saving its sessions if it spills them) and waits up to grace seconds for it to exit
+    async def stop(self, grace):
+        self.stopping = True
+        try:
+            await asyncio.wait_for(self.call({"stop": True}), grace)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        self.writer.close()
+        await asyncio.get_running_loop().run_in_executor(None, self.process.join, grace)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class ShardedServer(ElizaServer):
+
+    # constructor, maxSessions is the most sessions each worker keeps in memory
+    def __init__(self, eliza, numWorkers, spillDir=None, maxSessions=100000, idleTimeout=600.0, maxLineLength=65536,
+                 shutdownGrace=5.0):
+        # the front itself never keeps a session
+        super().__init__(eliza, SessionStore(eliza, maxResident=0), idleTimeout, maxLineLength, shutdownGrace)
+        self.numWorkers = numWorkers  # workers started with the server
+        self.spillDir = spillDir
+        self.maxSessions = maxSessions
+        self.ring = HashRing()
+        self.workers = {}  # name -> WorkerHandle, in the order they were started
+        self.nextWorker = 0  # number in the name of the next worker
+        self.routing = None  # set while requests can be routed, cleared while sessions move between workers
+        self.membership = None  # held while a worker joins or leaves
+
+    # starts the workers then listens like ElizaServer.start
+    async def start(self, host="127.0.0.1", port=5000, path=None):
+        self.routing = asyncio.Event()
+        self.routing.set()
+        self.membership = asyncio.Lock()
+        try:
+            for i in range(self.numWorkers):
+                handle = await self.startWorker()
+                self.workers[handle.name] = handle
+                self.ring.add(handle.name)
+        except ConnectionError:
+            await asyncio.gather(*(handle.stop(self.shutdownGrace) for handle in self.workers.values()))
+            raise
+        return await super().start(host, port, path)
+
+    # stops accepting connections like ElizaServer.shutdown, then stops every worker
+    async def shutdown(self):
+        await super().shutdown()
+        await asyncio.gather(*(handle.stop(self.shutdownGrace) for handle in self.workers.values()))
+
+    # routes a request line to the worker of its session and returns that worker's response object
+    async def respond(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"error": "invalid JSON"}
+        if isinstance(request, dict) and request.get("metrics"):
+            return await self.collectMetrics()
+        if isinstance(request, dict) and "profile" in request:
+            return await self.collectProfile(request)
+        problem = self.checkSessionId(request.get("session") if isinstance(request, dict) else None)
+        if problem is not None:
+            return {"error": problem}
+        sessionId = request["session"]
+        # only the fields of a session request are passed on, so a client can't send a worker the front's messages
+        if request.get("end"):
+            message = {"session": sessionId, "end": True}
+        else:
+            message = {"session": sessionId, "statement": request.get("statement")}
+        await self.routing.wait()
+        try:
+            return await self.workers[self.ring.lookup(sessionId)].call(message)
+        except ConnectionError as error:
+            return {"session": sessionId, "error": str(error)}
+
+    # Builds a new Eliza with build in a thread, sends it to every worker and returns it (see ElizaServer.reload).
+    # Workers started later get the new one too
+    async def reload(self, build):
+        loop = asyncio.get_running_loop()
+        eliza = await loop.run_in_executor(None, build)
+        if self.eliza.getMetrics() is not None:
+            eliza.enableMetrics(self.eliza.getMetrics())  # not pickled, the workers keep their own
+        data = await loop.run_in_executor(None, lambda: base64.b64encode(
+            pickle.dumps(eliza, protocol=pickle.HIGHEST_PROTOCOL)).decode("ascii"))
+        async with self.membership:
+            self.eliza = eliza
+            await asyncio.gather(*(handle.call({"reload": data}) for handle in self.workers.values()))
+        return eliza
+
+    # every worker reaps its own idle sessions
+    async def reapIdleSessions(self):
+        return
+
+    # Starts a worker process (called name, or a new name if None) with a copy of the compiled Eliza and returns its
+    # WorkerHandle once the worker is ready. Raises ConnectionError if it does not get ready
+    async def startWorker(self, name=None):
+        if name is None:
+            name = "worker" + str(self.nextWorker)
+            self.nextWorker += 1
+        front, back = socket.socketpair()
+        # spawn rather than fork so a worker never inherits the front's listening socket or its other workers' sockets
+        process = multiprocessing.get_context("spawn").Process(
+            target=runWorker, name="eliza-" + name, daemon=True,
+            args=(back, name, self.eliza, self.spillDir, self.maxSessions, self.idleTimeout,
+                  self.eliza.metrics is not None))
+        process.start()
+        back.close()
+        reader, writer = await asyncio.open_unix_connection(sock=front, limit=WORKER_LINE_LIMIT)
+        try:
+            line = await asyncio.wait_for(reader.readline(), WORKER_START_TIMEOUT)
+            ready = json.loads(line) if line else None
+        except (ConnectionError, ValueError, asyncio.TimeoutError):
+            ready = None
+        if not isinstance(ready, dict) or ready.get("ready") != name:
+            writer.close()
+            process.terminate()
+            raise ConnectionError("worker " + name + " did not start")
+        return WorkerHandle(name, process, reader, writer, self.replaceWorker)
+
+    # called when a worker goes away on its own: starts it again under the same name, or takes it off the ring if
+    # that fails. Requests wait while it starts
+    def replaceWorker(self, handle):
+        if self.closing or self.workers.get(handle.name) is not handle:
+            return  # shutting down, or it was removed on purpose
+
+        async def replace():
+            async with self.membership:
+                if self.closing or self.workers.get(handle.name) is not handle:
+                    return
+                print("worker " + handle.name + " stopped, starting it again", file=sys.stderr)
+                self.routing.clear()
+                try:
+                    handle.writer.close()
+                    if handle.process.is_alive():
+                        handle.process.terminate()
+                    try:
+                        self.workers[handle.name] = await self.startWorker(handle.name)
+                    except ConnectionError as error:
+                        print(str(error) + ", its sessions go to the other workers", file=sys.stderr)
+                        del self.workers[handle.name]
+                        self.ring.remove(handle.name)
+                finally:
+                    self.routing.set()
+
+        asyncio.ensure_future(replace())
+
+    # starts one more worker, moves the sessions the ring now gives it over to it and returns its name
+    async def addWorker(self):
+        async with self.membership:
+            handle = await self.startWorker()
+            others = list(self.workers.values())
+            self.routing.clear()
+            try:
+                self.workers[handle.name] = handle
+                self.ring.add(handle.name)
+                await self.rebalance(others)
+            finally:
+                self.routing.set()
+            return handle.name
+
+    # moves the sessions of a worker (the newest one if name is None) to the other workers and stops it.
+    # Returns its name, or None if there is no such worker or it is the last one
+    async def removeWorker(self, name=None):
+        async with self.membership:
+            if name is None and len(self.workers) != 0:
+                name = list(self.workers)[-1]
+            if name not in self.workers or len(self.workers) == 1:
+                return None
+            self.routing.clear()
+            try:
+                handle = self.workers.pop(name)
+                self.ring.remove(name)
+                await self.rebalance([handle])
+            finally:
+                self.routing.set()
+            await handle.stop(self.shutdownGrace)
+            return name
+
+    # asks the workers of handles to give up the sessions the ring now puts on other workers and hands those
+    # sessions to their new workers. Requests sent before this are answered first because workers answer in order
+    async def rebalance(self, handles):
+        members = sorted(self.ring.members)
+        replies = await asyncio.gather(*(handle.call({"handoff": members}) for handle in handles))
+        moved = {}  # name of the new worker -> {session id: snapshot}
+        for reply in replies:
+            for sessionId, snapshot in reply["sessions"].items():
+                moved.setdefault(self.ring.lookup(sessionId), {})[sessionId] = snapshot
+        await asyncio.gather(*(self.workers[name].call({"import": sessions}) for name, sessions in moved.items()))
+
+    # Returns the response to a metrics request: the metrics of every worker in one Prometheus text
+    async def collectMetrics(self):
+        if self.eliza.metrics is None:
+            return {"error": "metrics are not enabled"}
+        await self.routing.wait()
+        names = list(self.workers)
+        replies = await asyncio.gather(*(self.workers[name].call({"metrics": True}) for name in names),
+                                       return_exceptions=True)
+        texts = {}
+        for name, reply in zip(names, replies):
+            if isinstance(reply, dict) and "metrics" in reply:
+                texts[name] = reply["metrics"]
+        return {"metrics": mergeMetrics(texts)}
+
+    # Returns the response to a profile request (see ElizaServer.handleProfile): every worker starts a profile, or
+    # their reports are returned as one with a frame for each worker at the bottom of the stacks
+    async def collectProfile(self, request):
+        await self.routing.wait()
+        names = list(self.workers)
+        if request["profile"] == "report":
+            top = request.get("top", 10)
+            if top is not None and (not isinstance(top, int) or isinstance(top, bool) or top < 0):
+                return {"error": "top must be a number of entries"}
+            message = {"profile": "report", "top": None}
+        else:
+            message = {"profile": request["profile"]}
+        replies = await asyncio.gather(*(self.workers[name].call(message) for name in names), return_exceptions=True)
+        for reply in replies:
+            if isinstance(reply, BaseException):
+                return {"error": str(reply)}
+            if "error" in reply:
+                return reply
+        if message["profile"] != "report":
+            return {"profiling": True}
+        return {"profile": mergeReports([reply["profile"] for reply in replies], names, top)}
+
+
+# The body of a worker process: answers the front's messages on sock, one JSON object per line, until it is told to
+# stop or the front goes away
+def runWorker(sock, name, eliza, spillDir, maxSessions, idleTimeout, metrics):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the front decides when its workers stop
+    if metrics:
+        eliza.enableMetrics()
+    sessions = SessionStore(eliza, spillDir, maxSessions)
+    server = ElizaServer(eliza, sessions, idleTimeout)
+    interval = max(idleTimeout / 4, 0.05)
+    lastReap = time.monotonic()
+    buffer = bytearray()
+    searched = 0  # how much of buffer is known to have no newline
+    with sock:
+        sock.sendall(ElizaServer.encode({"ready": name}))
+        while True:
+            now = time.monotonic()
+            if now - lastReap >= interval:
+                sessions.spillIdle(idleTimeout)
+                lastReap = now
+            newline = buffer.rfind(b"\n", searched)
+            if newline == -1:
+                searched = len(buffer)
+                if select.select([sock], [], [], interval)[0]:
+                    data = sock.recv(1 << 16)
+                    if not data:  # the front has gone
+                        break
+                    buffer += data
+                continue
+            # every complete line that has arrived is handled as one batch
+            lines = bytes(buffer[:newline]).split(b"\n")
+            del buffer[:newline + 1]
+            searched = 0
+            requests = []
+            for line in lines:
+                try:
+                    requests.append(json.loads(line))
+                except ValueError:
+                    requests.append(None)
+            responses, stopped = handleWorkerRequests(server, name, requests)
+            sock.sendall(b"".join(ElizaServer.encode(response) for response in responses))
+            if stopped:
+                break
+        if spillDir is not None:
+            sessions.spillAll()
+        try:
+            sock.sendall(ElizaServer.encode({"stopped": True}))
+        except OSError:
+            pass
+
+
+# Returns the response objects to the decoded requests a worker received at once (None for a line that was not
+# JSON) and whether it was told to stop, in which case the requests after the stop are not answered.
+# The runs of session requests between the front's own messages are handled together (see ElizaServer.handleMessages)
+# A request that fails gets an error back, so the worker keeps serving its other sessions
+def handleWorkerRequests(server, name, requests):
+    responses = []
+    run = []  # session requests waiting to be handled together
+    for request in requests:
+        if isinstance(request, dict) and ("handoff" in request or "import" in request or "reload" in request or
+                                          request.get("stop")):
+            responses.extend(handleRun(server, run))
+            run = []
+            if request.get("stop"):
+                return responses, True
+            try:
+                if "handoff" in request:
+                    responses.append(handOff(server.sessions, name, request["handoff"]))
+                elif "reload" in request:
+                    server.swapScript(pickle.loads(base64.b64decode(request["reload"])))
+                    responses.append({"reloaded": server.eliza.version})
+                else:
+                    for sessionId, snapshot in request["import"].items():
+                        server.sessions.attach(sessionId, Session.fromBytes(base64.b64decode(snapshot)))
+                    responses.append({"imported": len(request["import"])})
+            except Exception:
+                traceback.print_exc()
+                responses.append({"error": "internal error"})
+        elif request is None:
+            responses.extend(handleRun(server, run))
+            run = []
+            responses.append({"error": "invalid JSON"})
+        else:
+            run.append(request)
+    responses.extend(handleRun(server, run))
+    return responses, False
+
+
+# Returns the response objects to a run of session requests (see ElizaServer.handleMessages), with an error for the
+# requests of a run that fails
+def handleRun(server, run):
+    if len(run) == 0:
+        return []
+    try:
+        return server.handleMessages(run)
+    except Exception:
+        traceback.print_exc()
+        return [{"session": request.get("session") if isinstance(request, dict) else None, "error": "internal error"}
+                for request in run]
+
+
+# Detaches the sessions of a worker that a ring of members puts on other workers, returns the handoff response
+def handOff(sessions, name, members):
+    ring = HashRing(members)
+    moved = {}
+    for sessionId in list(sessions.resident):
+        if ring.lookup(sessionId) != name:
+            moved[sessionId] = base64.b64encode(sessions.detach(sessionId).toBytes()).decode("ascii")
+    return {"sessions": moved}
+
+
+# Returns the Prometheus texts of the workers (name -> text) as one text with a worker label on every sample
+def mergeMetrics(texts):
+    families = {}  # metric name -> [HELP and TYPE lines, samples], in the order they are first seen
+    for worker, text in texts.items():
+        label = "worker=\"" + worker + "\""
+        family = None
+        for line in text.splitlines():
+            if line.startswith("#"):
+                family = families.setdefault(line.split(" ", 3)[2], [[], []])
+                if line not in family[0]:
+                    family[0].append(line)
+            elif line != "":
+                brace = line.find("{")
+                space = line.find(" ")
+                if brace != -1 and brace < space:
+                    line = line[:brace + 1] + label + "," + line[brace + 1:]
+                else:
+                    line = line[:space] + "{" + label + "}" + line[space:]
+                family[1].append(line)
+    lines = []
+    for comments, samples in families.values():
+        lines.extend(comments)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+async def serve(args):
+    eliza = buildEliza(args)
+    server = ShardedServer(eliza, args.workers, args.spill_dir, args.max_sessions, idleTimeout=args.idle_timeout)
+    await server.start(args.host, args.port, args.unix)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(reloadScript(server, args)))
+    loop.add_signal_handler(signal.SIGUSR1, lambda: asyncio.ensure_future(server.addWorker()))
+    loop.add_signal_handler(signal.SIGUSR2, lambda: asyncio.ensure_future(server.removeWorker()))
+    await stop.wait()
+    await server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many Eliza conversations over newline-delimited JSON, "
+                                                 "spread over several worker processes.")
+    addArguments(parser)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+A Turn is a user statement prepared once for every stage of Eliza that needs it:
+    text        the statement up to its first ".", with typographic apostrophes made plain and contractions
+                expanded (so "i'm sad" can be typed instead of "i am sad")
+    stripped    text without trailing "!" (what the regular expressions are matched against)
+    lower       text in lower case
+    words       lower without punctuation, split on spaces (what the Keywords are looked up with)
+    budget      the steps of matching the turn has left (see Eliza.setMatchLimits), None if there is no limit
+    limit       the name of the limit the turn ran into ("length" or "budget"), None if it has not
+    fixes       the (word typed, word meant) corrections made by fuzzy matching (see FuzzyIndex.correct)
+
+A Normaliser makes Turns. It is built once by Eliza with the contractions it should expand and the ones it should
+keep as typed, every table it uses is made in its constructor.
+
+ Turn Attributes:
+     string text
+     string stripped
+     string lower
+     string[] words
+     int budget
+     string limit
+     tuple fixes
+
+ Normaliser Attributes:
+     dict contractions
+     set kept
+     Pattern contractionRegex
+
+Functions:
+    Turn.__init__
+    Normaliser.__init__
+    Normaliser.normalise
+    Normaliser.expand
+    Normaliser.expandMatch
+    Normaliser.splitWords
+
+'''
+
+import re
+import string
+
+# translation table that removes punctuation
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+# translation table that turns typographic apostrophes and quotes into plain ones
+APOSTROPHE_TABLE = str.maketrans({"’": "'", "‘": "'", "ʼ": "'"})
+
+# contractions that are expanded by default. Eliza leaves out any that its script uses itself (see Eliza.setNormaliser)
+CONTRACTIONS = {
+    "i'm": "i am", "you're": "you are", "we're": "we are", "they're": "they are",
+    "it's": "it is", "that's": "that is", "there's": "there is", "he's": "he is", "she's": "she is",
+    "what's": "what is", "who's": "who is", "where's": "where is", "when's": "when is", "how's": "how is",
+    "isn't": "is not", "aren't": "are not", "wasn't": "was not", "weren't": "were not",
+    "doesn't": "does not", "didn't": "did not", "haven't": "have not", "hasn't": "has not",
+    "couldn't": "could not", "wouldn't": "would not", "shouldn't": "should not",
+}
+
+
+class Turn:
+
+    __slots__ = ("text", "stripped", "lower", "words", "budget", "limit", "fixes")
+
+    # constructor
+    def __init__(self, text, stripped, lower, words):
+        self.text = text
+        self.stripped = stripped
+        self.lower = lower
+        self.words = words
+        self.budget = None
+        self.limit = None
+        self.fixes = ()
+
+
+class Normaliser:
+
+    # constructor, contractions maps each (lower case) contraction to what it is expanded to. The contractions in kept
+    # are left as typed, they are matched exactly (so "I'm" can be kept while "i'm" is expanded)
+    def __init__(self, contractions, kept=frozenset()):
+        self.contractions = contractions
+        self.kept = kept
+        self.contractionRegex = None
+        if len(contractions) != 0:
+            # longest first so a contraction is never cut short by another one that starts the same way
+            alternatives = sorted(contractions, key=len, reverse=True)
+            self.contractionRegex = re.compile(r"(?<![\w'])(" + "|".join(re.escape(c) for c in alternatives) +
+                                               r")(?![\w'])", re.IGNORECASE)
+
+    # Returns the Turn for a user statement
+    def normalise(self, statement):
+        text = self.expand(statement.split(".")[0])
+        lower = text.lower()
+        return Turn(text, text.rstrip(".!"), lower, self.splitWords(lower))
+
+    # makes apostrophes plain and expands the contractions in text. An expansion starts with a capital if its
+    # contraction does, so "It's raining" still matches a pattern like It is (.*)
+    def expand(self, text):
+        text = text.translate(APOSTROPHE_TABLE)
+        if self.contractionRegex is not None and "'" in text:
+            text = self.contractionRegex.sub(self.expandMatch, text)
+        return text
+
+    # Returns the expansion of the contraction matched, with the case of its first letter, or the contraction if it is
+    # kept as typed
+    def expandMatch(self, match):
+        contraction = match.group()
+        if contraction in self.kept:
+            return contraction
+        expansion = self.contractions[contraction.lower()]
+        if contraction[0].isupper():
+            return expansion[0].upper() + expansion[1:]
+        return expansion
+
+    # removes punctuation, lower cases and splits text into a list of words on spaces
+    @staticmethod
+    def splitWords(text):
+        return text.translate(PUNCTUATION_TABLE).lower().split(" ")
@@ -0,0 +1,164 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+Runs Eliza over many recorded transcripts without any user interaction, for example
+    python batchEliza.py transcripts/*.txt -o responses.jsonl
+    find transcripts -name "*.txt" | python batchEliza.py --names - --workers 8
+    python batchEliza.py - < ElizaScript.txt
+A transcript is a file in the same format as ElizaScript.txt (one statement per line), or stdin for a name of "-",
+and is one conversation, it stops at "quit" just like runEliza. --names gives a file (or "-" for stdin) with more
+transcript file names, one per line. Transcripts are spread over a pool of processes (one Eliza per process, one
+Session per transcript) and their statements are streamed from the files, so any number of transcripts can be
+replayed. Every turn is written as one line of JSON:
+    {"transcript": "a.txt", "turn": 0, "statement": "...", "response": "...", "keyword": "sad"}
+keyword is null when the response came from memory or psychobable. Lines are written in the order of the
+transcripts given, whatever order the processes finish them in. Each transcript's session is seeded by its file name,
+so with "--selector random --seed N" replaying the same transcripts always writes the same output.
+
+Functions:
+    initWorker
+    replayTranscript
+    replayTurns
+    readStdin
+    readTranscriptNames
+    readNames
+    replayAll
+    replayGroups
+    main
+'''
+
+import argparse
+import functools
+import itertools
+import json
+import os
+import sys
+import zlib
+from multiprocessing import Pool
+
+from Eliza import Eliza
+from ScriptLoader import loadScript
+from Selector import SELECTORS
+from runEliza import reflections, psychobabble, readFile
+
+eliza = None  # the Eliza of this process, built once by initWorker
+
+
+# builds the Eliza used by every transcript this process replays, from a script file if scriptPath is given
+# (with cacheDir every process after the first reads the compiled script instead of compiling it again).
+# selector and seed replace the script's response selector
+def initWorker(scriptPath=None, cacheDir=None, selector=None, seed=0):
+    global eliza
+    if scriptPath is None:
+        eliza = Eliza(reflections, psychobabble)
+    else:
+        eliza = loadScript(scriptPath, cacheDir)
+    if selector is not None:
+        eliza.setSelector(selector, seed)
+
+
+# replays one transcript file in a new session and returns its turns as JSON lines
+def replayTranscript(filename):
+    return "".join(replayTurns(filename, readFile(filename)))
+
+
+# yields the turns of a transcript called filename, with statements, as JSON lines while they are answered, in a new
+# session of this process's Eliza. The session is seeded by the file name so a random selector gives the same
+# responses whichever process replays it
+def replayTurns(filename, statements):
+    session = eliza.newSession(zlib.crc32(filename.encode("utf-8")))
+    turn = 0
+    for statement in statements:
+        response, keyName = eliza.analyzeTurn(statement, session)
+        yield json.dumps({"transcript": filename, "turn": turn, "statement": statement, "response": response,
+                          "keyword": keyName}) + "\n"
+        turn += 1
+        if statement == "quit":
+            break
+
+
+# yields the statements of the transcript on stdin as they are read, like runEliza.readFile
+def readStdin():
+    for line in sys.stdin:
+        line = line.strip(' \t\n\r')
+        if line != "":
+            yield line
+
+
+# yields the transcript file names, then the ones in namesFile (one per line, "-" to read them from stdin).
+# A name of "-" is the transcript on stdin
+def readTranscriptNames(names, namesFile=None):
+    yield from names
+    if namesFile == "-":
+        yield from readNames(sys.stdin)
+    elif namesFile is not None:
+        with open(namesFile) as fo:
+            yield from readNames(fo)
+
+
+# yields every line of fo that is not empty
+def readNames(fo):
+    for line in fo:
+        line = line.strip()
+        if line != "":
+            yield line
+
+
+# replays every transcript in filenames on workers processes and writes the turns to out. The transcript on stdin
+# ("-") can only be read by this process, so it is replayed here and its turns are written as they are answered,
+# the turns of the others once their whole transcript is replayed
+def replayAll(filenames, out, workers, scriptPath=None, cacheDir=None, selector=None, seed=0):
+    if workers == 1:  # no need for a pool of processes
+        initWorker(scriptPath, cacheDir, selector, seed)
+        replayGroups(filenames, out, map, ())
+        return
+    if scriptPath is not None:
+        loadScript(scriptPath, cacheDir)  # check the script (and compile it into the cache) before starting workers
+    with Pool(workers, initializer=initWorker, initargs=(scriptPath, cacheDir, selector, seed)) as pool:
+        # imap keeps the results in order and only pulls as many file names as the workers need
+        replayGroups(filenames, out, functools.partial(pool.imap, chunksize=16),
+                     (scriptPath, cacheDir, selector, seed))
+
+
+# replays filenames in order, each run of files with replay (map or a pool's imap) and the transcript on stdin in
+# this process (its Eliza is built with initArguments the first time), and writes the turns to out
+def replayGroups(filenames, out, replay, initArguments):
+    for fromStdin, group in itertools.groupby(filenames, lambda filename: filename == "-"):
+        if not fromStdin:
+            for lines in replay(replayTranscript, group):
+                out.write(lines)
+            continue
+        if eliza is None:
+            initWorker(*initArguments)
+        for filename in group:
+            for line in replayTurns(filename, readStdin()):
+                out.write(line)
+                out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay transcripts through Eliza and write the turns as JSON lines.")
+    parser.add_argument("transcripts", nargs="*", help="transcript files, - to read a transcript from stdin")
+    parser.add_argument("--names", help="file with more transcript file names (one per line), - for stdin")
+    parser.add_argument("-o", "--output", help="file to write to instead of stdout")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of processes")
+    parser.add_argument("--script", help="script file to use instead of the built-in script")
+    parser.add_argument("--cache-dir", help="where compiled script files are cached")
+    parser.add_argument("--selector", choices=SELECTORS, help="how responses are picked, instead of the script's")
+    parser.add_argument("--seed", type=int, default=0, help="seed of --selector random")
+    args = parser.parse_args()
+    if len(args.transcripts) == 0 and args.names is None:
+        parser.error("no transcripts given")
+    if args.names == "-" and "-" in args.transcripts:
+        parser.error("stdin can't hold both a transcript and transcript names")
+    filenames = readTranscriptNames(args.transcripts, args.names)
+    if args.output is None:
+        replayAll(filenames, sys.stdout, args.workers, args.script, args.cache_dir, args.selector, args.seed)
+    else:
+        with open(args.output, "w", buffering=1 << 20) as out:
+            replayAll(filenames, out, args.workers, args.script, args.cache_dir, args.selector, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+Benchmarks for Eliza. Run "python benchmark.py" to print the results, or
+    python benchmark.py --json results.json --compare previous.json
+to also save them as JSON and compare them with a previous run.
+
+Every benchmark is run on the real script and on synthetic scripts with more Keywords (see SyntheticEliza) so it
+shows how the cost of a turn grows with the size of the script. The statements come from generateStatements,
+which mixes the kinds of turns Eliza sees:
+    keyword      a Keyword's name inside the statement
+    synonym      one of a Keyword's synonyms inside the statement
+    goto         a statement that starts with a Keyword whose responses go to another Keyword
+    fallthrough  a statement with no Keyword in it, answered from psychobable
+The turns are run with the match cache off, so every statement is matched each time it is seen and the numbers
+measure matching, not the cache. The cache only helps when statements repeat, so it is measured on a second
+workload from repeatStatements, where a few statements are said far more often than the rest like real users do:
+"repeated" runs it with the cache off and "cached" with the cache on (starting empty), with the cache's hit rate.
+
+Functions:
+    SyntheticEliza
+    generateStatements
+    repeatStatements
+    fillerWords
+    percentile
+    benchTurns
+    benchSessions
+    runAll
+    compareResults
+    printResults
+    main
+'''
+
+import argparse
+import json
+import random
+import re
+import time
+import tracemalloc
+
+from Eliza import Eliza
+from Keyword import Keyword
+from runEliza import reflections, psychobabble
+
+KINDS = ["keyword", "synonym", "goto", "fallthrough"]
+
+
+# An Eliza with numKeys Keywords: the real ones plus made up ones, so benchmarks can see how a turn scales with
+# the size of the script. The made up Keywords look like the real ones (a regular expression with a required
+# word, a catch-all, some synonyms) and have random ranks so they are mixed in with the real Keywords
+class SyntheticEliza(Eliza):
+
+    def __init__(self, refl, psychob, numKeys, seed=0):
+        self.numKeys = numKeys
+        self.seed = seed
+        super().__init__(refl, psychob)
+
+    def setKeys(self):
+        super().setKeys()
+        rand = random.Random(self.seed)
+        for i in range(len(self.keys), self.numKeys):
+            name = "kw" + str(i)
+            aKey = Keyword(name, rand.randint(-1, 10), r'(.*)' + name + r' (.*)',
+                           ["Tell me more about {1}.", "Why do you mention {1}?", "goto what"],
+                           r'(.*)', ["Go on about " + name + ".", "What does " + name + " mean to you?"])
+            aKey.addSynonyms([name + "syn" + str(j) for j in range(3)])
+            self.keys.append(aKey)
+        self.keys.sort(key=lambda x: x.rank, reverse=True)
+
+
+# words that are not the name or a synonym of any of eliza's Keywords
+def fillerWords(eliza):
+    candidates = ["the", "weather", "today", "some", "people", "think", "about", "things", "nothing", "really",
+                  "matters", "a", "lot", "of", "work", "at", "home", "in", "town", "we", "they", "go", "see", "it"]
+    return [aWord for aWord in candidates if len(eliza.keyIndex.scan([aWord])) == 0]
+
+
+# Returns count statements for eliza, an even mix of the KINDS of turns, and the same ones for the same seed
+def generateStatements(eliza, count, seed=0):
+    rand = random.Random(seed)
+    filler = fillerWords(eliza)
+    names = [aKey.name for aKey in eliza.keys if " " not in aKey.name]
+    synonyms = [synonym for aKey in eliza.keys for synonym in aKey.synonyms]
+    gotoNames = [aKey.name for aKey in eliza.keys
+                 if any(response.startswith("goto ") for responses in aKey.reasmbLis for response in responses)]
+    # the literal start of the psychobable patterns, e.g. "Is it" from "Is it (.*)"
+    openings = []
+    for pattern, responses in eliza.psychobabble:
+        opening = re.match(r"[A-Za-z ]*", pattern).group().strip()
+        if opening != "" and len(eliza.keyIndex.scan(eliza.getWords(opening))) == 0:
+            openings.append(opening)
+    statements = []
+    for i in range(count):
+        kind = KINDS[i % len(KINDS)]
+        words = rand.sample(filler, 3)
+        if kind == "keyword":
+            statement = " ".join(words[:2]) + " " + rand.choice(names) + " " + words[2]
+        elif kind == "synonym":
+            statement = "i " + words[0] + " " + rand.choice(synonyms) + " " + " ".join(words[1:])
+        elif kind == "goto":
+            statement = rand.choice(gotoNames) + " " + " ".join(words)
+        else:
+            statement = rand.choice(openings) + " " + " ".join(words)
+        statements.append(statement)
+    return statements
+
+
+# Returns count statements drawn from the first distinct of statements, the i-th of them weighted 1 / (i + 1) so a few
+# are repeated far more than the rest, and the same ones for the same seed
+def repeatStatements(statements, count, distinct, seed=0):
+    pool = statements[:distinct]
+    weights = [1 / (i + 1) for i in range(len(pool))]
+    return random.Random(seed).choices(pool, weights, k=count)
+
+
+# the p-th percentile (0 to 100) of a sorted list
+def percentile(sortedValues, p):
+    index = min(len(sortedValues) - 1, int(round(p / 100 * (len(sortedValues) - 1))))
+    return sortedValues[index]
+
+
+# Runs statements through eliza in one session and returns the throughput and latency of a turn
+def benchTurns(eliza, statements):
+    session = eliza.newSession()
+    latencies = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for statement in statements:
+        turnStart = clock()
+        eliza.analyze(statement, session)
+        latencies.append(clock() - turnStart)
+    elapsed = (clock() - start) / 1e9
+    latencies.sort()
+    return {"turns": len(statements),
+            "turnsPerSecond": len(statements) / elapsed,
+            "p50Microseconds": percentile(latencies, 50) / 1e3,
+            "p99Microseconds": percentile(latencies, 99) / 1e3,
+            "maxMicroseconds": latencies[-1] / 1e3}
+
+
+# Creates count sessions for eliza and returns how long one took to create (in microseconds)
+# and how much memory one takes (in bytes)
+def benchSessions(eliza, count=10000):
+    start = time.perf_counter()
+    sessions = [eliza.newSession() for i in range(count)]
+    elapsed = time.perf_counter() - start
+    del sessions
+    # measure memory separately because tracing slows down the allocations
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = [eliza.newSession() for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    listBytes = sessions.__sizeof__()  # the list holding the sessions is not part of a session
+    return {"sessions": count,
+            "microsecondsPerSession": elapsed / count * 1e6,
+            "bytesPerSession": (after - before - listBytes) / count}
+
+
+# Runs every benchmark for each script size and returns the results, keyed by "<number of keywords> keywords"
+def runAll(scriptSizes, numTurns, seed=0):
+    results = {}
+    for numKeys in scriptSizes:
+        start = time.perf_counter()
+        if numKeys is None:
+            eliza = Eliza(reflections, psychobabble)
+        else:
+            eliza = SyntheticEliza(reflections, psychobabble, numKeys, seed)
+        result = {"scriptMilliseconds": (time.perf_counter() - start) * 1e3}
+        statements = generateStatements(eliza, numTurns, seed)
+        eliza.setMatchCache(0)  # otherwise the runs after the first would mostly be cache hits
+        result["all"] = benchTurns(eliza, statements)
+        for kind in KINDS:
+            result[kind] = benchTurns(eliza, statements[KINDS.index(kind)::len(KINDS)])
+        repeated = repeatStatements(statements, numTurns, max(1, numTurns // 20), seed)
+        result["repeated"] = benchTurns(eliza, repeated)
+        eliza.setMatchCache()
+        result["cached"] = benchTurns(eliza, repeated)
+        cache = eliza.matchCache.stats()
+        result["cached"]["hitRate"] = cache["hits"] / max(1, cache["hits"] + cache["misses"])
+        result.update(benchSessions(eliza))
+        results[str(len(eliza.keys)) + " keywords"] = result
+    return results
+
+
+# Returns the ratio new / old of every number in the results that are in both
+def compareResults(old, new):
+    ratios = {}
+    for name in new:
+        if isinstance(new[name], dict) and isinstance(old.get(name), dict):
+            inner = compareResults(old[name], new[name])
+            if len(inner) != 0:
+                ratios[name] = inner
+        elif isinstance(new[name], (int, float)) and isinstance(old.get(name), (int, float)) and old[name] != 0:
+            ratios[name] = new[name] / old[name]
+    return ratios
+
+
+def printResults(results):
+    for scriptName, result in results.items():
+        print(scriptName + ": script construction %.1f ms, session construction %.2f us, %.0f bytes per session" %
+              (result["scriptMilliseconds"], result["microsecondsPerSession"], result["bytesPerSession"]))
+        for kind in ["all"] + KINDS + ["repeated", "cached"]:
+            turns = result.get(kind)
+            if turns is None:  # results saved before there were repeated and cached runs
+                continue
+            label = {"repeated": "repeated, no cache", "cached": "repeated, cached"}.get(kind, kind)
+            line = "    %-20s %9.0f turns/s   p50 %7.1f us   p99 %7.1f us" % \
+                   (label, turns["turnsPerSecond"], turns["p50Microseconds"], turns["p99Microseconds"])
+            if "hitRate" in turns:
+                line += "   hit rate %5.1f%%" % (turns["hitRate"] * 100)
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Eliza.")
+    parser.add_argument("--turns", type=int, default=20000, help="statements per script size")
+    parser.add_argument("--sizes", default="1000,10000", help="comma separated numbers of keywords to scale to")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--compare", help="print the ratio of these results to the ones in this file")
+    args = parser.parse_args()
+    scriptSizes = [None] + [int(size) for size in args.sizes.split(",") if size != ""]
+    results = runAll(scriptSizes, args.turns, args.seed)
+    printResults(results)
+    if args.json is not None:
+        with open(args.json, "w") as fo:
+            json.dump(results, fo, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as fo:
+            print(json.dumps(compareResults(json.load(fo), results), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+Replays recorded conversations as many simulated users at once, to see how Eliza holds up when conversations
+interleave before a change is rolled out. For example
+    python loadReplay.py transcripts/*.txt --users 2000 --concurrency 200 --arrival-rate 100 --think-time 0.5
+Transcripts are files in the same format as "ElizaScript.txt" (one statement per line) or JSON lines with a
+"statement" and a "session" or "transcript" (the output of batchEliza.py, or requests logged by ElizaServer.py),
+in which case every session in the file is its own transcript. User i replays transcript i (starting again from
+the first once every transcript has been used).
+
+Users arrive at --arrival-rate users a second (Poisson arrivals, all at once if it is 0) and at most --concurrency
+of them are in a conversation at the same time, later arrivals wait for one to finish. Each user waits a random
+think time (exponentially distributed with a mean of --think-time seconds) before each of their statements.
+The target is
+    engine   the Eliza in this process, exactly like a server answering the users one turn at a time
+    server   an ElizaServer started in this process on a Unix socket, so the protocol is included
+    remote   a server that is already running, at --unix or --host and --port
+The engine options (--script, --match-cache, --fuzzy, ...) are the same as ElizaServer.py's.
+
+The report has the throughput achieved, the latency percentiles of a turn and the errors (exceptions, error
+responses and lost connections, by kind) for the whole run and for every --interval seconds of it, so it shows
+whether latency grows as the load builds up.
+
+Functions:
+    EngineTarget
+    ServerTarget
+    ReplyError
+    Recorder
+    readTranscripts
+    runLoad
+    replayUser
+    startTarget
+    printReport
+    replay
+    main
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmark import percentile
+from ElizaServer import ElizaServer, addArguments, buildEliza
+from runEliza import readFile
+
+clock = time.perf_counter_ns
+
+
+# raised when a server answers a statement with an error
+class ReplyError(Exception):
+    pass
+
+
+# The Eliza in this process as a target, each user gets their own Session
+class EngineTarget:
+
+    def __init__(self, eliza):
+        self.eliza = eliza
+
+    # Returns a function that answers the statements of a new user
+    async def open(self, name):
+        session = self.eliza.newSession()
+
+        async def ask(statement):
+            return self.eliza.analyze(statement, session)
+        return ask, None
+
+    async def close(self):
+        pass
+
+
+# A server as a target, each user has their own connection and session id
+class ServerTarget:
+
+    # a Unix socket at path or else host and port. server is the ElizaServer listening on path in this process (if
+    # any), close shuts it down
+    def __init__(self, path=None, host="127.0.0.1", port=5000, server=None):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.server = server
+
+    # Returns a function that answers the statements of a new user and the writer of their connection
+    async def open(self, name):
+        if self.path is not None:
+            reader, writer = await asyncio.open_unix_connection(self.path)
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+
+        async def ask(statement):
+            writer.write(json.dumps({"session": name, "statement": statement}).encode("utf-8") + b"\n")
+            await writer.drain()
+            line = await reader.readline()
+            if not line:
+                raise ConnectionResetError("the server closed the connection")
+            reply = json.loads(line)
+            if "error" in reply:
+                raise ReplyError(reply["error"])
+            return reply["response"]
+        return ask, writer
+
+    async def close(self):
+        if self.server is not None:
+            await self.server.shutdown()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rmdir(os.path.dirname(self.path))
+
+
+# Collects the latency of every turn and every error, by the time since the start of the run
+class Recorder:
+
+    def __init__(self, interval):
+        self.interval = interval  # seconds covered by each line of the report over time
+        self.start = clock()
+        self.turns = []  # (seconds since start, latency in nanoseconds)
+        self.errors = []  # (seconds since start, kind of error)
+        self.users = 0
+
+    def turn(self, turnStart, latency):
+        self.turns.append(((turnStart - self.start) / 1e9, latency))
+
+    def error(self, turnStart, kind):
+        self.errors.append(((turnStart - self.start) / 1e9, kind))
+
+    # Returns the summary of turns and errors, recorded over a span of seconds
+    @staticmethod
+    def summarise(turns, errors, seconds):
+        latencies = sorted(latency for at, latency in turns)
+        summary = {"turns": len(latencies), "turnsPerSecond": len(latencies) / seconds if seconds > 0 else 0.0,
+                   "errors": len(errors)}
+        if len(latencies) != 0:
+            summary.update({"p50Milliseconds": percentile(latencies, 50) / 1e6,
+                            "p90Milliseconds": percentile(latencies, 90) / 1e6,
+                            "p99Milliseconds": percentile(latencies, 99) / 1e6,
+                            "maxMilliseconds": latencies[-1] / 1e6})
+        return summary
+
+    # Returns the report: the summary of the whole run, the errors by kind and a summary of every interval
+    def report(self):
+        seconds = (clock() - self.start) / 1e9
+        result = self.summarise(self.turns, self.errors, seconds)
+        result["seconds"] = seconds
+        result["users"] = self.users
+        kinds = {}
+        for at, kind in self.errors:
+            kinds[kind] = kinds.get(kind, 0) + 1
+        result["errorKinds"] = kinds
+        intervals = []
+        numIntervals = int(seconds // self.interval) + 1
+        turns = [[] for i in range(numIntervals)]
+        errors = [[] for i in range(numIntervals)]
+        for entry in self.turns:
+            turns[min(numIntervals - 1, int(entry[0] // self.interval))].append(entry)
+        for entry in self.errors:
+            errors[min(numIntervals - 1, int(entry[0] // self.interval))].append(entry)
+        for i in range(numIntervals):
+            length = min(self.interval, seconds - i * self.interval)
+            summary = self.summarise(turns[i], errors[i], length)
+            summary["start"] = i * self.interval
+            intervals.append(summary)
+        result["intervals"] = intervals
+        return result
+
+
+# Returns the transcripts in the files at paths as a list of (name, statements)
+def readTranscripts(paths):
+    transcripts = []
+    for path in paths:
+        if not path.endswith(".jsonl"):
+            transcripts.append((path, list(readFile(path))))
+            continue
+        sessions = {}  # session or transcript -> its statements, in the order they first appear
+        with open(path) as fo:
+            for line in fo:
+                if line.strip() == "":
+                    continue
+                entry = json.loads(line)
+                if isinstance(entry, dict) and isinstance(entry.get("statement"), str):
+                    name = str(entry.get("session", entry.get("transcript", "")))
+                    sessions.setdefault(name, []).append(entry["statement"])
+        for name, statements in sessions.items():
+            transcripts.append((path + ":" + name, statements))
+    return [transcript for transcript in transcripts if len(transcript[1]) != 0]
+
+
+# Replays transcripts on target as numUsers users (see the top of this file) and returns the Recorder of the run
+async def runLoad(target, transcripts, numUsers, concurrency, arrivalRate=0.0, thinkTime=0.0, interval=1.0,
+                  seed=0):
+    rand = random.Random(seed)
+    recorder = Recorder(interval)
+    slots = asyncio.Semaphore(concurrency)
+    users = []
+    for i in range(numUsers):
+        if arrivalRate > 0:
+            await asyncio.sleep(rand.expovariate(arrivalRate))
+        statements = transcripts[i % len(transcripts)][1]
+        # every user has their own generator so their think times do not depend on how the others are scheduled
+        users.append(asyncio.create_task(replayUser(target, "user" + str(i), statements, slots, recorder, thinkTime,
+                                                    random.Random(rand.getrandbits(64)))))
+    await asyncio.gather(*users)
+    return recorder
+
+
+# replays the statements of one user once there is a free slot for them, recording every turn in recorder
+async def replayUser(target, name, statements, slots, recorder, thinkTime, rand):
+    async with slots:
+        recorder.users += 1
+        try:
+            ask, writer = await target.open(name)
+        except OSError as error:
+            recorder.error(clock(), type(error).__name__)
+            return
+        try:
+            for statement in statements:
+                if thinkTime > 0:
+                    await asyncio.sleep(rand.expovariate(1 / thinkTime))
+                turnStart = clock()
+                try:
+                    await ask(statement)
+                except ReplyError as error:
+                    recorder.error(turnStart, "reply: " + str(error))
+                except (OSError, ValueError) as error:  # lost connections and replies that are not JSON
+                    recorder.error(turnStart, type(error).__name__)
+                    return
+                except Exception as error:  # a bug in Eliza, which is what a replay is meant to find
+                    recorder.error(turnStart, type(error).__name__)
+                else:
+                    recorder.turn(turnStart, clock() - turnStart)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+# Returns the target described by the options
+async def startTarget(args):
+    if args.target == "remote":
+        return ServerTarget(args.unix, args.host, args.port)
+    eliza = buildEliza(args)
+    if args.target == "engine":
+        return EngineTarget(eliza)
+    path = os.path.join(tempfile.mkdtemp(), "eliza.sock")
+    server = ElizaServer(eliza, idleTimeout=args.idle_timeout)
+    await server.start(path=path)
+    return ServerTarget(path, server=server)
+
+
+def printReport(result):
+    print("%d users, %d turns in %.1f s: %.0f turns/s, %d errors" %
+          (result["users"], result["turns"], result["seconds"], result["turnsPerSecond"], result["errors"]))
+    if result["turns"] != 0:
+        print("latency p50 %.3f ms   p90 %.3f ms   p99 %.3f ms   max %.3f ms" %
+              (result["p50Milliseconds"], result["p90Milliseconds"], result["p99Milliseconds"],
+               result["maxMilliseconds"]))
+    for kind, count in sorted(result["errorKinds"].items()):
+        print("    %6d  %s" % (count, kind))
+    print("%8s %8s %10s %10s %10s %10s %7s" % ("start s", "turns", "turns/s", "p50 ms", "p99 ms", "max ms", "errors"))
+    for interval in result["intervals"]:
+        if interval["turns"] == 0:
+            print("%8.1f %8d %10.0f %10s %10s %10s %7d" % (interval["start"], 0, 0, "-", "-", "-", interval["errors"]))
+        else:
+            print("%8.1f %8d %10.0f %10.3f %10.3f %10.3f %7d" %
+                  (interval["start"], interval["turns"], interval["turnsPerSecond"], interval["p50Milliseconds"],
+                   interval["p99Milliseconds"], interval["maxMilliseconds"], interval["errors"]))
+
+
+async def replay(args):
+    transcripts = readTranscripts(args.transcripts)
+    if len(transcripts) == 0:
+        sys.exit("no statements in the transcripts")
+    target = await startTarget(args)
+    try:
+        recorder = await runLoad(target, transcripts, args.users or len(transcripts), args.concurrency,
+                                 args.arrival_rate, args.think_time, args.interval, args.replay_seed)
+    finally:
+        await target.close()
+    return recorder.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay transcripts as many concurrent users and report the load.")
+    parser.add_argument("transcripts", nargs="+", help="transcript files, .jsonl files are read as JSON lines")
+    parser.add_argument("--target", choices=["engine", "server", "remote"], default="engine")
+    parser.add_argument("--users", type=int, help="users to simulate, one per transcript by default")
+    parser.add_argument("--concurrency", type=int, default=100, help="most users in a conversation at once")
+    parser.add_argument("--arrival-rate", type=float, default=0.0, help="users arriving a second, 0 for all at once")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds a user waits before a statement")
+    parser.add_argument("--replay-seed", type=int, default=0, help="seed of the arrivals and think times")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds covered by each line of the report")
+    parser.add_argument("--json", help="save the report to this file")
+    addArguments(parser)
+    args = parser.parse_args()
+    result = asyncio.run(replay(args))
+    printReport(result)
+    if args.json is not None:
+        with open(args.json, "w") as fo:
+            json.dump(result, fo, indent=2)
+
+
+if __name__ == "__main__":
+    main()
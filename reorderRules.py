@@ -0,0 +1,223 @@
+'''
+ELIZA Chatbot
+Lydia Noureldin
+
+Reorders the regular expressions of each Keyword, and the psychobabble patterns, so the ones that match most often
+are tried first, without changing which one answers any statement. For example
+    python reorderRules.py --script doctor.json transcripts/*.txt --metrics scraped.prom -o doctor.fast.json
+The hit counts come from replaying transcripts (in the format of loadReplay.py, with the match cache off so every
+statement is matched) and from the metrics of a running server (the Prometheus text of {"metrics": true}, as
+many files as wanted, their counts are added up).
+
+Patterns are tried in order and the first one that matches wins, so a pattern can only be moved ahead of another
+if no statement can match both (see PatternParser.canOverlap: their literal starts differ, like "I need (.*)" and
+"Why (.*)"). Among the patterns whose overlapping predecessors are all placed, the most hit one goes next, so the
+statements a pattern matches are still tried against the same patterns before it. When transcripts are given
+every distinct statement in them is matched with both orders as a check, and the tool fails if any winner differs.
+
+It also reports patterns that can never win because an earlier one matches everything they match (for example a
+(.*) catch-all, or "I (.*)" ahead of "I am (.*)") and, when there are hit counts, patterns that never matched.
+The reordered script has a new version, so a server it is loaded into (SIGHUP) carries its sessions over by
+pattern (see Eliza.migrateSession).
+
+Functions:
+    readMetrics
+    unescapeLabel
+    replayHits
+    orderPatterns
+    findShadowed
+    expectedEvaluations
+    reorderScript
+    winnerOf
+    checkWinners
+    printReport
+    main
+'''
+
+import argparse
+import json
+import re
+import sys
+
+from Eliza import Eliza
+from PatternParser import canOverlap, covers, parsePattern
+from ScriptLoader import ScriptError, compileScript, loadScript, scriptOf
+from loadReplay import readTranscripts
+from runEliza import reflections, psychobabble
+
+SAMPLE_REGEX = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+LABEL_REGEX = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+# Adds the pattern hits in a Prometheus text to hits: (keyword name, pattern index) -> hits for the Keyword regular
+# expressions and pattern -> hits for psychobabble
+def readMetrics(text, hits):
+    for line in text.splitlines():
+        match = SAMPLE_REGEX.match(line)
+        if match is None or match.group(1) not in ("eliza_pattern_hits_total", "eliza_psychobabble_hits_total"):
+            continue
+        labels = {name: unescapeLabel(value) for name, value in LABEL_REGEX.findall(match.group(2))}
+        amount = float(match.group(3))
+        if match.group(1) == "eliza_pattern_hits_total":
+            key = (labels.get("keyword"), int(labels.get("pattern", -1)))
+        else:
+            key = labels.get("pattern")
+        hits[key] = hits.get(key, 0) + amount
+
+
+# undoes the escaping of Metrics.formatLabels
+def unescapeLabel(value):
+    return re.sub(r'\\(.)', lambda match: "\n" if match.group(1) == "n" else match.group(1), value)
+
+
+# Replays transcripts through eliza (with metrics on and the match cache off) and adds the hits to hits like
+# readMetrics. Returns the number of statements replayed
+def replayHits(eliza, transcripts, hits):
+    eliza.setMatchCache(0)
+    metrics = eliza.enableMetrics()
+    numStatements = 0
+    for name, statements in transcripts:
+        session = eliza.newSession()
+        for statement in statements:
+            eliza.analyze(statement, session)
+            numStatements += 1
+    readMetrics(metrics.toPrometheus(), hits)
+    eliza.disableMetrics()
+    return numStatements
+
+
+# Returns the order (a list of indexes) to try patterns in: the most hit pattern first, but never ahead of an
+# earlier pattern it can overlap with. hits[i] is how often patterns[i] matched
+def orderPatterns(patterns, hits):
+    parsed = [parsePattern(pattern) for pattern in patterns]
+    # before[j] is the set of earlier patterns that j has to stay behind
+    before = [{i for i in range(j) if canOverlap(parsed[i], parsed[j])} for j in range(len(patterns))]
+    order = []
+    placed = set()
+    while len(order) != len(patterns):
+        ready = [j for j in range(len(patterns)) if j not in placed and before[j] <= placed]
+        # ready is never empty because the first unplaced pattern only waits for earlier (placed) ones
+        best = max(ready, key=lambda j: (hits[j], -j))
+        order.append(best)
+        placed.add(best)
+    return order
+
+
+# Returns (index of the pattern, index of the earlier pattern that leaves it nothing) for every pattern that can
+# never win
+def findShadowed(patterns):
+    parsed = [parsePattern(pattern) for pattern in patterns]
+    shadowed = []
+    for j in range(len(patterns)):
+        for i in range(j):
+            if patterns[i] == patterns[j] or covers(parsed[i], parsed[j]):
+                shadowed.append((j, i))
+                break
+    return shadowed
+
+
+# the number of patterns tried for the statements that matched one, if patterns are tried in order
+def expectedEvaluations(order, hits):
+    return sum(hits[order[position]] * (position + 1) for position in range(len(order)))
+
+
+# Returns the script (see ScriptLoader.scriptOf) of eliza with its patterns reordered by hits, and the report: a list
+# of (where, old order of patterns, new order, evaluations before, evaluations after, shadowed, never hit)
+def reorderScript(eliza, hits, haveHits):
+    script = scriptOf(eliza)
+    report = []
+    lists = [(keyword["name"], keyword["rules"], [rule["decomp"] for rule in keyword["rules"]],
+              [hits.get((keyword["name"], i), 0) for i in range(len(keyword["rules"]))])
+             for keyword in script["keywords"]]
+    lists.append((None, script["psychobabble"], [entry["pattern"] for entry in script["psychobabble"]],
+                  [hits.get(entry["pattern"], 0) for entry in script["psychobabble"]]))
+    for where, entries, patterns, counts in lists:
+        order = orderPatterns(patterns, counts)
+        entries[:] = [entries[i] for i in order]
+        cold = [i for i in range(len(patterns)) if counts[i] == 0] if haveHits else []
+        report.append((where, patterns, order, expectedEvaluations(range(len(patterns)), counts),
+                       expectedEvaluations(order, counts), findShadowed(patterns), cold))
+    return script, report
+
+
+# Returns what answers statement in eliza: ("keyword", name, regular expression, groups), ("psychobabble",
+# pattern, groups) or None, without changing any session
+def winnerOf(eliza, statement):
+    turn = eliza.prepareTurn(statement)
+    plan = eliza.getHighestRank(turn)
+    if plan is not None:
+        keyIndex, patternIndex, groups = plan
+        return ("keyword", eliza.keys[keyIndex].name, eliza.keys[keyIndex].regexLis[patternIndex], groups)
+    match = eliza.psychobabbleRegex.match(turn.stripped)
+    if match is None:
+        return None
+    patternIndex, firstGroup, endGroup = eliza.psychobabbleGroups[match.lastindex]
+    return ("psychobabble", eliza.psychobabble[patternIndex][0], match.groups()[firstGroup - 1:endGroup - 1])
+
+
+# Returns the distinct statements of transcripts that old and new answer with different patterns
+def checkWinners(old, new, transcripts):
+    different = []
+    seen = set()
+    for name, statements in transcripts:
+        for statement in statements:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            if winnerOf(old, statement) != winnerOf(new, statement):
+                different.append(statement)
+    return different
+
+
+def printReport(report, total):
+    for where, patterns, order, evaluationsBefore, evaluationsAfter, shadowed, cold in report:
+        name = "psychobabble" if where is None else "keyword " + repr(where)
+        if order != list(range(len(patterns))):
+            saving = 0 if evaluationsBefore == 0 else 100 * (1 - evaluationsAfter / evaluationsBefore)
+            print("%s: %d -> %d pattern evaluations for the matched statements (%.0f%% fewer)" %
+                  (name, evaluationsBefore, evaluationsAfter, saving))
+            for position in range(len(order)):
+                print("    %2d (was %2d)  %s" % (position, order[position], patterns[order[position]]))
+        for j, i in shadowed:
+            print("%s: %r can never win, %r is tried first and matches everything it does" %
+                  (name, patterns[j], patterns[i]))
+        if len(cold) != 0:
+            print("%s: never matched: %s" % (name, ", ".join(repr(patterns[i]) for i in cold)))
+    print("%.0f%% fewer pattern evaluations for the statements that matched one" % total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reorder the patterns of a script by how often they match.")
+    parser.add_argument("transcripts", nargs="*", help="transcripts to count hits in and check the new order with")
+    parser.add_argument("--script", help="script file to use instead of the built-in script")
+    parser.add_argument("--metrics", action="append", default=[], help="a Prometheus text of a server's metrics")
+    parser.add_argument("-o", "--output", help="write the reordered script to this file")
+    args = parser.parse_args()
+    try:
+        eliza = Eliza(reflections, psychobabble) if args.script is None else loadScript(args.script)
+    except ScriptError as error:
+        sys.exit(str(error))
+    transcripts = readTranscripts(args.transcripts)
+    hits = {}
+    for path in args.metrics:
+        with open(path) as fo:
+            readMetrics(fo.read(), hits)
+    replayHits(eliza, transcripts, hits)
+    script, report = reorderScript(eliza, hits, len(args.metrics) != 0 or len(transcripts) != 0)
+    before = sum(entry[3] for entry in report)
+    after = sum(entry[4] for entry in report)
+    printReport(report, 0 if before == 0 else 100 * (1 - after / before))
+    reordered = compileScript(json.dumps(script))
+    if len(transcripts) != 0:
+        different = checkWinners(eliza, reordered, transcripts)
+        if len(different) != 0:
+            sys.exit("the new order changes the winner of: " + "; ".join(repr(s) for s in different[:10]))
+        print("checked: every statement in the transcripts is answered by the same pattern")
+    if args.output is not None:
+        with open(args.output, "w") as fo:
+            json.dump(script, fo, indent=2)
+            fo.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -229,27 +229,22 @@ psychobabble = [
         ]
 
 # filename is the script to be processed by Eliza
-# scriptList is a list of lines from the input file excluding all empty lines
+# yields the lines from the input file excluding all empty lines, one at a time so the file is never all in memory
 def readFile(filename):
-    fo = open(filename)
-    scriptList = []
-    for line in fo:
-        # strip any space, \t, \n, or \r characters from both sides of the string
-        line = line.strip(' \t\n\r')
-        if line != "":  # remove empty lines
-            scriptList.append(line)
-    fo.close()
-    return scriptList
+    with open(filename) as fo:
+        for line in fo:
+            # strip any space, \t, \n, or \r characters from both sides of the string
+            line = line.strip(' \t\n\r')
+            if line != "":  # remove empty lines
+                yield line
 
 def main():
     filename = input("Please enter the filename: ")
-    userInput = readFile(filename)  # read input file
     print("Hello. How are you feeling today?")
     # create Eliza object
     elly = Eliza(reflections, psychobabble)
     # first go through the script
-    for i in range(len(userInput)):
-        statement = userInput[i]  # current user statement
+    for statement in readFile(filename):  # current user statement
         print(statement)  # print users statement
         response = elly.analyze(statement)
         print(response) # print Eliza's statement
@@ -262,5 +257,5 @@ def main():
         if statement == "quit":
             break
 
-main()
-
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+'''
+Tests of answering turns in batches (see Eliza.analyzeMany): the same responses as one turn at a time, and the same
+metrics and profile stages.
+'''
+
+import unittest
+
+from Eliza import Eliza
+from ElizaServer import ElizaServer
+from Metrics import Metrics
+from runEliza import reflections, psychobabble
+
+PAIRS = [("a", "i am sad"), ("b", "i am sad"), ("a", "i am sad"), ("c", "my mother hates me"), ("b", "hello"),
+         ("c", "I remember my computr"), ("a", "is it raining"), ("d", "why don't you help me"), ("b", "i am sad")]
+
+
+class AnalyzeManyTest(unittest.TestCase):
+
+    # what analyzeTurn gives for pairs, one at a time with a session for each id
+    @staticmethod
+    def oneAtATime(eliza, pairs):
+        sessions = {}
+        return [eliza.analyzeTurn(statement, sessions.setdefault(sessionId, eliza.newSession()))
+                for sessionId, statement in pairs]
+
+    def testSameAsOneAtATime(self):
+        for fuzzy in (0, 2):
+            eliza = Eliza(reflections, psychobabble)
+            eliza.setFuzzyMatching(fuzzy)
+            other = Eliza(reflections, psychobabble)
+            other.setFuzzyMatching(fuzzy)
+            self.assertEqual(eliza.analyzeMany(PAIRS, {}), self.oneAtATime(other, PAIRS))
+
+    def testMetrics(self):
+        eliza = Eliza(reflections, psychobabble)
+        metrics = Metrics()
+        eliza.enableMetrics(metrics)
+        eliza.analyzeMany(PAIRS, {})
+        distinct = len(set(statement for sessionId, statement in PAIRS))
+        self.assertEqual(metrics.counters["eliza_batches_total"][()], 1)
+        self.assertEqual(sum(metrics.counters["eliza_turns_total"].values()), len(PAIRS))
+        self.assertEqual(metrics.histograms["turn"][2], len(PAIRS))
+        self.assertEqual(metrics.histograms["tokenise"][2], distinct)
+        self.assertEqual(metrics.histograms["batch"][2], 1)
+        self.assertLessEqual(metrics.histograms["turn"][1], metrics.histograms["batch"][1])
+        # the counters of a batch are those of the same turns one at a time
+        single = Metrics()
+        other = Eliza(reflections, psychobabble)
+        other.enableMetrics(single)
+        self.oneAtATime(other, PAIRS)
+        for name in ("eliza_turns_total", "eliza_keyword_hits_total", "eliza_memory_total"):
+            self.assertEqual(metrics.counters[name], single.counters[name])
+
+    def testProfileKeepsBatchTogether(self):
+        eliza = Eliza(reflections, psychobabble)
+        eliza.setMatchCache(0)
+        profiler = eliza.startProfile()
+        eliza.analyzeMany(PAIRS, {})
+        eliza.stopProfile()
+        roots = set(stack.split(";")[0] for stack in profiler.stacks)
+        self.assertEqual(roots, {"analyzeMany"})
+        self.assertIn("analyzeMany;tokenise", profiler.stacks)
+        self.assertIn("analyzeMany;scan", profiler.stacks)
+        self.assertEqual(profiler.turns, len(PAIRS))
+
+    def testServerBatchMetrics(self):
+        eliza = Eliza(reflections, psychobabble)
+        metrics = Metrics()
+        eliza.enableMetrics(metrics)
+        server = ElizaServer(eliza)
+        requests = [{"session": sessionId, "statement": statement} for sessionId, statement in PAIRS]
+        responses = server.handleMessages(requests + [{"metrics": True}])
+        text = responses[-1]["metrics"]
+        self.assertIn('eliza_stage_seconds_count{stage="turn"} ' + str(len(PAIRS)), text)
+        self.assertIn('eliza_stage_seconds_count{stage="tokenise"} ', text)
+        self.assertIn("eliza_batches_total 1", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+'''
+Tests of the error replies of ElizaServer and ShardedServer: every request line gets one JSON line back, a request
+that can't be handled gets {"error": ...} and the connection stays open for the next request.
+'''
+
+import asyncio
+import contextlib
+import io
+import json
+import unittest
+
+from Eliza import Eliza
+from ElizaServer import ElizaServer, MAX_SESSION_ID_LENGTH
+from ShardedServer import ShardedServer
+from runEliza import reflections, psychobabble
+
+BAD_REQUESTS = [
+    ('not json', {"error": "invalid JSON"}),
+    ('[1, 2]', {"error": "missing session id"}),
+    ('{"statement": "i am sad"}', {"error": "missing session id"}),
+    ('{"session": 7, "statement": "i am sad"}', {"error": "missing session id"}),
+    ('{"session": "\\ud800", "statement": "i am sad"}', {"error": "session id is not valid unicode"}),
+    ('{"session": "' + "x" * (MAX_SESSION_ID_LENGTH + 1) + '", "statement": "hi"}',
+     {"error": "session id longer than " + str(MAX_SESSION_ID_LENGTH) + " characters"}),
+    ('{"session": "a"}', {"session": "a", "error": "missing statement"}),
+    ('{"session": "a", "statement": 3}', {"session": "a", "error": "missing statement"}),
+]
+
+
+# starts server on a free port, sends lines on one connection and returns the decoded response to each
+async def exchange(server, lines):
+    await server.start("127.0.0.1", 0)
+    try:
+        port = server.server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=1 << 20)
+        responses = []
+        for line in lines:
+            writer.write(line.encode("utf-8") + b"\n")
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+        writer.close()
+        return responses
+    finally:
+        await server.shutdown()
+
+
+class ElizaServerErrorTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.eliza = Eliza(reflections, psychobabble)
+
+    async def testBadRequestsGetErrors(self):
+        lines = [line for line, expected in BAD_REQUESTS] + ['{"session": "a", "statement": "i am sad"}']
+        responses = await exchange(ElizaServer(self.eliza), lines)
+        self.assertEqual(responses[:-1], [expected for line, expected in BAD_REQUESTS])
+        expected = Eliza(reflections, psychobabble).analyze("i am sad", self.eliza.newSession())
+        self.assertEqual(responses[-1], {"session": "a", "response": expected})
+
+    async def testUnexpectedErrorKeepsConnection(self):
+        server = ElizaServer(self.eliza)
+
+        def fail(requests):
+            raise RuntimeError("broken")
+        server.handleMessages = fail
+        lines = ['{"session": "a", "statement": "hello"}', '{"session": "a", "statement": "hello"}']
+        with contextlib.redirect_stderr(io.StringIO()):  # the server prints the traceback
+            responses = await exchange(server, lines)
+        self.assertEqual(responses, [{"error": "internal error"}] * 2)
+
+    async def testMetricsNotEnabled(self):
+        responses = await exchange(ElizaServer(self.eliza), ['{"metrics": true}', '{"profile": "report"}'])
+        self.assertEqual(responses, [{"error": "metrics are not enabled"}, {"error": "no profile has been taken"}])
+
+    async def testLineTooLong(self):
+        server = ElizaServer(self.eliza, maxLineLength=1024)
+        responses = await exchange(server, ['{"session": "a", "statement": "' + "x" * 2048 + '"}'])
+        self.assertEqual(responses, [{"error": "request too long"}])
+
+
+class ShardedServerErrorTest(unittest.IsolatedAsyncioTestCase):
+
+    async def testBadRequestsGetErrors(self):
+        eliza = Eliza(reflections, psychobabble)
+        lines = [line for line, expected in BAD_REQUESTS] + ['{"session": "a", "statement": "i am sad"}']
+        responses = await exchange(ShardedServer(eliza, 2), lines)
+        self.assertEqual(responses[:-1], [expected for line, expected in BAD_REQUESTS])
+        self.assertEqual(responses[-1]["session"], "a")
+        self.assertIn("response", responses[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
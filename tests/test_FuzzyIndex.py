@@ -0,0 +1,90 @@
+'''
+Tests of typo tolerant Keyword matching (see FuzzyIndex): misspelt Keyword names are corrected before a statement is
+matched, short, common and known words never are, and responses repeat the words as they were typed.
+'''
+
+import unittest
+
+from Eliza import Eliza
+from FuzzyIndex import FuzzyIndex
+from runEliza import reflections, psychobabble
+
+
+class FuzzyIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.eliza = Eliza(reflections, psychobabble)
+        cls.eliza.setFuzzyMatching(2)
+        cls.index = cls.eliza.fuzzyIndex
+
+    # the (response, keyword) of statement as the first turn of a new session
+    def answer(self, statement):
+        return self.eliza.analyzeTurn(statement, self.eliza.newSession())
+
+    def testCorrectsKeywordNames(self):
+        self.assertEqual(self.index.correctWord("computr"), "computer")
+        self.assertEqual(self.index.correctWord("rememebr"), "remember")
+        self.assertEqual(self.index.correctWord("perhpas"), "perhaps")
+
+    def testLeavesWordsAlone(self):
+        self.assertIsNone(self.index.correctWord("computer"))  # spelt as meant
+        self.assertEqual(self.index.correctWord("dreem"), "dream")
+        self.assertIsNone(self.index.correctWord("dreeem"))  # 6 letters may only be 1 edit away
+        self.assertEqual(self.index.correctWord("mothr"), "mother")
+        self.assertIsNone(self.index.correctWord("sadd"))  # too short
+        self.assertIsNone(self.index.correctWord("xylophone"))  # not close to any entry
+
+    def testKnownWordsAreNotCorrected(self):
+        self.assertEqual(FuzzyIndex({"computer": 0}, set(), 2).correctWord("computers"), "computer")
+        self.assertIsNone(FuzzyIndex({"computer": 0}, {"computers"}, 2).correctWord("computers"))
+        self.assertIsNone(FuzzyIndex({"thereby": 0}, set(), 2).correctWord("there"))  # a common English word
+
+    def testOnlyWholeEntries(self):
+        self.assertNotIn("knows", self.index.entryRanks)  # only out of the phrase "for all one knows"
+        self.assertIsNone(self.index.correctWord("knowws"))
+
+    def testHighestRankWins(self):
+        index = FuzzyIndex({"border": 1, "boarded": 0}, set(), 2)
+        self.assertEqual(index.correctWord("boarder"), "boarded")
+
+    def testAnswersAsCorrected(self):
+        plain = Eliza(reflections, psychobabble)
+        for typed, meant in [("I dreamt about a computr", "I dreamt about a computer"),
+                             ("perhpas it rains", "perhaps it rains")]:
+            self.assertEqual(self.answer(typed), plain.analyzeTurn(meant, plain.newSession()))
+        self.assertEqual(plain.analyzeTurn("perhpas it rains", plain.newSession())[1], None)
+
+    def testResponseEchoesTypedWords(self):
+        self.assertEqual(self.answer("Do you rememebr the perhpas"),
+                         ("What about the perhpas should I remember?", "remember"))
+
+    def testCorrect(self):
+        turn = self.eliza.normaliser.normalise("My Computr is broken")
+        corrected, fixes = self.index.correct(turn)
+        self.assertEqual(fixes, [("computr", "computer")])
+        self.assertEqual(corrected.text, "My computer is broken")
+        self.assertEqual(corrected.words, ["my", "computer", "is", "broken"])
+        unchanged = self.eliza.normaliser.normalise("My computer is broken")
+        self.assertIs(self.index.correct(unchanged)[0], unchanged)
+
+    def testRestore(self):
+        fixes = (("computr", "computer"),)
+        self.assertEqual(FuzzyIndex.restore(("the computer room", None, "computers"), fixes),
+                         ("the computr room", None, "computers"))
+
+    def testDeletionsOf(self):
+        self.assertEqual(FuzzyIndex.deletionsOf("abc", 0), {"abc"})
+        self.assertEqual(FuzzyIndex.deletionsOf("abc", 1), {"abc", "bc", "ac", "ab"})
+        self.assertEqual(len(FuzzyIndex.deletionsOf("abc", 3)), 8)
+
+    def testEditDistance(self):
+        self.assertEqual(FuzzyIndex.editDistance("computer", "computer", 2), 0)
+        self.assertEqual(FuzzyIndex.editDistance("computr", "computer", 2), 1)
+        self.assertEqual(FuzzyIndex.editDistance("rememebr", "remember", 2), 1)  # a swap is one edit
+        self.assertEqual(FuzzyIndex.editDistance("kitten", "sitting", 3), 3)
+        self.assertEqual(FuzzyIndex.editDistance("kitten", "sitting", 1), 2)  # stops once it is over the limit
+
+
+if __name__ == "__main__":
+    unittest.main()
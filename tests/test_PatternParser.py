@@ -0,0 +1,80 @@
+'''
+Tests of the small pattern language (see PatternParser): the parts a pattern is read into, the patterns left outside
+the language, and what the tools built on the parts conclude about the statements a pattern can match.
+'''
+
+import unittest
+
+from PatternParser import LITERAL, OPTIONAL, REPEAT, ANY_RANGES, parsePattern, literalPrefix, isOpen, \
+    leadingTexts, requiredLiterals, canOverlap, covers
+from runEliza import psychobabble
+
+
+class ParsePatternTest(unittest.TestCase):
+
+    def testLiterals(self):
+        self.assertEqual(parsePattern("I need"), ((LITERAL, "I need"),))
+        self.assertEqual(parsePattern(r"why\?"), ((LITERAL, "why?"),))
+        self.assertEqual(parsePattern(""), ())
+
+    def testOptional(self):
+        self.assertEqual(parsePattern(r"I\'?m (.*)"),
+                         ((LITERAL, "I"), (OPTIONAL, "'"), (LITERAL, "m "), (REPEAT, ANY_RANGES, True, True)))
+
+    def testRepeats(self):
+        self.assertEqual(parsePattern("(.*)i remember (.*)"),
+                         ((REPEAT, ANY_RANGES, True, True), (LITERAL, "i remember "),
+                          (REPEAT, ANY_RANGES, True, True)))
+        self.assertEqual(parsePattern("a.*"), ((LITERAL, "a"), (REPEAT, ANY_RANGES, True, False)))
+        self.assertEqual(parsePattern("x*"), ((REPEAT, (("x", "x"),), False, False),))
+        self.assertEqual(parsePattern("([a-zA-Z]*)"), ((REPEAT, (("a", "z"), ("A", "Z")), False, True),))
+        self.assertEqual(parsePattern(r"([^\?]*)"), ((REPEAT, (("?", "?"),), True, True),))
+
+    def testOutsideTheLanguage(self):
+        for pattern in ["a|b", "^a", "a$", "a+", "a{2}", "(.*?)", "(.+)", r"\w*", r"\d", r"(a)\1", "(?:a*)",
+                        "(?=a)", "(ab)", "(a)", "[a-z]", "[[:alpha:]]*", "[z-a]*", "[abc", "(.*", "a)"]:
+            self.assertIsNone(parsePattern(pattern), pattern)
+
+    def testScriptPatterns(self):
+        for pattern, responses in psychobabble:
+            self.assertIsNotNone(parsePattern(pattern), pattern)
+
+
+class PartsTest(unittest.TestCase):
+
+    def testLiteralPrefix(self):
+        self.assertEqual(literalPrefix(parsePattern("I need (.*)")), "I need ")
+        self.assertEqual(literalPrefix(parsePattern("(.*)i need (.*)")), "")
+        self.assertEqual(literalPrefix(()), "")
+
+    def testRequiredLiterals(self):
+        self.assertEqual(requiredLiterals(parsePattern("(.*)i remember (.*)")), ["i remember "])
+        self.assertEqual(requiredLiterals(parsePattern(r"I\'?m (.*)")), ["I", "m "])
+        self.assertEqual(requiredLiterals(parsePattern("(.*)")), [])
+
+    def testIsOpen(self):
+        self.assertTrue(isOpen(parsePattern("Hello(.*)")))
+        self.assertTrue(isOpen(parsePattern("(.*)")))
+        self.assertFalse(isOpen(parsePattern("(.*)i need (.*)")))
+        self.assertFalse(isOpen(parsePattern(r"I\'?m (.*)")))
+
+    def testLeadingTexts(self):
+        self.assertEqual(leadingTexts(parsePattern(r"I\'?m (.*)")), ["Im ", "I'm "])
+        self.assertEqual(leadingTexts(parsePattern("(.*)i need")), [""])
+
+    def testCanOverlap(self):
+        self.assertFalse(canOverlap(parsePattern("I need (.*)"), parsePattern("Why (.*)")))
+        self.assertTrue(canOverlap(parsePattern("I need (.*)"), parsePattern("I (.*)")))
+        self.assertTrue(canOverlap(parsePattern(r"I\'?m (.*)"), parsePattern("Im (.*)")))
+        self.assertTrue(canOverlap(None, parsePattern("Why (.*)")))
+
+    def testCovers(self):
+        self.assertTrue(covers(parsePattern("I (.*)"), parsePattern("I need (.*)")))
+        self.assertFalse(covers(parsePattern("I need (.*)"), parsePattern("I (.*)")))
+        self.assertFalse(covers(parsePattern("(.*)i need (.*)"), parsePattern("(.*)i need you(.*)")))
+        self.assertTrue(covers(parsePattern("(.*)i need (.*)"), parsePattern("(.*)i need (.*)")))
+        self.assertFalse(covers(None, parsePattern("I (.*)")))
+
+
+if __name__ == "__main__":
+    unittest.main()
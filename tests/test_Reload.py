@@ -0,0 +1,103 @@
+'''
+Tests of loading a new version of the script while conversations are going on (see Eliza.migrateSession,
+SessionStore.swap and ElizaServer.reload): a session keeps its place in the rules that did not change, starts again
+in the ones that did and forgets the memory of Keywords that are gone.
+'''
+
+import copy
+import json
+import unittest
+
+from Eliza import Eliza
+from ElizaServer import ElizaServer
+from ScriptLoader import compileScript, scriptOf
+from SessionStore import SessionStore
+from runEliza import reflections, psychobabble
+
+
+# the script of eliza as a dictionary (see ScriptLoader.scriptOf), to be changed and compiled
+def scriptCopy(eliza):
+    return copy.deepcopy(scriptOf(eliza))
+
+
+# the keyword called name in a script dictionary
+def keyword(script, name):
+    for entry in script["keywords"]:
+        if entry["name"] == name:
+            return entry
+    raise KeyError(name)
+
+
+class ReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.eliza = Eliza(reflections, psychobabble)
+
+    def testSameScriptSameVersion(self):
+        self.assertEqual(compileScript(json.dumps(scriptOf(self.eliza))).version, self.eliza.version)
+
+    def testUnchangedRulesCarryOn(self):
+        script = scriptCopy(self.eliza)
+        keyword(script, "hello")["rules"][0]["reasmb"].append("Hi there. What is on your mind?")
+        new = compileScript(json.dumps(script))
+        self.assertNotEqual(new.version, self.eliza.version)
+        store = SessionStore(self.eliza)
+        session = store.get("a")
+        reference = self.eliza.newSession()
+        for statement in ["i am sad", "i am sad"]:
+            self.assertEqual(self.eliza.analyze(statement, session), self.eliza.analyze(statement, reference))
+        store.swap(new)
+        session = store.get("a")
+        self.assertEqual(session.version, new.version)
+        # the sad rule did not change, so the session gets its third response like it would have with the old script
+        self.assertEqual(new.analyze("i am sad", session), self.eliza.analyze("i am sad", reference))
+
+    def testChangedRuleStartsAgain(self):
+        script = scriptCopy(self.eliza)
+        rule = keyword(script, "sad")["rules"][0]
+        rule["decomp"] = rule["decomp"].replace("i am", "i  am")
+        new = compileScript(json.dumps(script))
+        session = self.eliza.newSession()
+        self.eliza.analyze("i am sad", session)
+        new.migrateSession(session, self.eliza)
+        self.assertEqual(list(session.keyCursors), list(new.keyCursorTemplate))
+
+    def testMemoryOfRemovedKeywordDropped(self):
+        session = self.eliza.newSession()
+        self.eliza.analyze("i am sad", session)
+        self.assertEqual([entry[3] for entry in session.memory], ["sad"])
+        script = scriptCopy(self.eliza)
+        script["keywords"] = [entry for entry in script["keywords"] if entry["name"] != "sad"]
+        new = compileScript(json.dumps(script))
+        self.assertEqual(new.migrateSession(session, self.eliza), 1)
+        self.assertEqual(len(session.memory), 0)
+
+    def testMemoryTakesNewRank(self):
+        session = self.eliza.newSession()
+        self.eliza.analyze("i am sad", session)
+        script = scriptCopy(self.eliza)
+        keyword(script, "sad")["rank"] = 7
+        new = compileScript(json.dumps(script))
+        self.assertEqual(new.migrateSession(session, self.eliza), 0)
+        self.assertEqual([entry[1] for entry in session.memory], [7])
+
+
+class ServerReloadTest(unittest.IsolatedAsyncioTestCase):
+
+    async def testConversationCarriesOnAfterReload(self):
+        eliza = Eliza(reflections, psychobabble)
+        script = scriptCopy(eliza)
+        keyword(script, "hello")["rules"][0]["reasmb"].append("Hi there. What is on your mind?")
+        server = ElizaServer(eliza)
+        reference = Eliza(reflections, psychobabble)
+        referenceSession = reference.newSession()
+        first = server.handleMessages([{"session": "a", "statement": "i am sad"}])
+        new = await server.reload(lambda: compileScript(json.dumps(script)))
+        self.assertIs(server.eliza, new)
+        second = server.handleMessages([{"session": "a", "statement": "i am sad"}])
+        self.assertEqual([first[0]["response"], second[0]["response"]],
+                         [reference.analyze("i am sad", referenceSession) for i in range(2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
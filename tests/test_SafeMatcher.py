@@ -0,0 +1,145 @@
+'''
+Tests that the linear time matchers (see SafeMatcher) give exactly what the re module would: the same groups for
+every script pattern over many statements, long adversarial ones included, and the same alternative and groups
+for the combined psychobable regular expression, in no more steps than cost allows.
+'''
+
+import random
+import re
+import sys
+import unittest
+
+import SafeMatcher as SafeMatcherModule
+from Eliza import Eliza
+from PatternParser import parsePattern
+from SafeMatcher import SafeMatcher, AlternationMatcher
+from runEliza import reflections, psychobabble
+
+
+# Returns statements made of the words and characters of patterns, with their letters in both cases, and the same
+# ones every time
+def makeStatements(patterns, count, seed=0):
+    rand = random.Random(seed)
+    words = sorted({aWord for pattern in patterns for aWord in re.findall(r"[A-Za-z']+", pattern)})
+    words += ["?", "'", ",", "!", "x", "42", "\n", "", "the weather", "I", "you", "Im"]
+    statements = []
+    for i in range(count):
+        statement = " ".join(rand.choice(words) for _ in range(rand.randint(0, 12)))
+        if i % 3 == 0:
+            statement = statement.lower()
+        if i % 5 == 0:
+            statement = statement.replace(" ", "")
+        statements.append(statement)
+    return statements
+
+
+# Returns long statements that make backtracking regular expressions try many ways of splitting them
+def adversarialStatements():
+    return ["i " * 300, "i am " * 200, "you " * 200 + "i", "my " * 200 + "x", "i " * 150 + "like " * 150,
+            "a" * 2000, "I'm " * 200 + "?", "why " * 300, "?" * 500, "i remember " * 100 + "\n" + "you " * 100,
+            "I need " * 100 + "you " * 100 + "!", "Is it " * 150, "x" * 1000 + " i am"]
+
+
+class SafeMatcherTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        eliza = Eliza(reflections, psychobabble)
+        keyPatterns = [pattern for aKey in eliza.keys for pattern in aKey.regexLis]
+        cls.psychobabblePatterns = [pattern for pattern, responses in psychobabble]
+        # every script pattern the language covers, each once
+        cls.patterns = [pattern for pattern in dict.fromkeys(keyPatterns + cls.psychobabblePatterns)
+                        if parsePattern(pattern) is not None]
+        cls.statements = makeStatements(cls.patterns, 600) + adversarialStatements()
+
+    # checks that SafeMatcher(pattern) matches text like re.match, returns True if it matches
+    def assertSameMatch(self, pattern, text):
+        expected = re.match(pattern, text)
+        found = SafeMatcher(pattern).match(text)
+        if expected is None:
+            self.assertIsNone(found, (pattern, text))
+            return False
+        self.assertIsNotNone(found, (pattern, text))
+        self.assertEqual(found.groups(), expected.groups(), (pattern, text))
+        self.assertEqual(found.length, expected.end(), (pattern, text))
+        return True
+
+    def testScriptPatternsCovered(self):
+        self.assertEqual(len(self.patterns), len(set(self.patterns)))
+        self.assertGreater(len(self.patterns), 30)
+        self.assertTrue(all(parsePattern(pattern) is not None for pattern in self.psychobabblePatterns))
+
+    def testSameAsRe(self):
+        matched = sum(1 for pattern in self.patterns for text in self.statements if self.assertSameMatch(pattern, text))
+        self.assertGreater(matched, len(self.patterns) * 10)  # the statements are not just misses
+
+    def testLanguageConstructs(self):
+        cases = [(r"I\'?m (.*)", ["I'm sad", "Im sad", "I m sad", "I'msad", "I'm "]),
+                 (r"why\??(.*)", ["why?", "why", "why??", "whyever"]),
+                 ("(.*)i am ([a-zA-Z]*)(.*)", ["so i am happy now", "i am 42", "i am", "i ami am x"]),
+                 (r"([^\?]*)\?", ["what?", "what", "a?b?", "?"]),
+                 ("a*ab", ["aaab", "ab", "b", "aaa"]),
+                 ("x*(x*)y", ["xxxy", "y", "xx"]),
+                 ("(.*)(.*)", ["", "abc", "a\nb"]),
+                 ("(.*)you(.*)me", ["you and me", "youme", "you", "me you me"])]
+        for pattern, texts in cases:
+            for text in texts:
+                self.assertSameMatch(pattern, text)
+
+    def testUnsupportedPattern(self):
+        for pattern in ["a|b", "(.+)", r"\w*", "(?i)hello", "[abc"]:
+            with self.assertRaises(ValueError):
+                SafeMatcher(pattern)
+        with self.assertRaises(ValueError):
+            AlternationMatcher(["(.*)", "a|b"])
+
+    def testAlternationSameAsRe(self):
+        patterns = self.psychobabblePatterns
+        combined = re.compile("|".join("(" + pattern + ")" for pattern in patterns))
+        matcher = AlternationMatcher(patterns)
+        self.assertEqual(matcher.numGroups, combined.groups)
+        statements = self.statements + [pattern.replace("(.*)", "something") for pattern in patterns]
+        for text in statements:
+            expected = combined.match(text)
+            found = matcher.match(text)
+            if expected is None:
+                self.assertIsNone(found, text)
+                continue
+            self.assertIsNotNone(found, text)
+            self.assertEqual(found.lastindex, expected.lastindex, text)
+            self.assertEqual(found.groups(), expected.groups(), text)
+
+    def testCost(self):
+        matcher = SafeMatcher("(.*)i am ([a-zA-Z]*)(.*)")
+        self.assertEqual(matcher.cost(10), (len(matcher.parts) + 1) * 11)
+        alternation = AlternationMatcher(self.psychobabblePatterns)
+        self.assertEqual(alternation.cost(10), sum(aMatcher.cost(10) for aMatcher in alternation.matchers))
+
+    # the work of a match, counted as the lines run in SafeMatcher.py, stays within a fixed multiple of cost
+    def testCostBound(self):
+        lines = [0]
+        filename = SafeMatcherModule.__file__
+
+        def trace(frame, event, argument):
+            if frame.f_code.co_filename != filename:
+                return None
+            if event == "line":
+                lines[0] += 1
+            return trace
+
+        ratios = []
+        for pattern in self.patterns:
+            matcher = SafeMatcher(pattern)
+            for text in adversarialStatements():
+                lines[0] = 0
+                sys.settrace(trace)
+                try:
+                    matcher.match(text)
+                finally:
+                    sys.settrace(None)
+                ratios.append(lines[0] / matcher.cost(len(text)))
+        self.assertLess(max(ratios), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
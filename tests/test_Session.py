@@ -0,0 +1,127 @@
+'''
+Tests of Session snapshots: toBytes and fromBytes round trips, the format errors, the cursors of a loaded snapshot
+being checked against the script (see Eliza.checkCursors) and older snapshots keeping their memory.
+'''
+
+import os
+import struct
+import tempfile
+import unittest
+
+from Eliza import Eliza
+from Selector import makeSelector
+from Session import Session, SNAPSHOT_HEADERS, SNAPSHOT_ENTRIES, SNAPSHOT_MAGIC
+from SessionStore import SessionStore
+from runEliza import reflections, psychobabble
+
+STATEMENTS = ["i am sad", "my mother hates me", "i remember the sea", "are you a computer", "hello", "i am sad"]
+
+
+class SessionSnapshotTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.eliza = Eliza(reflections, psychobabble)
+
+    # a session of eliza that has had some turns and remembers some responses
+    def talkedSession(self, seed=0):
+        session = self.eliza.newSession(seed)
+        for statement in STATEMENTS:
+            self.eliza.analyze(statement, session)
+        return session
+
+    def assertSameSession(self, session, restored):
+        self.assertEqual(list(restored.keyCursors), list(session.keyCursors))
+        self.assertEqual(list(restored.generalCursors), list(session.generalCursors))
+        self.assertEqual(list(restored.memory), list(session.memory))
+        self.assertEqual(restored.turns, session.turns)
+        self.assertEqual(restored.randomState, session.randomState)
+        self.assertEqual(restored.version, session.version)
+
+    def testRoundTrip(self):
+        session = self.talkedSession()
+        self.assertNotEqual(len(session.memory), 0)
+        restored = Session.fromBytes(session.toBytes())
+        self.assertSameSession(session, restored)
+        # the restored session carries on exactly like the original
+        other = Eliza(reflections, psychobabble)
+        for statement in STATEMENTS:
+            self.assertEqual(other.analyze(statement, restored), self.eliza.analyze(statement, session))
+
+    def testRoundTripRandomSelector(self):
+        session = self.eliza.newSession(3)
+        session.selector = makeSelector("random", 7)
+        for statement in STATEMENTS:
+            self.eliza.analyze(statement, session)
+        restored = Session.fromBytes(session.toBytes())
+        self.assertSameSession(session, restored)
+        self.assertEqual((restored.selector.name, restored.selector.seed), ("random", 7))
+
+    def testFormatErrors(self):
+        data = self.talkedSession().toBytes()
+        for bad in [b"", data[:3], b"XXXX" + data[4:], data[:4] + b"\x09" + data[5:], data[:-1],
+                    data[:SNAPSHOT_HEADERS[4].size + 1]]:
+            with self.assertRaises(ValueError):
+                Session.fromBytes(bad)
+
+    def testLoadRejectsCursorOutOfRange(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = SessionStore(self.eliza, directory)
+            session = self.talkedSession()
+            session.keyCursors[0] = 1000  # no rule has that many responses
+            with open(store.sessionPath("a"), "wb") as fo:
+                fo.write(session.toBytes())
+            with self.assertRaises(ValueError):
+                store.load("a")
+            session.keyCursors[0] = 0
+            session.generalCursors[len(session.generalCursors) - 1] = 1000
+            with open(store.sessionPath("a"), "wb") as fo:
+                fo.write(session.toBytes())
+            with self.assertRaises(ValueError):
+                store.load("a")
+
+    def testLoadRejectsWrongNumberOfCursors(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = SessionStore(self.eliza, directory)
+            session = self.talkedSession()
+            session.keyCursors = session.keyCursors[:-1]
+            with open(store.sessionPath("a"), "wb") as fo:
+                fo.write(session.toBytes())
+            with self.assertRaises(ValueError):
+                store.load("a")
+
+    def testStoreSpillsAndLoads(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = SessionStore(self.eliza, directory)
+            session = store.get("a")
+            for statement in STATEMENTS:
+                self.eliza.analyze(statement, session)
+            store.spillAll()
+            self.assertTrue(os.path.exists(store.sessionPath("a")))
+            restored = SessionStore(self.eliza, directory).get("a")
+            self.assertSameSession(session, restored)
+
+    # a version 3 snapshot of session: no script version and no Keyword names in its memory
+    @staticmethod
+    def version3Snapshot(session):
+        parts = [SNAPSHOT_HEADERS[3].pack(SNAPSHOT_MAGIC, 3, len(session.keyCursors), len(session.generalCursors),
+                                          len(session.memory), session.turns, 0, 0, session.randomState),
+                 session.keyCursors.tobytes(), session.generalCursors.tobytes()]
+        for response, rank, turn, keyName in session.memory:
+            encoded = response.encode("utf-8")
+            parts.append(SNAPSHOT_ENTRIES[3].pack(rank, turn, len(encoded)))
+            parts.append(encoded)
+        return b"".join(parts)
+
+    def testVersion3MemoryKeptOnMigration(self):
+        session = self.talkedSession()
+        restored = Session.fromBytes(self.version3Snapshot(session))
+        self.assertEqual(restored.version, 0)
+        self.assertEqual([entry[:3] for entry in restored.memory], [entry[:3] for entry in session.memory])
+        dropped = Eliza(reflections, psychobabble).migrateSession(restored)
+        self.assertEqual(dropped, 0)
+        self.assertEqual([entry[:3] for entry in restored.memory], [entry[:3] for entry in session.memory])
+
+
+if __name__ == "__main__":
+    unittest.main()
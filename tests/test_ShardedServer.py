@@ -0,0 +1,108 @@
+'''
+Tests of spreading sessions over workers: the HashRing only moves the sessions it has to when a worker joins or
+leaves, handOff gives up exactly the sessions the ring puts elsewhere, and a conversation carries on where it left
+off when its session moves to another worker.
+'''
+
+import base64
+import json
+import unittest
+
+from Eliza import Eliza
+from HashRing import HashRing
+from Session import Session
+from SessionStore import SessionStore
+from ShardedServer import ShardedServer, handOff
+from runEliza import reflections, psychobabble
+
+SESSION_IDS = ["session" + str(i) for i in range(2000)]
+STATEMENTS = ["i am sad", "my mother hates me", "i am sad", "hello"]
+
+
+class HashRingTest(unittest.TestCase):
+
+    def testSameOwnerEveryTime(self):
+        ring = HashRing(["a", "b", "c"])
+        other = HashRing(["c", "a", "b"])
+        self.assertEqual([ring.lookup(sessionId) for sessionId in SESSION_IDS],
+                         [other.lookup(sessionId) for sessionId in SESSION_IDS])
+
+    def testSpreadsSessions(self):
+        ring = HashRing(["a", "b", "c", "d"])
+        counts = {}
+        for sessionId in SESSION_IDS:
+            counts[ring.lookup(sessionId)] = counts.get(ring.lookup(sessionId), 0) + 1
+        self.assertEqual(set(counts), {"a", "b", "c", "d"})
+        for count in counts.values():
+            self.assertGreater(count, len(SESSION_IDS) / 4 * 0.6)
+
+    def testJoinOnlyMovesSessionsToNewWorker(self):
+        ring = HashRing(["a", "b", "c"])
+        before = {sessionId: ring.lookup(sessionId) for sessionId in SESSION_IDS}
+        ring.add("d")
+        moved = [sessionId for sessionId in SESSION_IDS if ring.lookup(sessionId) != before[sessionId]]
+        self.assertNotEqual(len(moved), 0)
+        self.assertTrue(all(ring.lookup(sessionId) == "d" for sessionId in moved))
+
+    def testLeaveOnlyMovesSessionsOfWorker(self):
+        ring = HashRing(["a", "b", "c"])
+        before = {sessionId: ring.lookup(sessionId) for sessionId in SESSION_IDS}
+        ring.remove("b")
+        for sessionId in SESSION_IDS:
+            if before[sessionId] != "b":
+                self.assertEqual(ring.lookup(sessionId), before[sessionId])
+            else:
+                self.assertIn(ring.lookup(sessionId), ("a", "c"))
+
+    def testEmptyRing(self):
+        ring = HashRing(["a"])
+        ring.remove("a")
+        with self.assertRaises(LookupError):
+            ring.lookup("x")
+
+
+class HandOffTest(unittest.TestCase):
+
+    def testGivesUpSessionsOwnedElsewhere(self):
+        eliza = Eliza(reflections, psychobabble)
+        store = SessionStore(eliza)
+        for sessionId in SESSION_IDS[:200]:
+            eliza.analyze("i am sad", store.get(sessionId))
+        reply = handOff(store, "a", ["a", "b"])
+        ring = HashRing(["a", "b"])
+        self.assertEqual(set(reply["sessions"]), {sessionId for sessionId in SESSION_IDS[:200]
+                                                  if ring.lookup(sessionId) == "b"})
+        self.assertEqual(set(store.resident), {sessionId for sessionId in SESSION_IDS[:200]
+                                               if ring.lookup(sessionId) == "a"})
+        for snapshot in reply["sessions"].values():
+            self.assertEqual(Session.fromBytes(base64.b64decode(snapshot)).turns, 1)
+
+
+class ShardedConversationTest(unittest.IsolatedAsyncioTestCase):
+
+    async def testConversationsSurviveWorkersJoiningAndLeaving(self):
+        eliza = Eliza(reflections, psychobabble)
+        server = ShardedServer(eliza, 2)
+        await server.start("127.0.0.1", 0)
+        sessionIds = SESSION_IDS[:40]
+        try:
+            answers = {sessionId: [] for sessionId in sessionIds}
+            for turn in range(len(STATEMENTS)):
+                if turn == 1:
+                    self.assertIsNotNone(await server.addWorker())
+                elif turn == 3:
+                    self.assertIsNotNone(await server.removeWorker("worker0"))
+                for sessionId in sessionIds:
+                    line = json.dumps({"session": sessionId, "statement": STATEMENTS[turn]})
+                    answers[sessionId].append((await server.respond(line))["response"])
+        finally:
+            await server.shutdown()
+        reference = Eliza(reflections, psychobabble)
+        session = reference.newSession()
+        expected = [reference.analyze(statement, session) for statement in STATEMENTS]
+        for sessionId in sessionIds:
+            self.assertEqual(answers[sessionId], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
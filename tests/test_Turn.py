@@ -0,0 +1,74 @@
+'''
+Tests of how statements are normalised (see Normaliser) and where contractions send them: a contraction the script
+handles itself, like "I'm" for the psychobable pattern I\'?m (.*), is kept as typed and the others are expanded.
+'''
+
+import re
+import unittest
+
+from Eliza import Eliza
+from Turn import Normaliser
+from runEliza import reflections, psychobabble
+
+
+class NormaliserTest(unittest.TestCase):
+
+    def testExpandKeepsCase(self):
+        normaliser = Normaliser({"it's": "it is", "i'm": "i am"})
+        self.assertEqual(normaliser.normalise("It's raining").text, "It is raining")
+        self.assertEqual(normaliser.normalise("it’s raining").text, "it is raining")
+        self.assertEqual(normaliser.normalise("i'm sad. really").text, "i am sad")
+
+    def testKeptAsTyped(self):
+        normaliser = Normaliser({"i'm": "i am"}, {"I'm"})
+        self.assertEqual(normaliser.normalise("I'm tired").text, "I'm tired")
+        self.assertEqual(normaliser.normalise("I’m tired").text, "I'm tired")
+        self.assertEqual(normaliser.normalise("i'm tired").text, "i am tired")
+
+    def testWords(self):
+        turn = Normaliser({}).normalise("Hello, World!")
+        self.assertEqual(turn.stripped, "Hello, World")
+        self.assertEqual(turn.words, ["hello", "world"])
+
+
+class ContractionRoutingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.eliza = Eliza(reflections, psychobabble)
+
+    # the (response, keyword) of statement as the first turn of a new session
+    def answer(self, statement):
+        return self.eliza.analyzeTurn(statement, self.eliza.newSession())
+
+    # the responses of the psychobable pattern with the given text, filled in with value
+    @staticmethod
+    def general(pattern, value):
+        for aPattern, responses in psychobabble:
+            if aPattern == pattern:
+                return [response.format(value) for response in responses]
+        raise KeyError(pattern)
+
+    def testScriptContractionsKept(self):
+        self.assertEqual(self.eliza.normaliser.kept, {"I'm", "You're"})
+
+    def testPsychobabbleContractions(self):
+        self.assertEqual(self.answer("I'm tired"), (self.general(r'I\'?m (.*)', "tired")[0], None))
+        self.assertEqual(self.answer("I’m tired"), (self.general(r'I\'?m (.*)', "tired")[0], None))
+        self.assertEqual(self.answer("You're mean"), (self.general(r'You\'?re (.*)', "mean")[0], None))
+
+    def testExpandedContractionsReachKeywords(self):
+        self.assertEqual(self.answer("i'm sad"), self.answer("i am sad"))
+        self.assertEqual(self.answer("i'm sad")[1], "sad")
+        self.assertEqual(self.answer("you're mean"), self.answer("you are mean"))
+        self.assertEqual(self.answer("It's raining"), self.answer("It is raining"))
+
+    def testPatternsConsume(self):
+        self.assertTrue(Eliza.patternsConsume([re.compile(r"I\'?m (.*)")], "I'm", "I am"))
+        self.assertFalse(Eliza.patternsConsume([re.compile(r"I\'?m (.*)")], "i'm", "i am"))
+        self.assertFalse(Eliza.patternsConsume([re.compile(r"(.*)")], "i'm", "i am"))
+        self.assertTrue(Eliza.patternsConsume([re.compile(r"(.*)i'm(.*)")], "i'm", "i am"))
+
+
+if __name__ == "__main__":
+    unittest.main()